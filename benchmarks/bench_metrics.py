@@ -0,0 +1,100 @@
+"""
+Per-symbol cost of the metrics helpers: the original pandas implementations
+versus the array-native ones in pytradelib.metrics (called once per symbol,
+and once for a whole (symbols x bars) block).
+
+    python benchmarks/bench_metrics.py [num_symbols] [num_bars]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import talib as ta
+from scipy import stats
+
+from pytradelib import metrics
+
+
+# the implementations from before pytradelib.metrics was vectorized
+def new_high_over_num_prior_bars(df, col="Close"):
+    latest_val = df[col].iloc[-1]
+    prev_val = df[col].iloc[-2]
+    if latest_val < prev_val:
+        return 0
+
+    prior_high_timestamps = df.index[df[col] > latest_val]
+    if prior_high_timestamps.empty:
+        return len(df)
+
+    latest_ts = df.index[-1]
+    prior_high_ts = prior_high_timestamps[-1]
+    num_bars = df.index.get_loc(latest_ts) - df.index.get_loc(prior_high_ts)
+    return num_bars - 1
+
+
+def price_crossed_sma(df, sma=200, bullish=True):
+    if len(df) < sma:
+        return False
+
+    ma = ta.SMA(df.Close.values[-sma:], timeperiod=sma)[-1]
+    open_ = df.Open.iloc[-1]
+    close = df.Close.iloc[-1]
+    prior_close = df.Close.iloc[-2]
+    if bullish:
+        intraday_cross = (open_ < ma) and (close > ma)
+        gap_cross = (prior_close < ma) and (open_ > ma)
+    else:
+        intraday_cross = (open_ > ma) and (close < ma)
+        gap_cross = (prior_close > ma) and (open_ < ma)
+    return intraday_cross or gap_cross
+
+
+def sma_slope(df, sma=200, num_bars=10):
+    ma = ta.SMA(df.Close.values, timeperiod=sma)
+    slope, *_ = stats.linregress(range(0, num_bars), ma[-num_bars:])
+    return slope
+
+
+def make_dfs(num_symbols, num_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2000-01-03', periods=num_bars, tz='UTC')
+    dfs = []
+    for _ in range(num_symbols):
+        close = np.abs(100 + np.cumsum(rng.normal(0, 1, num_bars))) + 1
+        open_ = close + rng.normal(0, 0.5, num_bars)
+        dfs.append(pd.DataFrame({'Open': open_, 'Close': close}, index=index))
+    return dfs
+
+
+def bench(label, before, after, block, dfs):
+    for df in dfs:
+        assert np.allclose(before(df), after(df), equal_nan=True), label
+
+    n = len(dfs)
+    before_cost = timeit.timeit(lambda: [before(df) for df in dfs], number=3) / (3 * n)
+    after_cost = timeit.timeit(lambda: [after(df) for df in dfs], number=3) / (3 * n)
+    block_cost = timeit.timeit(block, number=3) / (3 * n)
+    print('%-28s %10.1f us %10.1f us %10.1f us %8.1fx' % (
+        label, before_cost * 1e6, after_cost * 1e6, block_cost * 1e6,
+        before_cost / block_cost))
+
+
+if __name__ == '__main__':
+    num_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_bars = int(sys.argv[2]) if len(sys.argv) > 2 else 2500
+    dfs = make_dfs(num_symbols, num_bars)
+    open_ = np.vstack([df.Open.values for df in dfs])
+    close = np.vstack([df.Close.values for df in dfs])
+
+    print('per-symbol cost (%d symbols x %d bars)' % (num_symbols, num_bars))
+    print('%-28s %13s %13s %13s %10s' % ('', 'before', 'after', 'after (2D)', 'speedup'))
+    bench('new_high_over_num_prior_bars',
+          new_high_over_num_prior_bars, metrics.new_high_over_num_prior_bars,
+          lambda: metrics.new_high_lookback(close), dfs)
+    bench('price_crossed_sma',
+          price_crossed_sma, metrics.price_crossed_sma,
+          lambda: metrics.crossed_sma(open_, close), dfs)
+    bench('sma_slope',
+          sma_slope, metrics.sma_slope,
+          lambda: metrics.linear_slope(metrics.rolling_sma(close[:, -209:], 200)[:, -10:]), dfs)
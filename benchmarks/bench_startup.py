@@ -0,0 +1,84 @@
+"""
+Startup cost of pytradelib's entry points: the wall time of importing each
+one in a fresh interpreter, and which of the heavy third-party modules it
+pulls in on import (only the stores need pandas up front; everything else,
+including trade.py's table printing, waits until it's used). With a daemon running (python -m pytradelib.daemon
+serve), also times a request to it.
+
+    python benchmarks/bench_startup.py [--check] [--repeat N]
+
+--check exits non-zero if an entry point imports a heavy module it shouldn't.
+"""
+import os
+import sys
+import json
+import subprocess
+import timeit
+
+from pytradelib import daemon
+
+
+# entry point -> the heavy modules it's expected to import (pandas imports
+# pyarrow itself, when it's installed)
+ENTRY_POINTS = [
+    ('pytradelib.orders', []),
+    ('pytradelib.daemon', []),
+    ('pytradelib.data', []),
+    ('pytradelib.downloader', []),
+    ('pytradelib.store', ['pandas', 'pyarrow']),
+    ('trade', []),
+]
+
+HEAVY = ['pandas', 'talib', 'scipy', 'aiohttp', 'pyarrow', 'requests',
+         'colorclass', 'terminaltables']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [ROOT] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]))
+    return subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                          stdout=subprocess.PIPE).stdout
+
+
+def import_time(module, repeat):
+    return min(timeit.repeat(lambda: run('import %s' % module), number=1, repeat=repeat))
+
+
+def heavy_imports(module):
+    code = 'import sys, json; import %s; print(json.dumps(sorted(sys.modules)))' % module
+    loaded = set(json.loads(run(code)))
+    return [name for name in HEAVY if name in loaded]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Time importing the entry points')
+    parser.add_argument('--check', action='store_true', help='Fail if an entry point imports a heavy module')
+    parser.add_argument('--repeat', default=5, type=int, help='The number of times to time each import')
+    args = parser.parse_args()
+
+    baseline = import_time('os', args.repeat)
+    print('%-24s %10s   %s' % ('', 'import', 'heavy modules imported'))
+    print('%-24s %7.0f ms' % ('(interpreter)', baseline * 1e3))
+    failed = []
+    for module, expected in ENTRY_POINTS:
+        heavy = heavy_imports(module)
+        if set(heavy) - set(expected):
+            failed.append(module)
+        print('%-24s %7.0f ms   %s' % (module, (import_time(module, args.repeat) - baseline) * 1e3,
+                                       ', '.join(heavy) or '-'))
+    for module in HEAVY:
+        try:
+            print('%-24s %7.0f ms' % (module, (import_time(module, args.repeat) - baseline) * 1e3))
+        except subprocess.CalledProcessError:
+            print('%-24s %10s' % (module, 'missing'))
+
+    if daemon.is_running():
+        cost = min(timeit.repeat(lambda: daemon.call('ping'), number=10, repeat=args.repeat)) / 10
+        print('%-24s %7.2f ms' % ('daemon round trip', cost * 1e3))
+
+    if args.check and failed:
+        print('imports heavy modules: %s' % ', '.join(failed))
+        sys.exit(1)
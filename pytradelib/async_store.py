@@ -0,0 +1,146 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+
+# the maximum number of reads and writes in flight at once; each one holds a
+# symbol's bars, so this bounds the memory a busy caller can tie up
+MAX_PENDING = 16
+
+
+class AsyncStore(object):
+    '''
+    An asyncio facade over a store, so that code running in the event loop
+    (like the download pipeline) can read and write bars without blocking
+    every in-flight request.
+
+    Reads run in a pool of io_workers threads. Writes compute their TA in a
+    pool of ta_workers processes (only when the whole history needs it;
+    extending the TA for a few new bars is cheap, so that happens in the
+    writer thread), then write in a single thread, since the stores aren't
+    built for concurrent writers. (Each thread has its own connection to the
+    store's SQLite manifest or database.) Writing a symbol again before an
+    earlier write of it has finished isn't supported; the download pipeline
+    writes each symbol once.
+
+    :param store: the store to wrap
+    :param io_workers: the number of threads to read with
+    :param ta_workers: the number of processes to compute TA in (defaults to
+                       the number of CPUs; 0 computes it in the writer thread)
+    :param max_pending: the maximum number of operations in flight
+    '''
+    def __init__(self, store, io_workers=4, ta_workers=None, max_pending=MAX_PENDING):
+        self._store = store
+        self._io_pool = ThreadPoolExecutor(io_workers)
+        self._write_pool = ThreadPoolExecutor(1)
+        if ta_workers is None:
+            ta_workers = os.cpu_count() or 1
+        # each worker process gets its own copy of the store (without its
+        # cache) once, rather than with every task
+        self._ta_pool = ProcessPoolExecutor(ta_workers, initializer=_init_worker,
+                                            initargs=(store,)) if ta_workers else None
+        self._max_pending = max_pending
+        self._pending = None
+        self._loaded = None
+
+    @property
+    def store(self):
+        return self._store
+
+    async def get_df(self, symbol, start=None, end=None, columns=None, timeframe='D'):
+        '''
+        See :meth:`BaseStore.get_df`.
+        '''
+        symbol = symbol.upper()
+        # reading weekly or monthly bars can write them (see BaseStore._sync_timeframe)
+        pool = self._io_pool if timeframe == 'D' else self._write_pool
+        async with self._limit():
+            return await self._run(pool, self._store.get_df, symbol, start, end,
+                                   columns, timeframe)
+
+    async def get_dfs(self, symbols=None, start=None, end=None, columns=None, timeframe='D'):
+        '''
+        See :meth:`BaseStore.get_dfs`.
+        '''
+        if symbols is None:
+            await self._load_contents()
+            symbols = self._store.symbols
+        if not isinstance(symbols, list):
+            symbols = [symbols]
+        dfs = await asyncio.gather(*[self.get_df(symbol, start, end, columns, timeframe)
+                                     for symbol in symbols])
+        return dict(zip([symbol.upper() for symbol in symbols], dfs))
+
+    async def set_df(self, symbol, df):
+        '''
+        See :meth:`BaseStore.set_df`.
+        '''
+        symbol = symbol.upper()
+        async with self._limit():
+            existing_df, state = await self._run(self._io_pool, self._store._get_existing, symbol)
+            if self._ta_pool is not None and not self._store._can_extend_ta(existing_df, state):
+                update = await self._run(self._ta_pool, _prepare_update,
+                                         symbol, existing_df, df, state)
+            else:
+                update = await self._run(self._write_pool, self._store._prepare_update,
+                                         symbol, existing_df, df, state)
+            if update is not None:
+                await self._run(self._write_pool, self._store._write_update, symbol, *update)
+
+    async def set_dfs(self, symbol_df_dict):
+        '''
+        :param symbol_df_dict: dict of symbol to DataFrame of new bars
+        '''
+        await asyncio.gather(*[self.set_df(symbol, df)
+                               for symbol, df in symbol_df_dict.items()])
+
+    def close(self):
+        '''
+        Shut down the pools, waiting for any writes in progress to finish.
+        '''
+        self._io_pool.shutdown(wait=True)
+        self._write_pool.shutdown(wait=True)
+        if self._ta_pool is not None:
+            self._ta_pool.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    @asynccontextmanager
+    async def _limit(self):
+        '''
+        Hold one of the pending slots.
+        '''
+        if self._pending is None:
+            # created on first use, so it belongs to the running loop
+            self._pending = asyncio.Semaphore(self._max_pending)
+        await self._load_contents()
+        async with self._pending:
+            yield
+
+    async def _load_contents(self):
+        # read the store's contents once, before any threads race to do it
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(
+                self._run(self._io_pool, self._store._load_contents))
+        await self._loaded
+
+    async def _run(self, pool, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, partial(func, *args))
+
+
+_worker_store = None
+
+
+def _init_worker(store):
+    global _worker_store
+    _worker_store = store
+
+
+def _prepare_update(symbol, existing_df, df, state):
+    return _worker_store._prepare_update(symbol, existing_df, df, state)
@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+
+from pytradelib.orders import BUY, SELL, calculate_quantity
+from pytradelib.settings import COMMISSION, MAX_AMOUNT, SCALE_OUT_LEVELS
+
+
+# why each signal's trade ended
+UNFILLED = 'unfilled'    # the entry order expired without filling
+TARGET = 'target'        # every scale-out level filled
+STOP = 'stop'            # stopped out (possibly after scaling out of some of it)
+TIME = 'time'            # exited at the close after max_bars bars
+OPEN = 'open'            # still open at the last bar (marked at its close)
+
+
+def backtest(bars, signals, max_amount=MAX_AMOUNT, commission=COMMISSION,
+             scale_out_levels=SCALE_OUT_LEVELS, entry_bars=1, max_bars=63,
+             stop_first=True, use_adjusted=False):
+    '''
+    Simulate the bracket orders of trade.py for every signal at once.
+
+    Each signal places an entry order (a limit order, or a stop-limit order
+    if it has an entry_stop) at the open of the bar after its date, which
+    stays working for entry_bars bars. Once filled, the position scales out
+    in scale_out_levels equal parts at evenly spaced prices up to the target
+    (half at the halfway price and half at the target, by default), with a
+    stop loss on whatever remains. Every fill costs commission.
+
+    Bars are simulated one at a time, with every signal's orders filled at
+    once using array operations:
+
+    - orders are filled at the open if it gaps through their price (at a
+      worse price for stops, a better one for limits)
+    - when a bar reaches both the stop and a target, which came first is
+      unknowable from daily bars, so the stop is assumed to (unless
+      stop_first is False)
+    - on the bar an entry fills intrabar, only the stop is checked, since
+      the targets may have been reached before the fill
+    - positions still open after max_bars bars (None for no limit) exit at
+      the close
+
+    :param bars: a store, or dict of symbol to DataFrame of daily bars
+    :param signals: DataFrame with symbol, date, action (BUY or SELL), price
+                    (the entry limit), target_price and stop_price columns,
+                    and optionally entry_stop and quantity columns (the
+                    quantity defaults to :func:`calculate_quantity`)
+    :param use_adjusted: whether to fill against adjusted prices (the
+                         signals' prices must be on the same basis)
+    :return: DataFrame of the trades, one row per signal (see :func:`summarize`)
+    '''
+    signals = signals.reset_index(drop=True)
+    n = len(signals)
+    direction = np.where(signals['action'].str.upper().values == SELL, -1.0, 1.0)
+    price = signals['price'].values.astype(np.float64)
+    if 'entry_stop' in signals:
+        entry_stop = signals['entry_stop'].values.astype(np.float64)
+    else:
+        entry_stop = np.full(n, np.nan)
+    if 'quantity' in signals:
+        quantity = signals['quantity'].values.astype(np.float64)
+        quantity = np.where(np.isnan(quantity), calculate_quantity(price, max_amount), quantity)
+    else:
+        quantity = calculate_quantity(price, max_amount).astype(np.float64)
+
+    # work in "long space": negating a short's prices (and swapping the highs
+    # and lows) turns its orders into the equivalent long ones, so there's
+    # only one set of fill rules
+    target = np.maximum(signals['target_price'].values * direction,
+                        signals['stop_price'].values * direction)
+    stop = np.minimum(signals['target_price'].values * direction,
+                      signals['stop_price'].values * direction)
+    limit = price * direction
+    entry_stop = entry_stop * direction
+    has_entry_stop = ~np.isnan(entry_stop)
+    levels = [limit + (target - limit) * (i + 1) / scale_out_levels
+              for i in range(scale_out_levels)]
+
+    horizon = entry_bars + (max_bars if max_bars is not None else _max_length(bars))
+    dates, open_, high, low, close = _load_windows(bars, signals, horizon, use_adjusted)
+    high, low = np.where(direction > 0, high.T, -low.T).T, np.where(direction > 0, low.T, -high.T).T
+    open_, close = (open_.T * direction).T, (close.T * direction).T
+
+    state = np.zeros(n, dtype=np.int8)  # 0 pending, 1 open, 2 closed
+    triggered = np.zeros(n, dtype=bool)
+    entry_bar = np.full(n, -1)
+    exit_bar = np.full(n, -1)
+    entry_price = np.full(n, np.nan)
+    exit_price = np.full(n, np.nan)
+    exit_reason = np.full(n, UNFILLED, dtype=object)
+    filled = np.zeros(n, dtype=np.int64)  # the number of scale-out levels filled
+    realized = np.zeros(n)  # profit from those levels (per share of the position)
+    last_close = np.full(n, np.nan)
+    last_bar = np.full(n, -1)
+
+    for j in range(horizon):
+        o, h, l, c = open_[:, j], high[:, j], low[:, j], close[:, j]
+        valid = ~np.isnan(c)
+        last_close = np.where(valid, c, last_close)
+        last_bar = np.where(valid, j, last_bar)
+
+        # entries
+        pending = (state == 0) & valid & (j < entry_bars)
+        fills = np.zeros(n, dtype=bool)
+        fill_price = np.full(n, np.nan)
+        # limit orders (including triggered stop-limits) fill at the limit,
+        # or the open if it gapped below it
+        is_limit = pending & (~has_entry_stop | triggered) & (l <= limit)
+        fills |= is_limit
+        fill_price = np.where(is_limit, np.minimum(o, limit), fill_price)
+        # stop-limits trigger at the stop (or the open, if it gapped above
+        # it), then fill as limit orders
+        trigger = pending & has_entry_stop & ~triggered & (h >= entry_stop)
+        triggered |= trigger
+        is_stop = trigger & (l <= limit)
+        fills |= is_stop
+        fill_price = np.where(is_stop, np.minimum(np.where(o >= entry_stop, o, entry_stop), limit),
+                              fill_price)
+        state = np.where(fills, 1, state)
+        entry_bar = np.where(fills, j, entry_bar)
+        entry_price = np.where(fills, fill_price, entry_price)
+        at_open = fills & (fill_price == o)
+
+        # exits
+        holding = (state == 1) & valid
+        check_targets = holding & (~fills | at_open)
+        stopped = holding & (l <= stop)
+        gapped = stopped & (o <= stop)
+        stop_price = np.minimum(o, stop)
+        for i, level in enumerate(levels):
+            # with the stop assumed first, only levels the open gapped through
+            # fill before it
+            reached = np.where(stopped & stop_first, o >= level, h >= level)
+            hit = check_targets & ~gapped & (filled == i) & reached
+            realized = np.where(hit, realized + (np.maximum(o, level) - entry_price) / scale_out_levels,
+                                realized)
+            exit_price = np.where(hit, np.maximum(o, level), exit_price)
+            filled = np.where(hit, i + 1, filled)
+        done = holding & (filled == scale_out_levels)
+        exit_reason = np.where(done, TARGET, exit_reason)
+        stopped &= ~done
+        remaining = 1 - filled / scale_out_levels
+        realized = np.where(stopped, realized + (stop_price - entry_price) * remaining, realized)
+        exit_price = np.where(stopped, stop_price, exit_price)
+        exit_reason = np.where(stopped, STOP, exit_reason)
+        done |= stopped
+        if max_bars is not None:
+            expired = holding & ~done & (j - entry_bar + 1 >= max_bars)
+            realized = np.where(expired, realized + (c - entry_price) * remaining, realized)
+            exit_price = np.where(expired, c, exit_price)
+            exit_reason = np.where(expired, TIME, exit_reason)
+            done |= expired
+        state = np.where(done, 2, state)
+        exit_bar = np.where(done, j, exit_bar)
+
+    # mark anything still open at its last close
+    still_open = state == 1
+    remaining = 1 - filled / scale_out_levels
+    realized = np.where(still_open, realized + (last_close - entry_price) * remaining, realized)
+    exit_price = np.where(still_open, last_close, exit_price)
+    exit_reason = np.where(still_open, OPEN, exit_reason)
+    exit_bar = np.where(still_open, last_bar, exit_bar)
+
+    entered = state > 0
+    num_fills = np.where(entered, 1 + filled + ((state == 2) & (filled < scale_out_levels)), 0)
+    profit = np.where(entered, quantity * realized - commission * num_fills, 0.0)
+    # the planned risk, as in trade.py's risk()
+    risk = quantity * np.abs(limit - stop) + 2 * commission
+    rows = np.arange(n)
+    return pd.DataFrame({
+        'symbol': signals['symbol'].str.upper().values,
+        'date': signals['date'].values,
+        'action': np.where(direction > 0, BUY, SELL),
+        'quantity': quantity.astype(np.int64),
+        'entry_date': _take(dates, rows, entry_bar),
+        'entry_price': entry_price * direction,
+        'exit_date': _take(dates, rows, exit_bar),
+        'exit_price': exit_price * direction,
+        'exit_reason': exit_reason,
+        'scaled_out': filled,
+        'bars_held': np.where(entered, exit_bar - entry_bar + 1, 0),
+        'profit': profit,
+        'risk': risk,
+        'r_multiple': np.where(entered, profit / risk, np.nan),
+    })
+
+
+def summarize(trades):
+    '''
+    :param trades: DataFrame returned by :func:`backtest`
+    :return: Series of the number of signals and trades, win rate, total
+             profit, average R multiple, profit factor and average bars held
+    '''
+    filled = trades[trades.exit_reason != UNFILLED]
+    wins = filled.profit[filled.profit > 0].sum()
+    losses = -filled.profit[filled.profit < 0].sum()
+    return pd.Series({
+        'signals': len(trades),
+        'trades': len(filled),
+        'win_rate': (filled.profit > 0).mean() if len(filled) else np.nan,
+        'total_profit': filled.profit.sum(),
+        'average_r': filled.r_multiple.mean(),
+        'profit_factor': wins / losses if losses else np.inf,
+        'average_bars_held': filled.bars_held.mean(),
+    })
+
+
+def _load_windows(bars, signals, horizon, use_adjusted):
+    '''
+    Gather the horizon bars after each signal's date into (signals x horizon)
+    arrays (padded with NaN past the end of a symbol's bars).
+
+    :return: tuple of (dates, open, high, low, close)
+    '''
+    fields = ['Open', 'High', 'Low', 'Close']
+    if use_adjusted:
+        fields = ['Adj ' + field for field in fields]
+    symbols = signals['symbol'].str.upper()
+    start = pd.Timestamp(signals['date'].min())
+    if start.tz is None:
+        start = start.tz_localize('UTC')
+    if hasattr(bars, 'get_dfs'):
+        # only the bars from the first signal onwards are read
+        dfs = bars.get_dfs(sorted(set(symbols)), start=start, columns=fields)
+    else:
+        dfs = dict((symbol.upper(), df) for symbol, df in bars.items())
+
+    n = len(signals)
+    dates = np.full((n, horizon), np.datetime64('NaT'), dtype='datetime64[ns]')
+    arrays = np.full((len(fields), n, horizon), np.nan)
+    signal_dates = pd.DatetimeIndex(pd.to_datetime(signals['date'], utc=True))
+    codes, uniques = pd.factorize(symbols)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    for i, symbol in enumerate(uniques):
+        df = dfs.get(symbol)
+        if df is None or df.empty:
+            continue
+        rows = order[bounds[i]:bounds[i + 1]]
+        index = df.index.tz_convert('UTC') if df.index.tz is not None else df.index.tz_localize('UTC')
+        # the first bar after each signal's date
+        positions = index.searchsorted(signal_dates[rows], side='right')
+        window = positions[:, None] + np.arange(horizon)
+        valid = window < len(df)
+        window = np.minimum(window, len(df) - 1)
+        values = np.array([df[field].to_numpy(dtype=np.float64) for field in fields])
+        arrays[:, rows] = np.where(valid, values[:, window], np.nan)
+        dates[rows] = np.where(valid, index.tz_localize(None).values.astype('datetime64[ns]')[window],
+                               np.datetime64('NaT'))
+    return (dates,) + tuple(arrays)
+
+
+def _max_length(bars):
+    if hasattr(bars, 'get_dfs'):
+        return max(len(df) for df in bars.get_dfs(columns=['Close']).values())
+    return max(len(df) for df in bars.values())
+
+
+def _take(dates, rows, columns):
+    taken = dates[rows, np.maximum(columns, 0)]
+    return pd.DatetimeIndex(np.where(columns >= 0, taken, np.datetime64('NaT'))).tz_localize('UTC')
+
+
+if __name__ == '__main__':
+    import argparse
+    from pytradelib.store import STORES
+    parser = argparse.ArgumentParser(description='Backtest bracket orders over stored bars')
+    parser.add_argument('signals', help='CSV of signals (see pytradelib.backtest.backtest)')
+    parser.add_argument('--store', default='parquet', choices=STORES.keys(), help='The store to read bars from')
+    parser.add_argument('--max', default=MAX_AMOUNT, type=float, help='The maximum dollar amount per trade')
+    parser.add_argument('--commission', default=COMMISSION, type=float, help='Commission charged per fill')
+    parser.add_argument('--max-bars', default=63, type=int, help='The most bars to hold a position for')
+    parser.add_argument('--output', help='Where to write the trades as CSV')
+    args = parser.parse_args()
+
+    trades = backtest(STORES[args.store](), pd.read_csv(args.signals, parse_dates=['date']),
+                      max_amount=args.max, commission=args.commission, max_bars=args.max_bars)
+    if args.output:
+        trades.to_csv(args.output, index=False)
+    print(summarize(trades).to_string())
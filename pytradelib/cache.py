@@ -0,0 +1,275 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from pytradelib.settings import (
+    INDICATOR_CACHE_DIR,
+    INDICATOR_CACHE_MAX_BYTES,
+    INDICATOR_CACHE_MAX_ENTRIES,
+)
+
+
+class LRUCache(object):
+    '''
+    A least-recently-used cache bounded by entry count and/or total size.
+    It's safe to share between threads.
+
+    :param max_entries: the maximum number of entries (None for no limit)
+    :param max_bytes: the maximum total size of the entries (None for no limit)
+    :param sizeof: function returning the size of a value in bytes
+    '''
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or _zero
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            self.invalidate(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.num_bytes += size
+            self._evict(keep=key)
+
+    def invalidate(self, key):
+        '''
+        Remove key from the cache (if present).
+        '''
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self.num_bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.num_bytes = 0
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.num_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _evict(self, keep=None):
+        while self._entries and self._over_limit():
+            key = next(iter(self._entries))
+            if key == keep:
+                # never evict what was just added, even if it alone is over the limit
+                break
+            self.invalidate(key)
+            self.evictions += 1
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.num_bytes > self.max_bytes
+
+    def __getstate__(self):
+        # pickled copies (eg for worker processes) start out empty
+        state = self.__dict__.copy()
+        state.update(_entries=OrderedDict(), _sizes={}, num_bytes=0,
+                     hits=0, misses=0, evictions=0)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def namespace(self, namespace):
+        '''
+        :return: a :class:`CacheNamespace` of this cache
+        '''
+        return CacheNamespace(self, namespace)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheNamespace(object):
+    '''
+    A view of an :class:`LRUCache` whose keys are prefixed with namespace, so
+    several stores (eg a store and its timeframe stores) can share one cache,
+    and its limits, without their keys colliding.
+    '''
+    def __init__(self, cache, namespace):
+        self._cache = cache
+        self._namespace = namespace
+
+    def get(self, key, default=None):
+        return self._cache.get((self._namespace, key), default)
+
+    def set(self, key, value):
+        self._cache.set((self._namespace, key), value)
+
+    def invalidate(self, key):
+        self._cache.invalidate((self._namespace, key))
+
+    def namespace(self, namespace):
+        return CacheNamespace(self._cache, (self._namespace, namespace))
+
+    @property
+    def stats(self):
+        return self._cache.stats
+
+    def __contains__(self, key):
+        return (self._namespace, key) in self._cache
+
+
+def _zero(value):
+    return 0
+
+
+def df_sizeof(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+class DataFrameCache(LRUCache):
+    '''
+    An LRU cache of DataFrames, sized by their (deep) memory usage.
+    '''
+    def __init__(self, max_entries=None, max_bytes=None):
+        super(DataFrameCache, self).__init__(max_entries, max_bytes, df_sizeof)
+
+
+class IndicatorCache(object):
+    '''
+    A two-tier cache of indicator results: an in-memory LRU in front of .npz
+    files on disk (so results survive across processes and runs).
+
+    Entries are keyed on (symbol, indicator name, params), and each one
+    stores a fingerprint of the bars it was computed from: the number of
+    bars, the last bar's timestamp and the sum of each input array. When new
+    bars arrive, the fingerprint changes, so only those symbols' indicators
+    get recomputed (and their files overwritten).
+
+    :param cache_dir: where to store the files (defaults to INDICATOR_CACHE_DIR)
+    :param max_entries: the maximum number of entries to keep in memory
+                        (defaults to INDICATOR_CACHE_MAX_ENTRIES)
+    :param max_bytes: the maximum size of the entries to keep in memory
+                      (defaults to INDICATOR_CACHE_MAX_BYTES)
+    '''
+    def __init__(self, cache_dir=None, max_entries=INDICATOR_CACHE_MAX_ENTRIES,
+                 max_bytes=INDICATOR_CACHE_MAX_BYTES):
+        self._cache_dir = cache_dir or INDICATOR_CACHE_DIR
+        self._memory = LRUCache(max_entries, max_bytes, _result_sizeof)
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'memory_hits': self._memory.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self._memory.evictions,
+        }
+
+    def get(self, symbol, name, func, dates, *arrays, **params):
+        '''
+        Return func(*arrays, **params), from the cache if the bars haven't
+        changed since it was last computed.
+
+        :param symbol: string - the ticker
+        :param name: string - the indicator's name (eg 'RSI')
+        :param func: function returning a numpy array, or a tuple of them
+        :param dates: the bars' DatetimeIndex
+        :param arrays: the input arrays for func
+        :param params: keyword arguments for func
+        '''
+        symbol = symbol.upper()
+        key = (symbol, name, tuple(sorted(params.items())))
+        fingerprint = _fingerprint(dates, arrays)
+
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        path = self._get_path(*key)
+        result = self._load(path, fingerprint)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            result = func(*arrays, **params)
+            self._save(path, fingerprint, result)
+        self._memory.set(key, (fingerprint, result))
+        return result
+
+    def invalidate(self, symbol):
+        symbol = symbol.upper()
+        for key in [key for key in self._memory._entries if key[0] == symbol]:
+            self._memory.invalidate(key)
+        symbol_dir = os.path.dirname(self._get_path(symbol, '', ()))
+        if os.path.exists(symbol_dir):
+            shutil.rmtree(symbol_dir)
+
+    def _get_path(self, symbol, name, params):
+        params_hash = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self._cache_dir, symbol.replace(os.path.sep, '--'),
+                            '%s-%s.npz' % (name, params_hash))
+
+    def _load(self, path, fingerprint):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as npz:
+            if str(npz['fingerprint']) != fingerprint:
+                return None
+            values = tuple(npz['arr_%d' % i] for i in range(int(npz['num_arrays'])))
+            return values if bool(npz['is_tuple']) else values[0]
+
+    def _save(self, path, fingerprint, result):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        is_tuple = isinstance(result, tuple)
+        values = result if is_tuple else (result,)
+        arrays = dict(('arr_%d' % i, value) for i, value in enumerate(values))
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, fingerprint=np.array(fingerprint), is_tuple=np.array(is_tuple),
+                     num_arrays=np.array(len(values)), **arrays)
+        os.replace(path + '.tmp', path)
+
+
+def _fingerprint(dates, arrays):
+    if not len(dates):
+        return '0'
+    sums = ','.join(repr(float(np.nansum(array))) for array in arrays)
+    return '%d-%d-%s' % (len(dates), dates[-1].value, sums)
+
+
+def _result_sizeof(entry):
+    fingerprint, result = entry
+    values = result if isinstance(result, tuple) else (result,)
+    return sum(value.nbytes for value in values)
@@ -0,0 +1,185 @@
+import os
+import json
+import socket
+import threading
+import socketserver
+
+from pytradelib.logger import logger
+from pytradelib.settings import COMMISSION, DAEMON_SOCKET, MAX_AMOUNT
+
+
+class DaemonError(Exception):
+    '''
+    The daemon failed to handle a request.
+    '''
+
+
+class Daemon(object):
+    '''
+    A long-lived local server holding a store, so its cache of bars stays
+    warm between CLI invocations (which otherwise pay for importing pandas
+    and reading every symbol from disk each time).
+
+    Clients send one line of JSON per connection, {"method": ..., "params":
+    {...}}, over a Unix socket, and get back {"result": ...} or {"error":
+    ...} (see :func:`call`). DataFrames are returned as dicts of columns,
+    index and data. Requests are handled one at a time, since the stores
+    aren't built for concurrent use.
+
+    :param store: the store to serve (defaults to a CSVStore)
+    :param path: the socket's path (defaults to DAEMON_SOCKET)
+    '''
+    def __init__(self, store=None, path=None):
+        self._store = store
+        self._path = path or DAEMON_SOCKET
+        self._server = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            from pytradelib.store import CSVStore
+            self._store = CSVStore()
+        return self._store
+
+    def serve(self):
+        '''
+        Serve requests until the stop method is called (or the process is
+        interrupted).
+        '''
+        if not os.path.exists(os.path.dirname(self._path)):
+            os.makedirs(os.path.dirname(self._path))
+        if os.path.exists(self._path):
+            if is_running(self._path):
+                raise DaemonError('a daemon is already listening on %s' % self._path)
+            os.remove(self._path)  # left behind by a daemon that was killed
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                response = daemon.handle(json.loads(self.rfile.readline().decode('utf-8')))
+                self.wfile.write(json.dumps(response).encode('utf-8'))
+
+        self._server = socketserver.UnixStreamServer(self._path, Handler)
+        os.chmod(self._path, 0o600)
+        logger.info('daemon listening on %s' % self._path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(self._path)
+
+    def handle(self, request):
+        method = getattr(self, 'rpc_' + request.get('method', ''), None)
+        if method is None:
+            return {'error': 'unknown method: %r' % request.get('method')}
+        try:
+            return {'result': method(**request.get('params', {}))}
+        except Exception as e:
+            logger.exception('daemon request %r failed' % request.get('method'))
+            return {'error': '%s: %s' % (type(e).__name__, e)}
+
+    def rpc_ping(self):
+        return 'pong'
+
+    def rpc_stop(self):
+        # shutdown() waits for serve_forever() to return, which can't happen
+        # until this request has been answered
+        threading.Thread(target=self._server.shutdown).start()
+        return 'stopping'
+
+    def rpc_symbols(self):
+        return self.store.symbols
+
+    def rpc_get_df(self, symbol, start=None, end=None, columns=None, timeframe='D'):
+        return _to_json(self.store.get_df(symbol, start, end, columns, timeframe))
+
+    def rpc_analyze(self, symbols=None):
+        if symbols is None:
+            # like the data CLI, also save the analysis to DATA_DIR
+            from pytradelib.data import DataManager
+            return _to_json(DataManager(self.store).analyze())
+        return _to_json(self.store.analyze(symbols))
+
+    def rpc_initialize(self):
+        from pytradelib.data import DataManager
+        return DataManager(self.store).initialize_store()
+
+    def rpc_update(self):
+        from pytradelib.data import DataManager
+        return DataManager(self.store).update_store()
+
+    def rpc_invalidate(self, symbols=None):
+        for symbol in symbols or self.store.symbols:
+            self.store.invalidate(symbol)
+
+    def rpc_plan_orders(self, path, max_amount=MAX_AMOUNT, commission=COMMISSION, output=None):
+        '''
+        :param path: the file of entries (see pytradelib.orders.read_entries)
+        :param output: where to write the plan (CSV, or JSON lines for .jsonl)
+        :return: list of the planned orders as dicts
+        '''
+        from pytradelib.orders import plan_orders, read_entries
+        plan = plan_orders(read_entries(path), max_amount, commission)
+        if output and output.endswith('.jsonl'):
+            plan.to_json(output, orient='records', lines=True)
+        elif output:
+            plan.to_csv(output, index=False)
+        return json.loads(plan.to_json(orient='records'))
+
+
+def _to_json(df):
+    return json.loads(df.to_json(orient='split', date_format='iso'))
+
+
+def call(method, params=None, path=None, timeout=None):
+    '''
+    Make a request of the daemon.
+
+    :param method: the name of one of the Daemon's rpc_ methods (without the prefix)
+    :param params: dict of the method's keyword arguments
+    :param path: the daemon's socket (defaults to DAEMON_SOCKET)
+    :param timeout: seconds to wait for the response (defaults to forever)
+    :return: the result
+    :raises DaemonError: if the request failed
+    :raises OSError: if no daemon is listening
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or DAEMON_SOCKET)
+        sock.sendall((json.dumps({'method': method, 'params': params or {}}) + '\n').encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        for chunk in iter(lambda: sock.recv(1024 * 1024), b''):
+            chunks.append(chunk)
+    response = json.loads(b''.join(chunks).decode('utf-8'))
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    return response['result']
+
+
+def is_running(path=None):
+    path = path or DAEMON_SOCKET
+    if not os.path.exists(path):
+        return False
+    try:
+        return call('ping', path=path, timeout=1) == 'pong'
+    except (OSError, ValueError, DaemonError):
+        return False
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Keep a store warm for CLI requests')
+    parser.add_argument('command', choices=['serve', 'stop', 'status'])
+    parser.add_argument('--store', default='csv', help='The store to serve (see pytradelib.store.STORES)')
+    parser.add_argument('--socket', default=DAEMON_SOCKET, help='The Unix socket to listen on')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        from pytradelib.store import STORES
+        Daemon(STORES[args.store](), args.socket).serve()
+    elif args.command == 'stop':
+        print(call('stop', path=args.socket))
+    else:
+        print('running' if is_running(args.socket) else 'not running')
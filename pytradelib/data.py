@@ -1,72 +1,244 @@
 import os
 import sys
-import pytz
-import pandas as pd
-from pandas.tseries.offsets import DateOffset
-from datetime import date, datetime
+import json
+import asyncio
+from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-from pytradelib.store import CSVStore
-from pytradelib.quandl.wiki import QuandlDailyWikiProvider
-from pytradelib.quandl.metadata import get_symbols_list
-from pytradelib.yahoo.yql import get_symbols_info
 from pytradelib.settings import DATA_DIR
 from pytradelib.logger import logger
+from pytradelib.utils import chunk
+
+# (the stores, providers and pipeline are imported where they're used, so
+# the CLI can hand requests to a running daemon without importing them)
+
+# where initialize_store records its progress, so it can resume
+BOOTSTRAP_CHECKPOINT = os.path.join(DATA_DIR, 'bootstrap.json')
+
+# the number of YQL lookups in flight at once
+LOOKUP_WORKERS = 4
 
 
 class DataManager(object):
     def __init__(self, store=None, data_provider=None):
-        self._store = store or CSVStore()
-        self._provider = data_provider or QuandlDailyWikiProvider(batch_size=30)
-
-    def initialize_store(self):
-        symbols = get_symbols_list('WIKI')
-        info = get_symbols_info(symbols)
-
-        # HACK: find the most recent valid trade date by searching through
-        # all of the last_trade_dates for the most frequent date
-        dates = defaultdict(lambda: 0)
-        for d in info:
-            dates[d['last_trade_date']] += 1
-        items = dates.items()
-        items.sort(key=lambda x: x[1])
-        last_valid_trade_date = items[-1][0]
-        logger.debug('last_valid_trade_date: %s' % last_valid_trade_date)
-
-        # filter out all symbols which are no longer active
-        symbols = [d['symbol'] for d in info
-                   if d['last_trade_date'] == last_valid_trade_date]
-        logger.debug('expecting %d symbols' % len(symbols))
-
-        # download daily data
-        self._store.set_dfs(self._provider.download(symbols))
+        if store is None:
+            from pytradelib.store import CSVStore
+            store = CSVStore()
+        if data_provider is None:
+            from pytradelib.quandl.wiki import QuandlDailyWikiProvider
+            data_provider = QuandlDailyWikiProvider(batch_size=30)
+        self._store = store
+        self._provider = data_provider
 
-    def update_store(self):
-        last_trading_day = pd.Timestamp(date.today(), tz=pytz.UTC)
-        while last_trading_day.weekday() > 4:
-            last_trading_day = last_trading_day - DateOffset(days=1)
+    def initialize_store(self, checkpoint_path=BOOTSTRAP_CHECKPOINT, lookup_workers=LOOKUP_WORKERS):
+        '''
+        Download the history of every active symbol in the WIKI dataset (those
+        that traded in the most recent session).
+
+        Looking up which symbols are active overlaps with downloading them:
+        the YQL lookups run lookup_workers batches at a time, and each batch's
+        active symbols join the download queue as soon as it resolves.
+
+        The lookups are checkpointed to checkpoint_path and symbols already in
+        the store are skipped, so running this again after it's interrupted
+        (or some downloads failed) resumes where it left off. The checkpoint
+        is removed once every active symbol has been stored.
+
+        :return: list of the symbols that were stored
+        '''
+        from pytradelib.pipeline import stream_to_store
+        from pytradelib.quandl.metadata import get_symbols_list
+        from pytradelib.trading_calendar import last_session, previous_session
+
+        session = last_session()
+        # the quotes can lag a session behind (eg just after the close), so
+        # symbols that traded in the session before are active too
+        active_since = previous_session(session)
+        checkpoint = _load_checkpoint(checkpoint_path, session)
+        stored = set(self._store.symbols)
+        lookups_failed = []
 
-        symbols = {}
-        for symbol in self._store.symbols:
-            latest_dt = self._store.get_end_date(symbol)
-            if latest_dt != last_trading_day:
-                symbols[symbol] = {'start': latest_dt, 'end': last_trading_day}
+        async def active_symbols():
+            # first the symbols an earlier run found active but didn't store
+            for symbol in checkpoint['active']:
+                if symbol not in stored:
+                    yield symbol
+            looked_up = set(checkpoint['active']) | set(checkpoint['inactive'])
+            # downloading and parsing the codes blocks, so keep it off the loop
+            all_symbols = await asyncio.get_running_loop().run_in_executor(
+                None, get_symbols_list, 'WIKI')
+            symbols = [symbol for symbol in all_symbols if symbol not in looked_up]
+            logger.debug('looking up %d symbols (%d already looked up)' % (len(symbols), len(looked_up)))
+            async for batch, info, error in _lookup_symbols(symbols, lookup_workers):
+                if error is not None:
+                    logger.error('failed to look up %d symbols: %s' % (len(batch), error))
+                    lookups_failed.extend(batch)
+                    continue
+                active = set(d['symbol'] for d in info if _is_active(d, active_since))
+                checkpoint['active'].extend(sorted(active))
+                checkpoint['inactive'].extend(sorted(set(batch) - active))
+                _save_checkpoint(checkpoint_path, checkpoint)
+                for symbol in sorted(active):
+                    if symbol not in stored:
+                        yield symbol
 
-        if not symbols:
-            return []
+        async def run():
+            written = []
+            async for symbol, error in stream_to_store(self._provider, self._store, active_symbols()):
+                if error is None:
+                    written.append(symbol)
+                    logger.debug('stored ' + symbol)
+                else:
+                    logger.error('failed to store %s: %s' % (symbol, error))
+            return written
 
-        self._store.set_dfs(self._provider.download(symbols))
-        return symbols.keys()
+        written = asyncio.run(run())
+        stored.update(written)
+        remaining = lookups_failed + [symbol for symbol in checkpoint['active'] if symbol not in stored]
+        if remaining:
+            logger.info('%d symbols left to bootstrap, run initialize_store again to retry them'
+                        % len(remaining))
+        elif os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return written
+
+    def update_store(self):
+        '''
+        Download only the sessions each symbol is missing (symbols which are
+        already current aren't requested at all).
+
+        :return: list of the updated symbols
+        '''
+        from pytradelib.pipeline import download_to_store
+
+        updated = []
+        for start, end, symbols in plan_updates(self._store):
+            logger.debug('updating %d symbols from %s to %s' % (len(symbols), start.date(), end.date()))
+            updated.extend(download_to_store(self._provider, self._store, symbols, start, end))
+        return updated
 
     def analyze(self):
         results = self._store.analyze()
         filename = '%s-analysis.csv' % datetime.now().strftime('%Y-%m-%d')
         filepath = os.path.join(DATA_DIR, filename)
+        if not os.path.exists(DATA_DIR):
+            os.makedirs(DATA_DIR)
         results.to_csv(filepath)
         return results
 
 
+def plan_updates(store, end=None):
+    '''
+    Work out which sessions each symbol in store is missing, coalescing the
+    symbols missing the same range of sessions into one request.
+
+    :param store: the store to update
+    :param end: the last session to update to (defaults to the most recent
+                session that has closed)
+    :return: list of (start, end, symbols) tuples, oldest start first
+    '''
+    from pytradelib.trading_calendar import last_session, next_session
+
+    end = end or last_session()
+    ranges = defaultdict(list)
+    for symbol in store.symbols:
+        latest_dt = store.get_end_date(symbol)
+        if latest_dt >= end:
+            continue
+        start = next_session(latest_dt)
+        if start <= end:
+            ranges[start].append(symbol)
+    return [(start, end, symbols) for start, symbols in sorted(ranges.items())]
+
+
+async def _lookup_symbols(symbols, workers=LOOKUP_WORKERS):
+    '''
+    Look up symbols on YQL in batches, workers batches at a time, yielding
+    (batch, info, error) tuples as each one resolves.
+    '''
+    from pytradelib.yahoo.yql import BATCH_SIZE, get_symbols_info
+
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(workers)
+
+    async def lookup(batch):
+        try:
+            return batch, await loop.run_in_executor(pool, get_symbols_info, batch), None
+        except Exception as e:
+            return batch, None, e
+
+    try:
+        for lookup_done in asyncio.as_completed([lookup(batch) for batch in chunk(symbols, BATCH_SIZE)]):
+            yield await lookup_done
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _is_active(info, since):
+    '''
+    :param info: a symbol's YQL info
+    :param since: the earliest session to count as active
+    :return: whether the symbol traded in (or since) since
+    '''
+    try:
+        last_trade_date = datetime.strptime(info.get('last_trade_date') or '', '%m/%d/%Y')
+    except ValueError:
+        return False
+    return last_trade_date.date() >= since.date()
+
+
+def _load_checkpoint(path, session):
+    '''
+    :return: dict of the session and the symbols found active and inactive
+             (empty if there's no checkpoint for session)
+    '''
+    session = session.strftime('%Y-%m-%d')
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint['session'] == session:
+            return checkpoint
+        # which symbols are active may have changed since then
+        logger.debug('ignoring the checkpoint from %s' % checkpoint['session'])
+    return {'session': session, 'active': [], 'inactive': []}
+
+
+def _save_checkpoint(path, checkpoint):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
 if __name__ == '__main__':
-    data_manager = DataManager(CSVStore(), QuandlDailyWikiProvider())
-    # data_manager.update_store()
-    data_manager.analyze()
+    import argparse
+    from pytradelib import daemon
+    parser = argparse.ArgumentParser(description='Bootstrap, update and analyze the store')
+    parser.add_argument('command', choices=['initialize', 'update', 'analyze'])
+    parser.add_argument('--no-daemon', action='store_true',
+                        help="Don't use a running daemon (see pytradelib.daemon)")
+    args = parser.parse_args()
+
+    if not args.no_daemon and daemon.is_running():
+        result = daemon.call(args.command)
+        if args.command == 'initialize':
+            print('stored %d symbols' % len(result))
+        elif args.command == 'update':
+            print('updated %d symbols' % len(result))
+        else:
+            columns = result['columns']
+            print('\t'.join(['symbol'] + columns))
+            for symbol, row in zip(result['index'], result['data']):
+                print('\t'.join([symbol] + ['%.4g' % value if isinstance(value, float) else str(value)
+                                             for value in row]))
+        sys.exit(0)
+
+    data_manager = DataManager()
+    if args.command == 'initialize':
+        print('stored %d symbols' % len(data_manager.initialize_store()))
+    elif args.command == 'update':
+        print('updated %d symbols' % len(data_manager.update_store()))
+    else:
+        print(data_manager.analyze().to_string())
@@ -1,28 +1,228 @@
+import time
+import random
 import asyncio
 
-from aiohttp import ClientSession, ClientResponse, ClientResponseError
+from pytradelib.lazy import lazy_import
+from pytradelib.logger import logger
 
-from .utils import chunk
+aiohttp = lazy_import('aiohttp')
 
 
-async def bulk_download(urls, handle_resp, batch_size=8):
-    if not isinstance(urls, (list, tuple)):
+# responses worth retrying: rate limited, or a (probably transient) server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter(object):
+    '''
+    An asyncio token bucket allowing `calls` requests per `period` seconds,
+    with bursts of up to `burst` requests (defaults to `calls`).
+
+    One limiter can be shared by downloads in different event loops (eg
+    successive asyncio.run calls), so the quota holds across all of them.
+    '''
+    def __init__(self, calls, period=1.0, burst=None):
+        self.rate = float(calls) / period
+        self.capacity = float(burst or calls)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio locks belong to the loop they're first used in
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _response_error(r: 'aiohttp.ClientResponse'):
+    return aiohttp.ClientResponseError(r.request_info, r.history, status=r.status, message=r.reason)
+
+
+async def read_text(r: 'aiohttp.ClientResponse'):
+    if r.status == 200:
+        return await r.text(), None
+    return None, _response_error(r)
+
+
+async def read_bytes(r: 'aiohttp.ClientResponse'):
+    '''
+    Return the raw body, skipping the decode (for parsers that read bytes).
+    '''
+    if r.status == 200:
+        return await r.read(), None
+    return None, _response_error(r)
+
+
+def _backoff(attempt, base, retry_after=None):
+    '''
+    "Full jitter" exponential backoff, unless the server told us how long.
+    '''
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, base * (2 ** attempt))
+
+
+async def iter_download(urls, handle_resp=read_text, batch_size=8, rate_limiter=None,
+                        retries=3, backoff=1.0, session=None):
+    '''
+    Download urls, yielding (url, data_or_error) tuples as they complete.
+
+    Up to batch_size requests are kept in flight: as soon as one finishes the
+    next one starts, so a slow response only holds up its own slot. urls can
+    also be an async iterable, for urls that are still being worked out
+    (each one starts as soon as it arrives and there's a free slot). Responses
+    with a RETRY_STATUSES status (or failed connections) are retried up to
+    `retries` times with jittered exponential backoff.
+
+    :param urls: a url, a list of urls, or an async iterable of urls
+    :param handle_resp: async function taking the response, returning (data, error),
+                        where error is an exception (or None)
+    :param batch_size: the maximum number of requests in flight
+    :param rate_limiter: an optional RateLimiter shared by every request
+    :param retries: how many times to retry each url
+    :param backoff: the base backoff delay in seconds
+    :param session: an optional aiohttp ClientSession to reuse
+    '''
+    if not isinstance(urls, (list, tuple)) and not hasattr(urls, '__aiter__'):
         urls = [urls]
 
     async def dl(session, url):
-        async with session.get(url) as r:
-            data, error = await handle_resp(r)
-            if error:
-                return url, error
-            return url, data
-
-    async def dl_all():
-        results = []
-        async with ClientSession() as session:
-            for batch in chunk(urls, batch_size):
-                tasks = [dl(session, url) for url in batch]
-                batch_results = await asyncio.gather(*tasks, return_exceptions=False)
-                results.extend(batch_results)
-        return results
-
-    return await dl_all()
+        for attempt in range(retries + 1):
+            if rate_limiter:
+                await rate_limiter.acquire()
+            try:
+                async with session.get(url) as r:
+                    if r.status in RETRY_STATUSES and attempt < retries:
+                        delay = _backoff(attempt, backoff, r.headers.get('Retry-After'))
+                        logger.debug('HTTP %d for %s, retrying in %.1fs' % (r.status, url, delay))
+                        await asyncio.sleep(delay)
+                        continue
+                    data, error = await handle_resp(r)
+                    return url, error if error else data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == retries:
+                    return url, e
+                delay = _backoff(attempt, backoff)
+                logger.debug('%r for %s, retrying in %.1fs' % (e, url, delay))
+                await asyncio.sleep(delay)
+
+    async def dl_all(session):
+        pending = set()
+        urls_iter = iter(urls)
+        for url in urls_iter:
+            pending.add(asyncio.ensure_future(dl(session, url)))
+            if len(pending) >= batch_size:
+                break
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # keep the window full
+                for url in urls_iter:
+                    pending.add(asyncio.ensure_future(dl(session, url)))
+                    break
+                yield task.result()
+
+    async def dl_all_async(session):
+        # wait for the next url alongside the downloads in flight
+        pending = set()
+        next_url = None
+        exhausted = False
+        try:
+            while True:
+                if next_url is None and not exhausted and len(pending) < batch_size:
+                    next_url = asyncio.ensure_future(urls.__anext__())
+                waiting = pending if next_url is None else pending | {next_url}
+                if not waiting:
+                    return
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if next_url in done:
+                    try:
+                        pending.add(asyncio.ensure_future(dl(session, next_url.result())))
+                    except StopAsyncIteration:
+                        exhausted = True
+                    next_url = None
+                for task in done & pending:
+                    pending.discard(task)
+                    yield task.result()
+        finally:
+            if next_url is not None:
+                next_url.cancel()
+
+    download_all = dl_all_async if hasattr(urls, '__aiter__') else dl_all
+    if session is not None:
+        async for result in download_all(session):
+            yield result
+    else:
+        async with aiohttp.ClientSession() as session:
+            async for result in download_all(session):
+                yield result
+
+
+async def bulk_download(urls, handle_resp=read_text, batch_size=8, **kwargs):
+    '''
+    Like :func:`iter_download`, but returns a list of every (url, data_or_error)
+    tuple, in the same order as urls.
+    '''
+    if not isinstance(urls, (list, tuple)):
+        urls = [urls]
+    results = {}
+    async for url, data in iter_download(urls, handle_resp, batch_size, **kwargs):
+        results[url] = data
+    return [(url, results[url]) for url in urls]
+
+
+class Downloader(object):
+    '''
+    Downloads urls with a provider's concurrency and rate limits, either
+    blocking (:meth:`download`) or streaming (:meth:`iter_download`).
+
+    :param batch_size: the maximum number of requests in flight
+    :param rate_limit: tuple of (calls, period in seconds), or None for no limit
+    :param retries: how many times to retry each url
+    :param handle_resp: async function taking the response, returning (data, error)
+    '''
+    def __init__(self, batch_size=8, rate_limit=None, retries=3, handle_resp=read_text):
+        self._batch_size = batch_size
+        # shared by every download, so the limit holds across calls
+        self._rate_limiter = RateLimiter(*rate_limit) if rate_limit else None
+        self._retries = retries
+        self._handle_resp = handle_resp
+
+    def download(self, urls):
+        '''
+        :param urls: a url, or a list of urls
+        :return: the data for a single url, or a list of (url, data_or_error) tuples
+        '''
+        results = asyncio.run(bulk_download(urls, **self._get_kwargs()))
+        if isinstance(urls, (list, tuple)):
+            return results
+        return results[0][1]
+
+    def iter_download(self, urls):
+        '''
+        :param urls: a list (or async iterable) of urls
+        :return: async generator of (url, data_or_error) tuples, as they complete
+        '''
+        return iter_download(urls, **self._get_kwargs())
+
+    def _get_kwargs(self):
+        return {
+            'handle_resp': self._handle_resp,
+            'batch_size': self._batch_size,
+            'retries': self._retries,
+            'rate_limiter': self._rate_limiter,
+        }
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from pytradelib.lazy import lazy_import
+from pytradelib.settings import HTTP_CACHE_DIR, HTTP_MEMO_TTL
+
+requests = lazy_import('requests', submodules=['adapters'])
+
+
+class HTTPClient(object):
+    '''
+    A keep-alive, gzip-enabled HTTP session for the data providers, with two
+    layers of caching for GET requests:
+
+    - responses carrying an ETag or Last-Modified header are saved to disk,
+      and later requests for the same url are made conditional, so an
+      unchanged resource costs a 304 instead of downloading it again
+    - bodies are memoized in memory for memo_ttl seconds, so repeated
+      requests within that time don't touch the network at all (pass
+      memo=False for volatile urls)
+
+    :param cache_dir: where to save responses (defaults to HTTP_CACHE_DIR)
+    :param pool_size: the maximum number of connections to keep alive per host
+    :param timeout: seconds to wait for the server before giving up
+    :param memo_ttl: seconds to reuse a memoized body for (defaults to
+                     HTTP_MEMO_TTL)
+    '''
+    def __init__(self, cache_dir=None, pool_size=8, timeout=60, memo_ttl=HTTP_MEMO_TTL):
+        self._cache_dir = cache_dir or HTTP_CACHE_DIR
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._memo_ttl = memo_ttl
+        self._memo = {}  # url -> (when it expires, body)
+        self._session = requests.Session()
+        self._session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def get(self, url, memo=True):
+        '''
+        :param url: the url to GET
+        :param memo: whether or not to use (and fill) the in-memory memo
+        :return: the response body as bytes
+        :raises requests.HTTPError: if the response wasn't successful
+        '''
+        if memo and url in self._memo:
+            expires, body = self._memo[url]
+            if time.monotonic() < expires:
+                return body
+            del self._memo[url]
+
+        cached = self._load(url)
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        r = self._session.get(url, headers=headers, timeout=self._timeout)
+        if r.status_code == 304 and cached:
+            body = cached['body']
+        else:
+            r.raise_for_status()
+            body = r.content
+            if r.headers.get('ETag') or r.headers.get('Last-Modified'):
+                self._save(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), body)
+
+        if memo:
+            self._memo[url] = (time.monotonic() + self._memo_ttl, body)
+        return body
+
+    def get_many(self, urls, memo=True):
+        '''
+        GET urls concurrently over the shared session.
+
+        :return: list of (url, body) tuples, in the same order as urls
+        '''
+        with ThreadPoolExecutor(self._pool_size) as pool:
+            bodies = list(pool.map(lambda url: self.get(url, memo=memo), urls))
+        return list(zip(urls, bodies))
+
+    def clear(self):
+        '''
+        Empty the in-memory memo (the responses saved on disk are kept).
+        '''
+        self._memo.clear()
+
+    def close(self):
+        self._session.close()
+
+    def _get_path(self, url):
+        return os.path.join(self._cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _load(self, url):
+        path = self._get_path(url)
+        if not os.path.exists(path + '.json') or not os.path.exists(path + '.body'):
+            return None
+        with open(path + '.json') as f:
+            cached = json.load(f)
+        with open(path + '.body', 'rb') as f:
+            cached['body'] = f.read()
+        return cached
+
+    def _save(self, url, etag, last_modified, body):
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        path = self._get_path(url)
+        # write the body before its headers, so the headers never describe
+        # a body that isn't there
+        with open(path + '.body.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.body.tmp', path + '.body')
+        with open(path + '.json.tmp', 'w') as f:
+            json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, f)
+        os.replace(path + '.json.tmp', path + '.json')
+
+
+_client = None
+
+
+def get_client():
+    '''
+    :return: the HTTPClient shared by every provider in this process
+    '''
+    global _client
+    if _client is None:
+        _client = HTTPClient()
+    return _client
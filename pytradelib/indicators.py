@@ -0,0 +1,200 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from pytradelib.lazy import lazy_import
+
+# imported on first use; both are slow to import, and most callers of this
+# module only need its constants
+ta = lazy_import('talib')
+signal = lazy_import('scipy.signal')
+
+
+# the number of trailing bars which the windowed indicators (SMA, BBANDS,
+# STOCH and LINEARREG_SLOPE) need to extend the series (sma200 is the longest)
+WINDOW_LOOKBACK = 200
+
+# the number of bars before every indicator has a value (MACD's lookback)
+MIN_BARS = 34
+
+ATR_PERIOD = 14
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+
+# the indicators behind the TA columns (besides dollar_volume), as tuples of
+# (their columns, the talib function, its inputs, its parameters), so that
+# they can be computed (and cached, see BaseStore._add_ta) one at a time
+INDICATORS = [
+    (['atr'], 'NATR', ['high', 'low', 'close'], {'timeperiod': ATR_PERIOD}),
+    (['sma100'], 'SMA', ['close'], {'timeperiod': 100}),
+    (['sma200'], 'SMA', ['close'], {'timeperiod': 200}),
+    (['bbands_upper', 'sma20', 'bbands_lower'], 'BBANDS', ['close'], {'timeperiod': 20}),
+    (['stoch_lead', 'stoch_lag'], 'STOCH', ['high', 'low', 'close'],
+     {'fastk_period': 14, 'slowk_period': 1, 'slowd_period': 3}),
+    (['slope'], 'LINEARREG_SLOPE', ['close'], {'timeperiod': 14}),
+    (['macd_lead', 'macd_lag', 'macd_divergence'], 'MACD', ['close'],
+     {'fastperiod': MACD_FAST, 'slowperiod': MACD_SLOW, 'signalperiod': MACD_SIGNAL}),
+    (['rsi'], 'RSI', ['close'], {'timeperiod': RSI_PERIOD}),
+]
+
+# the indicators which only depend on a trailing window of bars (see extend_ta)
+WINDOWED = ['SMA', 'BBANDS', 'STOCH', 'LINEARREG_SLOPE']
+
+
+def compute_indicator(name, *arrays, **params):
+    '''
+    :param name: the name of a talib function in INDICATORS
+    :return: numpy array, or tuple of them
+    '''
+    result = getattr(ta, name)(*arrays, **params)
+    if name == 'LINEARREG_SLOPE':
+        return result * -1  # talib returns the inverse of what we want
+    return result
+
+
+def compute_ta(high, low, close, volume):
+    '''
+    Compute the store's standard technical indicators. The inputs can be any
+    contiguous float64 arrays (eg columns of a DataFrame, or memory-mapped
+    views from :class:`pytradelib.memmap.MemmapStore`).
+
+    :return: OrderedDict of column name to numpy array
+    '''
+    columns = OrderedDict()
+    columns['dollar_volume'] = close * volume
+    columns.update(_compute_indicators({'high': high, 'low': low, 'close': close}))
+    return OrderedDict((column, columns[column]) for column in COLUMNS)
+
+
+def _compute_windowed_ta(high, low, close):
+    return _compute_indicators({'high': high, 'low': low, 'close': close}, WINDOWED)
+
+
+def _compute_indicators(inputs, names=None):
+    columns = OrderedDict()
+    for indicator_columns, name, input_names, params in INDICATORS:
+        if names is None or name in names:
+            result = compute_indicator(name, *[inputs[input_name] for input_name in input_names],
+                                       **params)
+            if len(indicator_columns) == 1:
+                result = (result,)
+            columns.update(zip(indicator_columns, result))
+    return columns
+
+
+COLUMNS = [
+    'dollar_volume',
+    'atr',
+    'sma100',
+    'sma200',
+    'bbands_upper',
+    'sma20',
+    'bbands_lower',
+    'macd_lead',
+    'macd_lag',
+    'macd_divergence',
+    'rsi',
+    'stoch_lead',
+    'stoch_lag',
+    'slope',
+]
+
+
+def compute_ta_state(high, low, close):
+    '''
+    Compute the state of the recursive indicators (Wilder's ATR and RSI, and
+    the EMAs behind MACD) as of the last bar, matching talib's seeding.
+
+    :return: dict (JSON serializable), or None if there are too few bars
+    '''
+    if len(close) < MIN_BARS:
+        return None
+
+    # talib seeds MACD's fast EMA from the same bar as its slow EMA, so the
+    # fast one starts (slow - fast) bars later than a standalone EMA would
+    ema_fast = ta.EMA(close[MACD_SLOW - MACD_FAST:], timeperiod=MACD_FAST)[-1]
+    ema_slow = ta.EMA(close, timeperiod=MACD_SLOW)[-1]
+    _, macd_signal, _ = ta.MACD(close)
+
+    deltas = np.diff(close)
+    return {
+        'atr': float(ta.ATR(high, low, close, timeperiod=ATR_PERIOD)[-1]),
+        'rsi_gain': _wilder(np.clip(deltas, 0, None), RSI_PERIOD),
+        'rsi_loss': _wilder(np.clip(-deltas, 0, None), RSI_PERIOD),
+        'ema_fast': float(ema_fast),
+        'ema_slow': float(ema_slow),
+        'macd_signal': float(macd_signal[-1]),
+        'close': float(close[-1]),
+    }
+
+
+def _wilder(values, period):
+    '''
+    The last value of Wilder's smoothing of values, seeded by their first
+    period values' mean (as talib does for RSI).
+    '''
+    seed = values[:period].mean()
+    rest = values[period:]
+    if not len(rest):
+        return float(seed)
+    smoothed = signal.lfilter([1.0 / period], [1.0, -(period - 1.0) / period], rest,
+                       zi=[seed * (period - 1.0) / period])[0]
+    return float(smoothed[-1])
+
+
+def extend_ta(high, low, close, volume, num_new, state):
+    '''
+    Compute the indicators for just the last num_new bars, given the state
+    from :func:`compute_ta_state` (or a prior call) as of the bar before them.
+    The results are numerically equivalent to running :func:`compute_ta` over
+    the full history, but cost O(num_new) instead of O(history).
+
+    :param high, low, close, volume: arrays of the trailing bars, ending with
+        the new bars. Include at least WINDOW_LOOKBACK bars before the new ones
+        (or the full history, if it's shorter than that).
+    :param num_new: the number of new bars at the end of the arrays
+    :param state: dict
+    :return: tuple of (OrderedDict of column name to numpy array, new state)
+    '''
+    first = len(close) - num_new
+    columns = OrderedDict()
+    columns['dollar_volume'] = close[first:] * volume[first:]
+    for column, values in _compute_windowed_ta(high, low, close).items():
+        columns[column] = values[first:]
+
+    k_fast = 2.0 / (MACD_FAST + 1)
+    k_slow = 2.0 / (MACD_SLOW + 1)
+    k_signal = 2.0 / (MACD_SIGNAL + 1)
+
+    state = dict(state)
+    natr, rsi = np.empty(num_new), np.empty(num_new)
+    macd, macd_signal = np.empty(num_new), np.empty(num_new)
+    for i in range(num_new):
+        h, l, c = high[first + i], low[first + i], close[first + i]
+        prev_close = state['close']
+
+        true_range = max(h - l, abs(h - prev_close), abs(l - prev_close))
+        state['atr'] = (state['atr'] * (ATR_PERIOD - 1) + true_range) / ATR_PERIOD
+        natr[i] = (state['atr'] / c) * 100 if c else 0
+
+        delta = c - prev_close
+        state['rsi_gain'] = (state['rsi_gain'] * (RSI_PERIOD - 1) + max(delta, 0)) / RSI_PERIOD
+        state['rsi_loss'] = (state['rsi_loss'] * (RSI_PERIOD - 1) + max(-delta, 0)) / RSI_PERIOD
+        total = state['rsi_gain'] + state['rsi_loss']
+        rsi[i] = 100 * (state['rsi_gain'] / total) if total else 0
+
+        state['ema_fast'] = (c - state['ema_fast']) * k_fast + state['ema_fast']
+        state['ema_slow'] = (c - state['ema_slow']) * k_slow + state['ema_slow']
+        macd[i] = state['ema_fast'] - state['ema_slow']
+        state['macd_signal'] = (macd[i] - state['macd_signal']) * k_signal + state['macd_signal']
+        macd_signal[i] = state['macd_signal']
+
+        state['close'] = c
+
+    columns['atr'] = natr
+    columns['macd_lead'] = macd
+    columns['macd_lag'] = macd_signal
+    columns['macd_divergence'] = macd - macd_signal
+    columns['rsi'] = rsi
+    return OrderedDict((column, columns[column]) for column in COLUMNS), state
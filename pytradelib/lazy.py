@@ -0,0 +1,39 @@
+import importlib
+import importlib.util
+
+
+class LazyModule(object):
+    '''
+    Stands in for a module until one of its attributes is first used, and
+    only then imports it (along with any of its submodules that are used as
+    attributes, eg pyarrow.parquet).
+    '''
+    def __init__(self, name, submodules=()):
+        self.__dict__['_name'] = name
+        self.__dict__['_submodules'] = submodules
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self._name)
+            for submodule in self._submodules:
+                importlib.import_module('%s.%s' % (self._name, submodule))
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return '<lazy module %r>' % self._name
+
+
+def lazy_import(name, submodules=(), optional=False):
+    '''
+    :param name: the module to import when it's first used
+    :param submodules: names of its submodules to import along with it
+    :param optional: return None (instead of a module that fails to import
+                     when used) if the module isn't installed
+    :return: a :class:`LazyModule`, or None
+    '''
+    if optional and importlib.util.find_spec(name.partition('.')[0]) is None:
+        return None
+    return LazyModule(name, submodules)
@@ -1,7 +1,8 @@
+import os
 import logging
 from logging.handlers import TimedRotatingFileHandler
 
-from pytradelib.settings import LOG_LEVEL, LOG_FILENAME
+from pytradelib.settings import LOG_DIR, LOG_LEVEL, LOG_FILENAME
 
 LEVELS = {
     'debug': logging.DEBUG,
@@ -11,9 +12,33 @@ LEVELS = {
     'critical': logging.CRITICAL,
 }
 
+
+class LazyFileHandler(logging.Handler):
+    '''
+    Writes to LOG_FILENAME, but doesn't create LOG_DIR or open the file until
+    the first record is logged, so importing pytradelib stays cheap.
+    '''
+    def __init__(self):
+        super(LazyFileHandler, self).__init__()
+        self._handler = None
+
+    def emit(self, record):
+        if self._handler is None:
+            if not os.path.exists(LOG_DIR):
+                os.makedirs(LOG_DIR)
+            self._handler = TimedRotatingFileHandler(LOG_FILENAME, 'midnight')
+            self._handler.setFormatter(self.formatter)
+        self._handler.emit(record)
+
+    def close(self):
+        if self._handler is not None:
+            self._handler.close()
+        super(LazyFileHandler, self).close()
+
+
 logger = logging.getLogger('PyTradeLib')
 logger.setLevel(LEVELS.get(LOG_LEVEL, logging.WARNING))
-handler = TimedRotatingFileHandler(LOG_FILENAME, 'midnight')
+handler = LazyFileHandler()
 handler.setFormatter(logging.Formatter(
     '%(asctime)s %(levelname)s: pytradelib.%(module)s L%(lineno)s: %(message)s',
     '%Y-%m-%d %H:%M:%S'
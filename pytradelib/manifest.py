@@ -0,0 +1,239 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+
+import pandas as pd
+
+
+# the version of the stored DataFrames' layout (their TA columns); entries
+# written under an older version have their saved TA state ignored
+SCHEMA_VERSION = 1
+
+
+class Manifest(object):
+    '''
+    A SQLite index of the files in a :class:`FileStore`, recording each
+    symbol's file, first and last bar, row count, schema version, checksum,
+    TA state and (for formats which support range reads) an index of dates
+    to positions in the file, along with any segments of bars appended since
+    the file was written. Every update is a single transaction, so the manifest
+    always describes complete files, and reading the store's contents is one
+    query instead of listing and parsing every filename.
+
+    The database isn't opened until it's first used, and each thread opens
+    its own connection (eg :class:`AsyncStore`'s readers and writer).
+
+    :param path: the path to the SQLite file
+    '''
+    filename = 'manifest.sqlite'
+
+    _columns = ['symbol', 'path', 'start', 'end', 'num_rows', 'schema_version', 'checksum']
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+        self.created = False
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self):
+        if not os.path.exists(self._path):
+            self.created = True
+        # parallel writers (see BaseStore.set_dfs) wait on each other
+        conn = sqlite3.connect(self._path, timeout=60)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                symbol TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                num_rows INTEGER,
+                schema_version INTEGER NOT NULL,
+                checksum TEXT,
+                ta_state TEXT,
+                offsets TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS segments (
+                symbol TEXT NOT NULL,
+                path TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                num_rows INTEGER NOT NULL,
+                checksum TEXT,
+                PRIMARY KEY (symbol, start)
+            )
+        ''')
+        return conn
+
+    def entries(self):
+        '''
+        :return: list of dicts with symbol, path, start, end, num_rows,
+                 schema_version, checksum and segments keys (segments
+                 being a list of (path, start, end) tuples)
+        '''
+        segments = {}
+        for symbol, path, start, end in self.conn.execute(
+                'SELECT symbol, path, start, end FROM segments ORDER BY symbol, start'):
+            segments.setdefault(symbol, []).append(
+                (self._to_path(path), pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC')))
+        rows = self.conn.execute('SELECT %s FROM files' % ', '.join(self._columns))
+        return [self._to_entry(row, segments.get(row[0], [])) for row in rows]
+
+    def get(self, symbol):
+        row = self.conn.execute('SELECT %s FROM files WHERE symbol = ?' % ', '.join(self._columns),
+                                (symbol,)).fetchone()
+        if not row:
+            return None
+        return self._to_entry(row, [(d['path'], d['start'], d['end'])
+                                    for d in self.get_segments(symbol)])
+
+    def get_segments(self, symbol):
+        '''
+        :return: list of dicts with path, start, end, num_rows and checksum keys
+        '''
+        rows = self.conn.execute('''
+            SELECT path, start, end, num_rows, checksum FROM segments
+            WHERE symbol = ? ORDER BY start
+        ''', (symbol,))
+        return [{'path': self._to_path(path),
+                 'start': pd.Timestamp(start, tz='UTC'),
+                 'end': pd.Timestamp(end, tz='UTC'),
+                 'num_rows': num_rows,
+                 'checksum': checksum_}
+                for path, start, end, num_rows, checksum_ in rows]
+
+    def set(self, symbol, path, start, end, num_rows=None, checksum=None,
+            schema_version=SCHEMA_VERSION, offsets=None):
+        '''
+        Add or replace symbol's entry (keeping its TA state).
+
+        :param offsets: list of [date in ns, position] pairs (see
+                        :meth:`FileStore._write_df`)
+        '''
+        self.set_many([{
+            'symbol': symbol,
+            'path': path,
+            'start': start,
+            'end': end,
+            'num_rows': num_rows,
+            'schema_version': schema_version,
+            'checksum': checksum,
+            'offsets': offsets,
+        }])
+
+    def set_many(self, entries):
+        '''
+        Add or replace entries (dropping any segments they had).
+        '''
+        rows = [(d['symbol'], self._from_path(d['path']),
+                 _to_nanoseconds(d['start']), _to_nanoseconds(d['end']),
+                 d.get('num_rows'), d.get('schema_version', SCHEMA_VERSION), d.get('checksum'),
+                 json.dumps(d['offsets']) if d.get('offsets') else None)
+                for d in entries]
+        with self.conn:
+            self.conn.executemany('DELETE FROM segments WHERE symbol = ?',
+                                  [(row[0],) for row in rows])
+            self.conn.executemany('''
+                INSERT INTO files (symbol, path, start, end, num_rows, schema_version, checksum, offsets)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (symbol) DO UPDATE SET
+                    path = excluded.path, start = excluded.start, end = excluded.end,
+                    num_rows = excluded.num_rows, schema_version = excluded.schema_version,
+                    checksum = excluded.checksum, offsets = excluded.offsets
+            ''', rows)
+
+    def append(self, symbol, path, start, end, num_rows, checksum=None):
+        '''
+        Add a segment of bars appended to symbol's file, extending its entry.
+        '''
+        with self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO segments (symbol, path, start, end, num_rows, checksum)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (symbol, self._from_path(path), _to_nanoseconds(start), _to_nanoseconds(end),
+                  num_rows, checksum))
+            self.conn.execute('''
+                UPDATE files SET end = ?, num_rows = num_rows + ? WHERE symbol = ?
+            ''', (_to_nanoseconds(end), num_rows, symbol))
+
+    def remove(self, symbol):
+        with self.conn:
+            self.conn.execute('DELETE FROM segments WHERE symbol = ?', (symbol,))
+            self.conn.execute('DELETE FROM files WHERE symbol = ?', (symbol,))
+
+    def get_offsets(self, symbol):
+        '''
+        :return: the offsets recorded for symbol's file (or None)
+        '''
+        row = self.conn.execute('SELECT offsets FROM files WHERE symbol = ?',
+                                (symbol,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def get_ta_state(self, symbol):
+        row = self.conn.execute('SELECT ta_state, schema_version FROM files WHERE symbol = ?',
+                                (symbol,)).fetchone()
+        if not row or not row[0] or row[1] != SCHEMA_VERSION:
+            return None
+        return json.loads(row[0])
+
+    def set_ta_state(self, symbol, state):
+        with self.conn:
+            self.conn.execute('UPDATE files SET ta_state = ? WHERE symbol = ?',
+                              (json.dumps(state) if state else None, symbol))
+
+    def _to_entry(self, row, segments):
+        d = dict(zip(self._columns, row))
+        d['path'] = self._to_path(d['path'])
+        d['start'] = pd.Timestamp(d['start'], tz='UTC')
+        d['end'] = pd.Timestamp(d['end'], tz='UTC')
+        d['segments'] = segments
+        return d
+
+    def _to_path(self, relpath):
+        return os.path.join(os.path.dirname(self._path), relpath)
+
+    def _from_path(self, path):
+        # paths are stored relative to the manifest, so the store can be moved
+        return os.path.relpath(path, os.path.dirname(self._path))
+
+    def __getstate__(self):
+        # each process opens its own connections
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+
+def checksum(path):
+    '''
+    :return: the CRC-32 of the file at path, as a hex string
+    '''
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            crc = zlib.crc32(block, crc)
+    return '%08x' % crc
+
+
+def _to_nanoseconds(dt):
+    dt = pd.Timestamp(dt)
+    if dt.tz is None:
+        dt = dt.tz_localize('UTC')
+    return dt.value
@@ -0,0 +1,166 @@
+import os
+import json
+import shutil
+import pytz
+import numpy as np
+import pandas as pd
+
+from pytradelib.settings import STORE_DIR
+
+
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+DEFAULT_FIELDS = OHLCV + ['Adj ' + field for field in OHLCV]
+
+
+class MemmapStore(object):
+    '''
+    A read-only, memory-mapped copy of the bars for the whole universe.
+
+    Every field is one flat float64 file holding all of the symbols' bars
+    end to end, and an index records each symbol's (offset, length). This
+    means :meth:`get_arrays` returns zero-copy views which the OS pages in
+    and out on demand, so screening the full universe runs in a small,
+    fixed amount of memory. Build (or rebuild) it from any other store with
+    :meth:`build`.
+
+    Each build writes its files into a new generation directory, and the
+    index names the generation it describes. Replacing the index is what
+    switches readers to the new files, so a build that fails partway
+    leaves the previous one intact.
+    '''
+    default_store_dir = os.path.join(STORE_DIR, 'memmap')
+
+    _index_filename = 'index.json'
+    _dates_filename = 'dates.i8'
+    _generation_prefix = 'gen-'
+
+    def __init__(self, store_dir=None):
+        self._store_dir = store_dir or self.default_store_dir
+        self._maps = {}
+
+        index_path = os.path.join(self._store_dir, self._index_filename)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+        else:
+            index = {'generation': 0, 'fields': [], 'symbols': {}, 'num_rows': 0}
+        self._generation = index['generation']
+        self._data_dir = _generation_dir(self._store_dir, self._generation)
+        self._fields = index['fields']
+        self._offsets = dict((symbol, tuple(offset_length))
+                             for symbol, offset_length in index['symbols'].items())
+        self._num_rows = index['num_rows']
+        self._symbols = sorted(self._offsets.keys())
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    @property
+    def fields(self):
+        return self._fields
+
+    def get_arrays(self, symbol, fields=None):
+        '''
+        :param symbol: string - the ticker
+        :param fields: list of fields (defaults to all of them)
+        :return: dict of field name to (read-only, zero-copy) numpy array
+        '''
+        offset, length = self._offsets[symbol.upper()]
+        return dict((field, self._map(field)[offset:offset+length])
+                    for field in fields or self._fields)
+
+    def get_dates(self, symbol):
+        offset, length = self._offsets[symbol.upper()]
+        return pd.to_datetime(self._map(None)[offset:offset+length], utc=True)
+
+    def get_start_date(self, symbol):
+        offset, length = self._offsets[symbol.upper()]
+        return pd.Timestamp(int(self._map(None)[offset]), tz=pytz.UTC)
+
+    def get_end_date(self, symbol):
+        offset, length = self._offsets[symbol.upper()]
+        return pd.Timestamp(int(self._map(None)[offset+length-1]), tz=pytz.UTC)
+
+    def _map(self, field):
+        '''
+        :param field: the field name, or None for the dates
+        '''
+        if field not in self._maps:
+            if field is not None and field not in self._fields:
+                raise KeyError(field)
+            dtype = np.int64 if field is None else np.float64
+            if not self._num_rows:
+                # empty files can't be memory-mapped
+                self._maps[field] = np.empty(0, dtype=dtype)
+            else:
+                self._maps[field] = np.memmap(_field_path(self._data_dir, field),
+                                              dtype=dtype, mode='r', shape=(self._num_rows,))
+        return self._maps[field]
+
+    @classmethod
+    def build(cls, store, symbols=None, fields=None, store_dir=None):
+        '''
+        Write the bars for symbols from store into a new memory-mapped store.
+        Symbols are copied one at a time, so memory use stays flat no matter
+        how large the universe is. An empty universe makes an empty store.
+
+        :param store: the store to copy from
+        :param symbols: list of symbols (defaults to all in the store)
+        :param fields: list of fields (defaults to OHLCV and adjusted OHLCV)
+        :param store_dir: where to write to (defaults to STORE_DIR/memmap)
+        :return: MemmapStore
+        '''
+        store_dir = store_dir or cls.default_store_dir
+        fields = fields or DEFAULT_FIELDS
+        symbols = [symbol.upper() for symbol in symbols or store.symbols]
+
+        previous = cls(store_dir)._generation
+        generation = previous + 1
+        data_dir = _generation_dir(store_dir, generation)
+        if os.path.exists(data_dir):
+            shutil.rmtree(data_dir)  # left behind by a build that failed
+        os.makedirs(data_dir)
+
+        paths = dict((field, _field_path(data_dir, field)) for field in [None] + fields)
+        files = dict((field, open(path, 'wb')) for field, path in paths.items())
+        offsets = {}
+        num_rows = 0
+        try:
+            for symbol in symbols:
+                # bypass the store's cache so only one symbol is held at a time
+                df = store._load_df(symbol, fields)
+                dates = df.index.tz_convert(None).values.astype('datetime64[ns]')
+                dates.astype(np.int64).tofile(files[None])
+                for field in fields:
+                    np.ascontiguousarray(df[field].values, dtype=np.float64).tofile(files[field])
+                offsets[symbol] = [num_rows, len(df)]
+                num_rows += len(df)
+        finally:
+            for f in files.values():
+                f.close()
+
+        # switch to the new generation in one step, by replacing the index
+        index_path = os.path.join(store_dir, cls._index_filename)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump({'generation': generation, 'fields': fields,
+                       'symbols': offsets, 'num_rows': num_rows}, f)
+        os.replace(index_path + '.tmp', index_path)
+
+        # keep the previous generation for readers which opened it before
+        # the swap, but remove any older ones
+        for filename in os.listdir(store_dir):
+            if filename.startswith(cls._generation_prefix) \
+                    and int(filename[len(cls._generation_prefix):]) not in (previous, generation):
+                shutil.rmtree(os.path.join(store_dir, filename))
+        return cls(store_dir)
+
+
+def _generation_dir(store_dir, generation):
+    return os.path.join(store_dir, '%s%d' % (MemmapStore._generation_prefix, generation))
+
+
+def _field_path(data_dir, field):
+    if field is None:
+        return os.path.join(data_dir, MemmapStore._dates_filename)
+    return os.path.join(data_dir, field.replace(' ', '_') + '.f8')
@@ -1,16 +1,27 @@
+import warnings
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import talib as ta
 
-from scipy import stats
+from pytradelib.lazy import lazy_import
+from pytradelib.parallel import map_shards
+
+ta = lazy_import('talib')
 
 
-def calc_metrics(df, symbol):
-    sma200 = ta.SMA(df.Close, timeperiod=200)
-    slope200, *_ = stats.linregress(range(0, 10), sma200[-10:])
-    rsi14 = ta.RSI(df.Close, timeperiod=14)
-    new_high_over_num_bars = new_high_over_num_prior_bars(df)
-    expanding_bodies, expanding_volume = expanding_bodies_and_volume(df)
-    close_crossed_200 = price_crossed_sma(df)
+def calc_metrics(df, symbol, cache=None):
+    close = df.Close.values
+    sma200 = rolling_sma(close[-209:], 200)  # the last 10 SMA values
+    slope200 = linear_slope(sma200[-10:])
+    if cache is not None:
+        rsi14 = cache.get(symbol, 'RSI', ta.RSI, df.index, close, timeperiod=14)
+    else:
+        rsi14 = ta.RSI(close, timeperiod=14)
+    new_high_over_num_bars = int(new_high_lookback(close))
+    expanding_bodies = bool(expanding(close[-3:] - df.Open.values[-3:]))
+    expanding_volume = bool(expanding(df.Volume.values[-3:]))
+    close_crossed_200 = bool(crossed_sma(df.Open.values, close))
     return pd.DataFrame.from_records([dict(
         Symbol=symbol,
         SMA200=sma200[-1],
@@ -23,6 +34,29 @@ def calc_metrics(df, symbol):
     )], index='Symbol')
 
 
+def calc_all_metrics(store, symbols=None, workers=None, cache=None):
+    """
+    Run :func:`calc_metrics` over many symbols from a store.
+
+    :param store: the store to load bars from
+    :param symbols: list of symbols (defaults to all in the store)
+    :param workers: the number of processes to shard the symbols across
+                    (defaults to doing it all in this process)
+    :param cache: an IndicatorCache (defaults to not caching indicators)
+    :return: DataFrame with a row per symbol
+    """
+    symbols = symbols or store.symbols
+    if workers and workers > 1:
+        return pd.concat(map_shards(_calc_metrics_shard, symbols, workers,
+                                    store=store, cache=cache))
+    return _calc_metrics_shard(symbols, store, cache)
+
+
+def _calc_metrics_shard(symbols, store, cache=None):
+    return pd.concat([calc_metrics(store.get_df(symbol), symbol.upper(), cache)
+                      for symbol in symbols])
+
+
 """
 metrics df:
 symbol  52w_high    52w_low     100sma(D/W/M)   200sma(D/W/M)      3month_vol      rsi
@@ -33,44 +67,224 @@ symbol  open    high    low     close   volume
 
 
 def new_high_over_num_prior_bars(df: pd.DataFrame, col: str = "Close"):
-    latest_val = df[col].iloc[-1]
-    prev_val = df[col].iloc[-2]
-    if latest_val < prev_val:
-        return 0
-
-    prior_high_timestamps = df.index[df[col] > latest_val]
-    if prior_high_timestamps.empty:
-        return len(df)
-
-    latest_ts = df.index[-1]
-    prior_high_ts = prior_high_timestamps[-1]
-    num_bars = df.index.get_loc(latest_ts) - df.index.get_loc(prior_high_ts)
-    return num_bars - 1  # subtract 1 to not count the latest/current bar
+    return int(new_high_lookback(df[col].values))
 
 
 def expanding_bodies_and_volume(df: pd.DataFrame, num_bars: int = 3, bullish: bool = True):
-    df = df[-num_bars:]
-    bodies = df.Close - df.Open
-    bodies_expanding = (bodies.sort_values(ascending=bullish).index == bodies.index).all()
-    volume_increasing = (df.sort_values('Volume').index == df.index).all()
-    return bodies_expanding, volume_increasing
+    bodies_expanding, volume_increasing = expanding_bodies_volume(
+        df.Open.values, df.Close.values, df.Volume.values, num_bars, bullish)
+    return bool(bodies_expanding), bool(volume_increasing)
 
 
 def price_crossed_sma(df: pd.DataFrame, sma: int = 200, bullish: bool = True):
     """
     Whether or not the latest bar has crossed the given SMA.
     """
-    if len(df) < sma:
-        return False
+    return bool(crossed_sma(df.Open.values, df.Close.values, sma, bullish))
+
+
+def sma(df: pd.DataFrame, sma: int = 200):
+    """
+    The latest bar's SMA value.
+    """
+    return float(last_sma(df.Close.values, sma))
+
+
+def sma_slope(df: pd.DataFrame, sma: int = 200, num_bars: int = 10):
+    """
+    The slope of the given SMA over the latest num_bars bars.
+    """
+    return float(last_sma_slope(df.Close.values, sma, num_bars))
+
+
+def rsi(df: pd.DataFrame, period: int = 14):
+    """
+    The latest bar's RSI.
+    """
+    return last_rsi(df.Close.values, period)
+
+
+"""
+Array-native versions of the above. These take numpy arrays with the bars
+along the last axis, so they work on a single symbol's 1D array as well as
+on a 2D (symbols x bars) block, which must be right-aligned (the last column
+is each symbol's latest bar) and left-padded with NaN.
+"""
+
 
-    ma = ta.SMA(df.Close[-sma:], timeperiod=sma)[-1]
-    open_ = df.Open.iloc[-1]
-    close = df.Close.iloc[-1]
-    prior_close = df.Close.iloc[-2]
+def new_high_lookback(values):
+    """
+    The number of bars since the latest value was exceeded (0 if the latest
+    value is lower than the prior one, or the number of bars if it's never
+    been exceeded).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    latest = values[..., -1]
+    # scan backwards from the prior bar for the most recent higher value
+    higher = (values[..., :-1] > latest[..., np.newaxis])[..., ::-1]
+    num_bars = np.where(higher.any(axis=-1), higher.argmax(axis=-1),
+                        (~np.isnan(values)).sum(axis=-1))
+    return np.where(latest < values[..., -2], 0, num_bars)
+
+
+def expanding(values, num_bars=3, increasing=True):
+    """
+    Whether or not each of the latest num_bars values is at least as large
+    as the one before it (or at most as large, if not increasing).
+    """
+    diffs = np.diff(np.asarray(values, dtype=np.float64)[..., -num_bars:], axis=-1)
+    if increasing:
+        return (diffs >= 0).all(axis=-1)
+    return (diffs <= 0).all(axis=-1)
+
+
+def rolling_sma(values, period):
+    """
+    The simple moving average of values, from a cumulative sum (NaN for the
+    first period - 1 bars).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] < period:
+        return result
+    total = np.cumsum(values, axis=-1)
+    result[..., period-1] = total[..., period-1]
+    result[..., period:] = total[..., period:] - total[..., :-period]
+    return result / period
+
+
+def last_sma(values, period):
+    """
+    The latest bar's simple moving average (NaN without enough bars).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] < period:
+        return np.full(values.shape[:-1], np.nan)
+    return values[..., -period:].mean(axis=-1)
+
+
+def last_sma_slope(values, sma=200, num_bars=10):
+    """
+    The slope of the given SMA over the latest num_bars bars.
+    """
+    ma = rolling_sma(np.asarray(values, dtype=np.float64)[..., -(sma + num_bars - 1):], sma)
+    return linear_slope(ma[..., -num_bars:])
+
+
+def last_rsi(values, period=14):
+    """
+    The latest bar's RSI. talib's RSI is recursive over the whole history, so
+    a 2D block's rows are computed one at a time (talib skips their padding).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return ta.RSI(values, timeperiod=period)[-1]
+    result = np.full(len(values), np.nan)
+    for i, row in enumerate(values):
+        if not np.isnan(row[-1]):
+            result[i] = ta.RSI(row, timeperiod=period)[-1]
+    return result
+
+
+def expanding_bodies_volume(open_, close, volume, num_bars=3, bullish=True):
+    """
+    Whether or not the latest num_bars bodies are expanding (in the bullish
+    or bearish direction), and whether or not the volume is.
+    """
+    bodies = np.asarray(close, dtype=np.float64)[..., -num_bars:] \
+        - np.asarray(open_, dtype=np.float64)[..., -num_bars:]
+    return expanding(bodies, num_bars, increasing=bullish), expanding(volume, num_bars)
+
+
+def linear_slope(values):
+    """
+    The least squares slope of values against 0, 1, 2, ... (in closed form).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = np.arange(values.shape[-1]) - (values.shape[-1] - 1) / 2.0
+    return (values * x).sum(axis=-1) / (x * x).sum()
+
+
+def crossed_sma(open_, close, sma=200, bullish=True):
+    """
+    Whether or not the latest bar crossed the given SMA, either intraday or
+    by gapping over it.
+    """
+    open_ = np.asarray(open_, dtype=np.float64)[..., -1]
+    ma = last_sma(close, sma)
+    prior_close, close = np.asarray(close, dtype=np.float64)[..., -2:].T
     if bullish:
-        intraday_cross = (open_ < ma) and (close > ma)
-        gap_cross = (prior_close < ma) and (open_ > ma)
+        intraday_cross = (open_ < ma) & (close > ma)
+        gap_cross = (prior_close < ma) & (open_ > ma)
     else:
-        intraday_cross = (open_ > ma) and (close < ma)
-        gap_cross = (prior_close > ma) and (open_ < ma)
-    return intraday_cross or gap_cross
+        intraday_cross = (open_ > ma) & (close < ma)
+        gap_cross = (prior_close > ma) & (open_ < ma)
+    return intraday_cross | gap_cross
+
+
+def analyze_arrays(previous_close, close, high, low, volume, dollar_volume, atr, sma100, sma200):
+    """
+    Compute the store's analysis metrics for many symbols at once.
+
+    The 2D arrays are (symbols x bars) and hold each symbol's most recent year
+    of bars, right-aligned (so the last column is each symbol's latest bar)
+    and left-padded with NaN. The 1D arrays hold one value per symbol.
+
+    :param previous_close: 1D array of each symbol's prior close
+    :param close, high, low, volume, dollar_volume, atr: 2D arrays
+    :param sma100, sma200: 1D arrays of each symbol's latest SMA values
+    :return: OrderedDict of metric name to 1D array
+    """
+    today_close = close[:, -1]
+    with warnings.catch_warnings():
+        # symbols with only one bar in their year have all-NaN priors
+        warnings.simplefilter('ignore', RuntimeWarning)
+        year_low = np.nanmin(low[:, :-1], axis=1)
+        year_high = np.nanmax(high[:, :-1], axis=1)
+        dv_min = np.nanmin(dollar_volume, axis=1)
+        dv_25, dv_50, dv_75 = np.nanpercentile(dollar_volume, [25, 50, 75], axis=1)
+        atr_median = np.nanmedian(atr, axis=1)
+
+    def within_percent_of(price, value, percent):
+        diff = percent * 0.01 * 0.5 * value
+        return ((value - diff) < price) & (price < (value + diff))
+
+    lower = np.minimum(previous_close, today_close)
+    upper = np.maximum(previous_close, today_close)
+
+    def crossed(value):
+        return (lower < value) & (value < upper)
+
+    def to_int(values):
+        # int() truncates, as does astype (but NaNs can't be cast)
+        return values.astype(np.int64) if np.isfinite(values).all() else np.trunc(values)
+
+    return OrderedDict([
+        # last-bar metrics
+        ('previous_close', previous_close),
+        ('close', today_close),
+        ('percent_change', (today_close - previous_close) / previous_close * 100),
+        ('dollar_volume', dollar_volume[:, -1]),
+        ('percent_of_median_volume', (volume[:, -1] * today_close) / dv_50),
+        ('advancing', today_close > previous_close),
+        ('declining', today_close < previous_close),
+        ('new_low', today_close < year_low),
+        ('new_high', today_close > year_high),
+        ('percent_of_high', today_close / year_high),
+        ('near_sma100', within_percent_of(today_close, sma100, 2)),
+        ('near_sma200', within_percent_of(today_close, sma200, 2)),
+        ('crossed_sma100', crossed(sma100)),
+        ('crossed_sma200', crossed(sma200)),
+        ('crossed_5', crossed(5)),
+        ('crossed_10', crossed(10)),
+        ('crossed_50', crossed(50)),
+        ('crossed_100', crossed(100)),
+
+        # stock "health" metrics
+        ('year_high', year_high),
+        ('year_low', year_low),
+        ('min_volume', to_int(dv_min)),
+        ('dollar_volume_25th_percentile', to_int(dv_25)),
+        ('dollar_volume_75th_percentile', to_int(dv_75)),
+        ('atr', atr_median),
+    ])
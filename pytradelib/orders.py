@@ -0,0 +1,335 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from pytradelib.lazy import lazy_import
+from pytradelib.settings import COMMISSION, MAX_AMOUNT
+
+# only needed for batches of orders, so single-order CLIs don't pay for it
+pd = lazy_import('pandas')
+
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+def calculate_quantity(entry_price, max_amount, lot_size=100):
+    '''
+    The largest quantity, in lots of lot_size (or, if not even one lot is
+    affordable, lots of a tenth as many shares, and so on), whose cost is
+    within 95% of max_amount (leaving room for commission and slippage).
+
+    :param entry_price: a price, or an array of prices
+    :param max_amount: the maximum dollar amount (or an array of them)
+    :return: int quantity, or an array of them
+    '''
+    quantity = (0.95 * np.asarray(max_amount, dtype=np.float64)) \
+        / np.asarray(entry_price, dtype=np.float64)
+    result = np.zeros_like(quantity)
+    while lot_size > 1e-6 and (result == 0).any():
+        result = np.where(result == 0, quantity - (quantity % lot_size), result)
+        lot_size /= 10
+    result = result.astype(np.int64)
+    return int(result) if result.ndim == 0 else result
+
+
+# every function below takes scalars or (broadcastable) arrays; a target
+# or stop price is on the profit or loss side of price for both buys and
+# sells, so none of them need the action
+
+
+def cost(price, quantity, commission):
+    return (price * quantity) + commission
+
+
+def risk(price, quantity, stop_price, commission):
+    return np.abs(quantity * (price - stop_price)) + (2 * commission)
+
+
+def half_target_price(price, target_price):
+    return price + ((target_price - price) / 2)
+
+
+def half_target_profit(price, quantity, target_price, commission):
+    return np.abs((quantity / 2) * (half_target_price(price, target_price) - price)) - commission
+
+
+def target_profit(price, quantity, target_price, commission):
+    return np.abs((quantity / 2) * (target_price - price)) - commission
+
+
+def total_profit(price, quantity, target_price, commission):
+    return half_target_profit(price, quantity, target_price, commission) \
+        + target_profit(price, quantity, target_price, commission) - commission
+
+
+def risk_reward(price, quantity, target_price, stop_price, commission):
+    return total_profit(price, quantity, target_price, commission) \
+        / risk(price, quantity, stop_price, commission)
+
+
+class Order(NamedTuple):
+    '''
+    An entry order: a limit order at price, or a stop-limit order if it has
+    a stop_price.
+    '''
+    action: str
+    symbol: str
+    quantity: int
+    price: float
+    stop_price: Optional[float] = None
+
+
+class _memoized(object):
+    '''
+    A read-only property computed on first access and stored in the
+    instance's '_<name>' slot.
+    '''
+    def __init__(self, func):
+        self._func = func
+        self._slot = '_' + func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self._slot)
+        except AttributeError:
+            value = self._func(obj)
+            setattr(obj, self._slot, value)
+            return value
+
+
+_DERIVED = ['cost', 'risk', 'half_target_price', 'half_target_profit',
+            'target_profit', 'total_profit', 'risk_reward']
+
+
+class _BracketMath(object):
+    '''
+    The derived fields of bracket orders, for classes with price, quantity,
+    target_price, stop_price and commission attributes (scalars or arrays).
+    Each is computed once, reusing the others.
+    '''
+    __slots__ = ()
+
+    @_memoized
+    def cost(self):
+        return cost(self.price, self.quantity, self.commission)
+
+    @_memoized
+    def risk(self):
+        return risk(self.price, self.quantity, self.stop_price, self.commission)
+
+    @_memoized
+    def half_target_price(self):
+        return half_target_price(self.price, self.target_price)
+
+    @_memoized
+    def half_target_profit(self):
+        return abs((self.quantity / 2) * (self.half_target_price - self.price)) - self.commission
+
+    @_memoized
+    def target_profit(self):
+        return target_profit(self.price, self.quantity, self.target_price, self.commission)
+
+    @_memoized
+    def total_profit(self):
+        return self.half_target_profit + self.target_profit - self.commission
+
+    @_memoized
+    def risk_reward(self):
+        return self.total_profit / self.risk
+
+
+class Bracket(_BracketMath):
+    '''
+    An entry order with a profit target (scaled out of half way there, see
+    SCALE_OUT_LEVELS) and a stop loss.
+
+    :param entry: the entry :class:`Order`
+    :param target_price: the price to take the rest of the profit at
+    :param stop_price: the stop loss price
+    :param commission: the commission per fill
+    '''
+    __slots__ = ['entry', 'target_price', 'stop_price', 'commission'] \
+        + ['_' + name for name in _DERIVED]
+
+    def __init__(self, entry, target_price, stop_price, commission=COMMISSION):
+        self.entry = entry
+        self.target_price = target_price
+        self.stop_price = stop_price
+        self.commission = commission
+
+    @property
+    def price(self):
+        return self.entry.price
+
+    @property
+    def quantity(self):
+        return self.entry.quantity
+
+    def __repr__(self):
+        return 'Bracket(%r, target_price=%r, stop_price=%r, commission=%r)' % (
+            self.entry, self.target_price, self.stop_price, self.commission)
+
+
+class OrderBook(_BracketMath):
+    '''
+    Many bracket orders, held as a NumPy array per field (entry_stop is NaN
+    for limit entries), with the same derived fields as :class:`Bracket`
+    (as arrays).
+    '''
+    __slots__ = ['action', 'symbol', 'quantity', 'price', 'entry_stop',
+                 'target_price', 'stop_price', 'commission'] \
+        + ['_' + name for name in _DERIVED]
+
+    def __init__(self, action, symbol, quantity, price, target_price, stop_price,
+                 entry_stop=None, commission=COMMISSION):
+        self.action = np.asarray(action, dtype=object)
+        self.symbol = np.asarray(symbol, dtype=object)
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.entry_stop = np.full(len(self.price), np.nan) if entry_stop is None \
+            else np.asarray(entry_stop, dtype=np.float64)
+        self.target_price = np.asarray(target_price, dtype=np.float64)
+        self.stop_price = np.asarray(stop_price, dtype=np.float64)
+        self.commission = commission
+
+    @classmethod
+    def from_brackets(cls, brackets):
+        brackets = list(brackets)
+        return cls(
+            [b.entry.action for b in brackets],
+            [b.entry.symbol for b in brackets],
+            [b.quantity for b in brackets],
+            [b.price for b in brackets],
+            [b.target_price for b in brackets],
+            [b.stop_price for b in brackets],
+            [np.nan if b.entry.stop_price is None else b.entry.stop_price for b in brackets],
+            brackets[0].commission if brackets else COMMISSION,
+        )
+
+    @classmethod
+    def from_frame(cls, df, commission=COMMISSION):
+        '''
+        :param df: DataFrame with the columns of :func:`plan_orders`' entries
+                   (and a quantity for every row)
+        '''
+        return cls(df['action'].values, df['symbol'].values, df['quantity'].values,
+                   df['price'].values, df['target_price'].values, df['stop_price'].values,
+                   df['entry_stop'].values if 'entry_stop' in df else None, commission)
+
+    def to_frame(self):
+        '''
+        :return: DataFrame of every field, including the derived ones
+        '''
+        columns = ['symbol', 'action', 'quantity', 'price', 'entry_stop',
+                   'target_price', 'stop_price'] + _DERIVED
+        return pd.DataFrame(dict((column, getattr(self, column)) for column in columns),
+                            columns=columns)
+
+    def __len__(self):
+        return len(self.price)
+
+    def __getitem__(self, i):
+        entry_stop = self.entry_stop[i]
+        entry = Order(self.action[i], self.symbol[i], int(self.quantity[i]), float(self.price[i]),
+                      None if np.isnan(entry_stop) else float(entry_stop))
+        return Bracket(entry, float(self.target_price[i]), float(self.stop_price[i]),
+                       self.commission)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def read_entries(path):
+    '''
+    Read a file of entries for :func:`plan_orders`: a CSV, or JSON lines if
+    the filename ends with .jsonl.
+    '''
+    if path.endswith('.jsonl'):
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+def entries_from_screen(screen, store, action=BUY, stop_atr=1.0, target_atr=3.0):
+    '''
+    Make entries for the symbols a :class:`Screener` passed, buying (or
+    selling) at the latest close with the stop and target that many ATRs
+    away.
+
+    The stored atr is talib's NATR (the ATR of the adjusted bars, as a
+    percentage of the adjusted close), so it's converted to dollars at the
+    latest unadjusted close the orders are priced at.
+
+    :param screen: DataFrame indexed by symbol (eg the result of Screener.run)
+    :param store: the store the screen was run over
+    :return: DataFrame of entries for :func:`plan_orders`
+    '''
+    symbols = list(screen.index)
+    sign = 1 if action == BUY else -1
+    last = pd.DataFrame([store.get_df(symbol, columns=['Close', 'atr']).iloc[-1]
+                         for symbol in symbols])
+    close = last['Close'].values
+    atr = close * last['atr'].values / 100
+    return pd.DataFrame({
+        'symbol': symbols,
+        'action': action,
+        'price': close,
+        'target_price': close + sign * target_atr * atr,
+        'stop_price': close - sign * stop_atr * atr,
+    })
+
+
+def plan_orders(entries, max_amount=MAX_AMOUNT, commission=COMMISSION):
+    '''
+    Size and price bracket orders for many entries at once, ranked by their
+    risk/reward.
+
+    :param entries: DataFrame with symbol (or ticker), action (BUY or SELL),
+                    price (the entry limit), target_price and stop_price
+                    columns, and optionally entry_stop (for stop-limit
+                    entries) and quantity (defaults to
+                    :func:`calculate_quantity`)
+    :param max_amount: the maximum dollar amount per order
+    :param commission: the commission per fill
+    :return: DataFrame of the orders with their cost, targets, profits, risk
+             and risk/reward, best first; orders which don't make sense (eg a
+             buy with its target below its price) have an error instead, and
+             come last
+    '''
+    df = entries.rename(columns={'ticker': 'symbol'}).reset_index(drop=True)
+    df['symbol'] = df['symbol'].str.upper()
+    df['action'] = df['action'].str.upper()
+    df['price'] = df['price'].astype(np.float64)
+    if 'entry_stop' not in df:
+        df['entry_stop'] = np.nan
+    quantity = calculate_quantity(df['price'].values, max_amount)
+    if 'quantity' in df:
+        quantity = np.where(df['quantity'].isnull(), quantity, df['quantity'].fillna(0))
+    df['quantity'] = quantity.astype(np.int64)
+
+    # like trade.py, accept the target and stop in either order
+    price = df['price'].values
+    sign = np.where(df['action'].values == SELL, -1.0, 1.0)
+    first, second = df['target_price'].values * sign, df['stop_price'].values * sign
+    df['target_price'] = np.maximum(first, second) * sign
+    df['stop_price'] = np.minimum(first, second) * sign
+    target_price, stop_price = df['target_price'].values, df['stop_price'].values
+
+    error = np.full(len(df), None, dtype=object)
+    entry_stop = df['entry_stop'].values * sign
+    error = np.where((entry_stop >= price * sign), 'entry stop must be before the price', error)
+    error = np.where(stop_price * sign >= price * sign, 'stop must be past the price', error)
+    error = np.where(target_price * sign <= price * sign, 'target must be past the price', error)
+    error = np.where(~np.isin(df['action'].values, [BUY, SELL]), 'action must be BUY or SELL', error)
+    df['error'] = error
+
+    book = OrderBook.from_frame(df, commission)
+    for name in _DERIVED:
+        df[name] = getattr(book, name)
+
+    df['_valid'] = df['error'].isnull()
+    df = df.sort_values(['_valid', 'risk_reward'], ascending=False, kind='stable')
+    return df.drop(columns='_valid').reset_index(drop=True)
@@ -0,0 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from pytradelib.utils import chunk
+
+
+# the number of shards to split the work into per worker, so that a few slow
+# shards don't leave the rest of the pool sitting idle
+SHARDS_PER_WORKER = 4
+
+
+def shard(items, workers):
+    '''
+    Split items into contiguous shards (preserving their order).
+    '''
+    items = list(items)
+    size = max(1, -(-len(items) // (workers * SHARDS_PER_WORKER)))
+    return list(chunk(items, size))
+
+
+def map_shards(func, items, workers, **kwargs):
+    '''
+    Call func(shard, **kwargs) on shards of items in a pool of worker processes.
+    func and kwargs must be picklable (eg a module-level function and a store,
+    which pickles without its cache so every worker loads its own data).
+
+    :return: list of results, in the same order as the shards (so that merging
+             them is deterministic no matter which worker finished first)
+    '''
+    shards = shard(items, workers)
+    if not shards:
+        return []
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+        return list(pool.map(partial(func, **kwargs), shards))
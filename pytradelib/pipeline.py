@@ -0,0 +1,148 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pytradelib.logger import logger
+from pytradelib.parallel import map_shards
+from pytradelib.utils import csv_to_df
+
+
+# the maximum number of items waiting between stages; a full queue makes the
+# stage before it wait, so at most this many responses/DataFrames are held
+QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+async def stream_to_store(provider, store, symbols, start=None, end=None,
+                          parse_workers=2, parse_processes=False,
+                          queue_size=QUEUE_SIZE, parse=csv_to_df):
+    '''
+    Download bars for symbols and write them to store, yielding
+    (symbol, error) tuples as each symbol finishes (error is None on success).
+
+    The work runs as three concurrent stages joined by bounded queues:
+    downloading (the provider's :meth:`iter_download`), parsing (in a pool of
+    parse_workers threads, or processes if parse_processes is True) and
+    writing (:meth:`store.set_df`, which computes the TA, in a single thread
+    so the store is only ever touched serially).
+    Each response is written as soon as it is parsed, so memory use stays
+    flat and the parsing and TA overlap with the network I/O.
+
+    :param provider: a data provider with an async iter_download method
+    :param store: the store to write to
+    :param symbols: list of symbols, dict of symbol to start/end dates, or an
+                    async iterable of symbols (which are downloaded as they
+                    arrive)
+    :param parse: function converting a response body to a DataFrame (must
+                  be picklable if parse_processes is True)
+    '''
+    loop = asyncio.get_running_loop()
+    parse_queue = asyncio.Queue(queue_size)
+    write_queue = asyncio.Queue(queue_size)
+    results = asyncio.Queue()
+    parse_pool = (ProcessPoolExecutor if parse_processes else ThreadPoolExecutor)(parse_workers)
+    write_pool = ThreadPoolExecutor(1)
+
+    async def download():
+        async for symbol, body in provider.iter_download(symbols, start, end):
+            if isinstance(body, Exception):
+                await results.put((symbol, body))
+            else:
+                await parse_queue.put((symbol, body))
+        for _ in range(parse_workers):
+            await parse_queue.put(_DONE)
+
+    async def parse_one():
+        while True:
+            item = await parse_queue.get()
+            if item is _DONE:
+                return
+            symbol, body = item
+            try:
+                df = await loop.run_in_executor(parse_pool, parse, body)
+            except Exception as e:
+                await results.put((symbol, e))
+            else:
+                await write_queue.put((symbol, df))
+
+    async def parse_all():
+        await asyncio.gather(*[parse_one() for _ in range(parse_workers)])
+        await write_queue.put(_DONE)
+
+    async def write():
+        while True:
+            item = await write_queue.get()
+            if item is _DONE:
+                break
+            symbol, df = item
+            try:
+                await loop.run_in_executor(write_pool, store.set_df, symbol, df)
+            except Exception as e:
+                await results.put((symbol, e))
+            else:
+                await results.put((symbol, None))
+        await results.put(_DONE)
+
+    def raise_errors(task):
+        # an unexpected error in any stage ends the pipeline
+        if not task.cancelled() and task.exception() is not None:
+            results.put_nowait(task.exception())
+
+    tasks = [asyncio.ensure_future(stage()) for stage in (download, parse_all, write)]
+    for task in tasks:
+        task.add_done_callback(raise_errors)
+    try:
+        while True:
+            item = await results.get()
+            if item is _DONE:
+                break
+            elif isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        parse_pool.shutdown(wait=False)
+        # let any in-progress write finish, so no symbol is left half-written
+        write_pool.shutdown(wait=True)
+
+
+def parse_csvs(symbol_csvs, workers=None, parse=csv_to_df):
+    '''
+    Parse a batch of responses, optionally across a pool of processes.
+
+    :param symbol_csvs: dict of symbol to CSV bytes (or str)
+    :param workers: the number of processes to parse with (defaults to
+                    parsing them all in this process)
+    :param parse: function converting a response body to a DataFrame
+    :return: dict of symbol to DataFrame
+    '''
+    if workers and workers > 1:
+        results = {}
+        for shard in map_shards(_parse_shard, symbol_csvs.items(), workers, parse=parse):
+            results.update(shard)
+        return results
+    return _parse_shard(symbol_csvs.items(), parse)
+
+
+def _parse_shard(items, parse):
+    return dict((symbol, parse(csv)) for symbol, csv in items)
+
+
+def download_to_store(provider, store, symbols, start=None, end=None, **kwargs):
+    '''
+    A blocking wrapper around :func:`stream_to_store`.
+
+    :return: list of the symbols that were written
+    '''
+    async def run():
+        written = []
+        async for symbol, error in stream_to_store(provider, store, symbols,
+                                                   start, end, **kwargs):
+            if error is None:
+                written.append(symbol)
+                logger.debug('stored ' + symbol)
+            else:
+                logger.error('failed to store %s: %s' % (symbol, error))
+        return written
+    return asyncio.run(run())
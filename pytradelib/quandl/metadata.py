@@ -1,8 +1,9 @@
 import csv
-import requests
 import pandas as pd
 from zipfile import ZipFile
-from io import StringIO
+from io import BytesIO, StringIO
+
+from pytradelib.http_client import get_client
 
 
 URL = 'https://www.quandl.com/api/v3/databases/%(dataset)s/codes'
@@ -13,9 +14,9 @@ def dataset_url(dataset):
 
 
 def download_file(url):
-    r = requests.get(url)
-    if r.status_code == 200:
-        return StringIO(r.text)
+    # the codes files only change daily, so this is usually a 304 (or, within
+    # one process, no request at all)
+    return BytesIO(get_client().get(url))
 
 
 def unzip(file_):
@@ -24,36 +25,53 @@ def unzip(file_):
 
 
 def unzip_files(file_):
+    '''
+    :return: dict of filename to its (raw bytes) contents
+    '''
     d = {}
     with ZipFile(file_, 'r') as zipfile:
         for filename in zipfile.namelist():
-            d[filename] = str(zipfile.read(filename))
+            d[filename] = zipfile.read(filename)
     return d
 
 
-def csv_rows(str):
-    for row in csv.reader(StringIO(str)):
+def csv_rows(csv_):
+    if isinstance(csv_, bytes):
+        csv_ = csv_.decode('utf-8')
+    for row in csv.reader(StringIO(csv_)):
         yield row
 
 
-def csv_dicts(str, fieldnames=None):
-    for d in csv.DictReader(StringIO(str), fieldnames=fieldnames):
+def csv_dicts(csv_, fieldnames=None):
+    if isinstance(csv_, bytes):
+        csv_ = csv_.decode('utf-8')
+    for d in csv.DictReader(StringIO(csv_), fieldnames=fieldnames):
         yield d
 
 
-def get_symbols_list(dataset):
+def read_codes(dataset):
+    '''
+    :return: DataFrame of the dataset's codes (eg 'WIKI/AAPL') and their names,
+             parsed straight from the unzipped bytes
+    '''
     csv_ = unzip(download_file(dataset_url(dataset)))
-    return map(lambda x: x[0].replace(dataset + '/', ''), csv_rows(csv_))
+    return pd.read_csv(BytesIO(csv_), header=None, names=['code', 'name'],
+                       dtype=str, keep_default_na=False, engine='c')
+
+
+def get_symbols_list(dataset):
+    codes = read_codes(dataset).code
+    return codes.str.replace(dataset + '/', '', regex=False).tolist()
 
 
 def get_symbols_dict(dataset):
-    csv_ = unzip(download_file(dataset_url(dataset)))
-    return dict(csv_rows(csv_))
+    codes = read_codes(dataset)
+    return dict(zip(codes.code, codes.name))
 
 
 def get_symbols_df(dataset):
-    csv_ = unzip(download_file(dataset_url(dataset)))
-    df = pd.read_csv(StringIO(csv_), header=None, names=['symbol', 'company'])
-    df.symbol = df.symbols.map(lambda x: x.replace(dataset + '/', ''))
-    df.company = df.company.map(lambda x: x.replace('Prices, Dividends, Splits and Trading Volume', ''))
-    return df
+    codes = read_codes(dataset)
+    return pd.DataFrame({
+        'symbol': codes.code.str.replace(dataset + '/', '', regex=False),
+        'company': codes.name.str.replace('Prices, Dividends, Splits and Trading Volume', '', regex=False),
+    })
@@ -1,16 +1,23 @@
 import os
 import sys
 
-from pandas.io.common import urlencode as _encode_url
+from urllib.parse import urlencode as _encode_url
 
-from pytradelib.downloader import Downloader
+from pytradelib.downloader import Downloader, read_bytes
+from pytradelib.pipeline import parse_csvs
 from pytradelib.utils import _sanitize_dates, csv_to_df
 
 
 class QuandlDailyWikiProvider(object):
-    def __init__(self, api_key=None, batch_size=20, sleep=20):
+    # Quandl allows authenticated users 300 calls per 10 seconds
+    rate_limit = (300, 10)
+
+    def __init__(self, api_key=None, batch_size=20, rate_limit=None, parse_workers=None):
         self._api_key = api_key
-        self._downloader = Downloader(batch_size=batch_size, sleep=sleep)
+        self._parse_workers = parse_workers
+        # the responses are parsed from the raw bytes, so skip decoding them
+        self._downloader = Downloader(batch_size=batch_size, handle_resp=read_bytes,
+                                      rate_limit=rate_limit or self.rate_limit)
 
     @property
     def api_key(self):
@@ -25,21 +32,44 @@ class QuandlDailyWikiProvider(object):
             url = self._construct_url(symbols, start, end)
             csv = self._downloader.download(url)
             return csv_to_df(csv)
+
+        csvs = {}
+        for url, csv in self._downloader.download(self._construct_urls(symbols, start, end)):
+            symbol = self._url_to_symbol(url)
+            if isinstance(csv, Exception):
+                print('failed to download %s: %s' % (symbol, csv))
+                continue
+            csvs[symbol] = csv
+        results = parse_csvs(csvs, workers=self._parse_workers)
+        print('parsed results for %d symbols' % len(results))
+        return results
+
+    async def iter_download(self, symbols, start=None, end=None):
+        '''
+        Like :meth:`download`, but yields (symbol, csv_bytes_or_error) tuples
+        as each response arrives, leaving the parsing to the caller.
+        '''
+        urls = self._construct_urls(symbols, start, end)
+        async for url, csv in self._downloader.iter_download(urls):
+            yield self._url_to_symbol(url), csv
+
+    def _construct_urls(self, symbols, start=None, end=None):
+        if hasattr(symbols, '__aiter__'):
+            return self._iter_urls(symbols, start, end)
+        elif isinstance(symbols, str):
+            return [self._construct_url(symbols, start, end)]
         elif isinstance(symbols, (list, tuple)):
-            urls = [self._construct_url(symbol, start, end)
+            return [self._construct_url(symbol, start, end)
                     for symbol in symbols]
         elif isinstance(symbols, dict):
-            urls = [self._construct_url(symbol, d['start'], d['end'])
+            return [self._construct_url(symbol, d['start'], d['end'])
                     for symbol, d in symbols.items()]
-        else:
-            raise Exception('symbols must be a string, a list of strings, or a dict of string to start/end dates')
+        raise Exception('symbols must be a string, a list of strings, a dict of string to start/end dates, '
+                        'or an async iterable of strings')
 
-        results = {}
-        for url, csv in self._downloader.download(urls):
-            symbol, df = self._url_to_symbol(url), csv_to_df(csv)
-            results[symbol] = df
-            print('parsed results for ' + symbol)
-        return results
+    async def _iter_urls(self, symbols, start=None, end=None):
+        async for symbol in symbols:
+            yield self._construct_url(symbol, start, end)
 
     def _construct_url(self, symbol, start=None, end=None):
         """
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from pytradelib.indicators import COLUMNS as TA_COLUMNS
+
+
+# the supported timeframes, and the pandas periods their bars span
+# (weeks end on Friday, the last session of a regular week)
+TIMEFRAMES = {
+    'D': None,
+    'W': 'W-FRI',
+    'M': 'M',
+}
+
+# how each column of the daily bars is aggregated into a longer bar (the
+# adjusted columns are aggregated like their unadjusted counterparts); any
+# other column takes its value from the period's last bar
+AGGREGATIONS = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'Ex-Dividend': 'sum',
+    'Split Ratio': 'prod',
+}
+
+
+def resample_bars(df, timeframe):
+    '''
+    Aggregate daily bars into weekly ('W') or monthly ('M') bars.
+
+    Each bar is dated by the last daily bar in its period, so the bar for
+    the current, still incomplete, period is dated by the latest session
+    (and is replaced as more of the period's bars arrive). Any TA columns
+    are dropped; they don't aggregate, and are computed on the new bars.
+
+    :param df: DataFrame of daily bars
+    :param timeframe: 'W' or 'M'
+    :return: DataFrame
+    '''
+    periods = to_periods(df.index, timeframe)
+    columns = [column for column in df.columns if column not in TA_COLUMNS]
+    grouped = df[columns].groupby(periods, sort=False)
+    resampled = grouped.agg(dict((column, _aggregation(column)) for column in columns))
+    resampled.index = df.index[_last_positions(periods)]
+    return resampled
+
+
+def period_start(dt, timeframe):
+    '''
+    :return: the first day of the period containing dt, as a Timestamp in
+             dt's timezone
+    '''
+    dt = pd.Timestamp(dt)
+    start = dt.tz_localize(None).to_period(TIMEFRAMES[timeframe]).start_time
+    return start.tz_localize(dt.tz) if dt.tz is not None else start
+
+
+def to_periods(index, timeframe):
+    '''
+    :return: PeriodIndex of the period each date in index falls in
+    '''
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.to_period(TIMEFRAMES[timeframe])
+
+
+def _aggregation(column):
+    if column.startswith('Adj '):
+        column = column[len('Adj '):]
+    return AGGREGATIONS.get(column, 'last')
+
+
+def _last_positions(periods):
+    # the dates are sorted, so a period's last bar is the one before the next
+    # period's first
+    codes = periods.asi8
+    return np.flatnonzero(np.append(codes[1:] != codes[:-1], True))
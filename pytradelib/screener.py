@@ -0,0 +1,213 @@
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from pytradelib import metrics
+from pytradelib.parallel import map_shards
+
+
+class Metric(object):
+    '''
+    A per-symbol metric for the :class:`Screener`.
+
+    :param name: the column name, or a tuple of names if func returns a tuple
+    :param func: function taking a DataFrame of bars, returning the value(s)
+    :param dtype: the column dtype (eg float, int or bool)
+    :param array_func: optionally, the same metric for many symbols at once:
+                       a function taking a (symbols x bars) array of each of
+                       fields (see :mod:`pytradelib.metrics`), returning an
+                       array (or a tuple of them) with a value per symbol
+    :param fields: the columns array_func takes
+    '''
+    def __init__(self, name, func, dtype=float, array_func=None, fields=('Close',)):
+        self.names = name if isinstance(name, tuple) else (name,)
+        self.func = func
+        self.dtype = dtype
+        self.array_func = array_func
+        self.fields = fields
+
+    def __call__(self, df):
+        values = self.func(df)
+        return values if len(self.names) > 1 else (values,)
+
+    def evaluate_arrays(self, arrays):
+        values = self.array_func(*[arrays[field] for field in self.fields])
+        return values if len(self.names) > 1 else (values,)
+
+    def __repr__(self):
+        return 'Metric(%s)' % ', '.join(self.names)
+
+
+class Filter(object):
+    '''
+    A per-symbol predicate for the :class:`Screener`. Symbols failing it are
+    dropped from the results, and none of the steps after it get evaluated.
+
+    :param name: a description of the filter
+    :param predicate: function taking a DataFrame of bars, returning a bool
+    :param array_predicate: optionally, the same predicate for many symbols
+                            at once (see :class:`Metric`'s array_func)
+    :param fields: the columns array_predicate takes
+    '''
+    def __init__(self, name, predicate, array_predicate=None, fields=('Close',)):
+        self.name = name
+        self.predicate = predicate
+        self.array_func = array_predicate
+        self.fields = fields
+
+    def __call__(self, df):
+        return bool(self.predicate(df))
+
+    def evaluate_arrays(self, arrays):
+        return self.array_func(*[arrays[field] for field in self.fields])
+
+    def __repr__(self):
+        return 'Filter(%s)' % self.name
+
+
+def _has_min_bars(df, num_bars):
+    return len(df) >= num_bars
+
+
+def _min_close(df, price):
+    return df.Close.iloc[-1] >= price
+
+
+def _have_min_bars(close, num_bars):
+    return (~np.isnan(close)).sum(axis=-1) >= num_bars
+
+
+def _min_closes(close, price):
+    return close[..., -1] >= price
+
+
+def min_bars(num_bars):
+    return Filter('min_bars(%d)' % num_bars, partial(_has_min_bars, num_bars=num_bars),
+                  partial(_have_min_bars, num_bars=num_bars))
+
+
+def min_close(price):
+    return Filter('min_close(%s)' % price, partial(_min_close, price=price),
+                  partial(_min_closes, price=price))
+
+
+SMA200 = Metric('SMA200', partial(metrics.sma, sma=200),
+                array_func=partial(metrics.last_sma, period=200))
+SLOPE200 = Metric('Slope200', partial(metrics.sma_slope, sma=200),
+                  array_func=partial(metrics.last_sma_slope, sma=200))
+RSI = Metric('RSI', partial(metrics.rsi, period=14),
+             array_func=partial(metrics.last_rsi, period=14))
+NEW_HIGH_OVER_NUM_BARS = Metric('NewHighOverNumBars', metrics.new_high_over_num_prior_bars, int,
+                                array_func=metrics.new_high_lookback)
+EXPANDING_BODIES_AND_VOLUME = Metric(('ExpandingBodies', 'ExpandingVolume'),
+                                     metrics.expanding_bodies_and_volume, bool,
+                                     array_func=metrics.expanding_bodies_volume,
+                                     fields=('Open', 'Close', 'Volume'))
+CLOSE_CROSSED_200 = Metric('CloseCrossed200', metrics.price_crossed_sma, bool,
+                           array_func=metrics.crossed_sma, fields=('Open', 'Close'))
+
+# the same columns as metrics.calc_metrics
+DEFAULT_STEPS = [
+    SMA200,
+    SLOPE200,
+    RSI,
+    NEW_HIGH_OVER_NUM_BARS,
+    EXPANDING_BODIES_AND_VOLUME,
+    CLOSE_CROSSED_200,
+]
+
+
+class Screener(object):
+    '''
+    Evaluates metrics for many symbols at once into a single result frame.
+
+    Symbols are screened block_size at a time. Steps with an array form are
+    evaluated for the whole block at once, over its bars stacked into right-
+    aligned (symbols x bars) arrays; any others are called symbol by symbol.
+    Steps are evaluated in order, so put cheap filters before expensive
+    metrics: symbols failing a filter are dropped from the block before the
+    steps after it. Functions must be picklable (ie module-level functions or
+    partials of them, not lambdas) to use workers.
+
+    :param store: the store to load bars from
+    :param steps: list of :class:`Metric` and :class:`Filter` instances
+                  (defaults to the same metrics as :func:`metrics.calc_metrics`)
+    :param block_size: the number of symbols to stack at once (which bounds
+                       the memory the stacked arrays use)
+    '''
+    def __init__(self, store, steps=None, block_size=256):
+        self._store = store
+        self._steps = steps or DEFAULT_STEPS
+        self._block_size = block_size
+
+    @property
+    def columns(self):
+        return [name for step in self._steps if isinstance(step, Metric)
+                for name in step.names]
+
+    def run(self, symbols=None, workers=None):
+        '''
+        :param symbols: list of symbols (defaults to all in the store)
+        :param workers: the number of processes to shard the symbols across
+                        (defaults to doing it all in this process)
+        :return: DataFrame with a row per symbol that passed every filter
+        '''
+        symbols = [symbol.upper() for symbol in symbols or self._store.symbols]
+        if workers and workers > 1:
+            return pd.concat(map_shards(_run_shard, symbols, workers, screener=self))
+        return self._run(symbols)
+
+    def _run(self, symbols):
+        # preallocate every column, and fill them in place a block at a time
+        results = OrderedDict((name, np.zeros(len(symbols), dtype=step.dtype))
+                              for step in self._steps if isinstance(step, Metric)
+                              for name in step.names)
+        passed = np.zeros(len(symbols), dtype=bool)
+        fields = sorted(set(field for step in self._steps if step.array_func is not None
+                            for field in step.fields))
+        for start in range(0, len(symbols), self._block_size):
+            block = symbols[start:start + self._block_size]
+            rows = np.arange(start, start + len(block))
+            dfs = self._store.get_dfs(block)
+            dfs = [dfs[symbol] for symbol in block]
+            arrays = _stack(dfs, fields)
+            for step in self._steps:
+                if not len(rows):
+                    break
+                if step.array_func is not None:
+                    values = step.evaluate_arrays(arrays)
+                elif isinstance(step, Filter):
+                    values = np.array([step(df) for df in dfs], dtype=bool)
+                else:
+                    values = list(zip(*[step(df) for df in dfs]))
+                if isinstance(step, Filter):
+                    rows = rows[values]
+                    dfs = [df for df, keep in zip(dfs, values) if keep]
+                    arrays = dict((field, array[values]) for field, array in arrays.items())
+                    continue
+                for name, column in zip(step.names, values):
+                    results[name][rows] = column
+            passed[rows] = True
+
+        index = pd.Index(np.array(symbols, dtype=object)[passed], name='Symbol')
+        return pd.DataFrame(OrderedDict((name, values[passed]) for name, values in results.items()),
+                            index=index)
+
+
+def _stack(dfs, fields):
+    '''
+    :return: dict of field to a (symbols x bars) array of dfs' values,
+             right-aligned and left-padded with NaN
+    '''
+    width = max([len(df) for df in dfs] or [0])
+    arrays = dict((field, np.full((len(dfs), width), np.nan)) for field in fields)
+    for i, df in enumerate(dfs):
+        for field in fields:
+            arrays[field][i, width - len(df):] = df[field].values
+    return arrays
+
+
+def _run_shard(symbols, screener):
+    return screener._run(symbols)
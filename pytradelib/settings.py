@@ -10,18 +10,39 @@ MAX_AMOUNT = 5000
 SCALE_OUT_LEVELS = 2 # sell half of quantity half way to the target price and the other half at the target price
 
 
+# the limits for each store's in-memory cache of DataFrames (None for no limit)
+DF_CACHE_MAX_BYTES = 2 * 1024 ** 3
+DF_CACHE_MAX_ENTRIES = None
+
+
 ###################################################################
 DATA_DIR = os.path.join(os.environ['HOME'], '.pytradelib')
 ZIPLINE_DIR = os.path.join(os.environ['HOME'], '.zipline')
 ZIPLINE_CACHE_DIR = os.path.join(ZIPLINE_DIR, 'cache')
 
+# root directory for the binary (parquet/feather) stores
+STORE_DIR = os.path.join(DATA_DIR, 'store')
+
+# where computed indicators are cached
+INDICATOR_CACHE_DIR = os.path.join(DATA_DIR, 'indicators')
+
+# the limits for the in-memory tier of the indicator cache (None for no limit)
+INDICATOR_CACHE_MAX_BYTES = 512 * 1024 ** 2
+INDICATOR_CACHE_MAX_ENTRIES = None
+
+# where the providers' (conditionally revalidated) HTTP responses are cached
+HTTP_CACHE_DIR = os.path.join(DATA_DIR, 'http')
+
+# how many seconds a response body is reused from memory before it's
+# revalidated (the daemon runs for days, and eg the WIKI codes change daily)
+HTTP_MEMO_TTL = 60 * 60
+
 LOG_DIR = os.path.join(DATA_DIR, 'logs')
 LOG_FILENAME = os.path.join(LOG_DIR, 'pytradelib.log')
 LOG_LEVEL = 'info' # debug, info, warning, error or critical
 
+# the Unix socket the daemon (see pytradelib.daemon) listens on
+DAEMON_SOCKET = os.path.join(DATA_DIR, 'daemon.sock')
 
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-if not os.path.exists(ZIPLINE_CACHE_DIR):
-    os.makedirs(ZIPLINE_CACHE_DIR)
+# (the directories above are created by whatever first writes to them, so
+# importing the settings never touches the filesystem)
@@ -1,202 +1,1171 @@
 import os
+import json
 import pytz
-import talib as ta
+import bisect
+import sqlite3
+import threading
+import numpy as np
 import pandas as pd
+from io import BytesIO
+from functools import partial
 from pandas.tseries.offsets import DateOffset
 
-from pytradelib.settings import DATA_DIR, ZIPLINE_CACHE_DIR
-from pytradelib.utils import (
-    percent_change,
-    within_percent_of_value,
-    crossed,
+from pytradelib.cache import DataFrameCache
+from pytradelib.manifest import Manifest, checksum
+from pytradelib.lazy import lazy_import
+from pytradelib.indicators import (
+    COLUMNS as TA_COLUMNS,
+    INDICATORS,
+    WINDOW_LOOKBACK,
+    compute_indicator,
+    compute_ta,
+    compute_ta_state,
+    extend_ta,
 )
+from pytradelib.metrics import analyze_arrays
+from pytradelib.parallel import map_shards
+from pytradelib.resample import TIMEFRAMES, period_start, resample_bars
+from pytradelib.settings import (
+    DATA_DIR,
+    DF_CACHE_MAX_BYTES,
+    DF_CACHE_MAX_ENTRIES,
+    STORE_DIR,
+    ZIPLINE_CACHE_DIR,
+)
+from pytradelib.utils import chunk
+
+# only the Parquet and Feather stores need pyarrow
+pyarrow = lazy_import('pyarrow', submodules=['ipc', 'parquet'], optional=True)
+
+
+class BaseStore(object):
+    '''
+    A store of daily bars. Subclasses implement the storage layout by
+    overriding :meth:`_get_store_contents`, :meth:`_load_df` and
+    :meth:`_store_df`.
 
+    Weekly and monthly bars are aggregated from the daily bars the first
+    time they're read, and kept in a store of the same kind alongside this
+    one (see :meth:`_get_timeframe_location`), which is brought up to date
+    whenever new daily bars are added.
 
-class CSVStore(object):
-    _symbols = []
-    _csv_files = {}
-    _start_dates = {}
-    _end_dates = {}
-    _df_cache = {}
+    :param cache: a DataFrameCache (defaults to one bounded by
+                  DF_CACHE_MAX_BYTES and DF_CACHE_MAX_ENTRIES)
+    :param indicator_cache: an IndicatorCache for the TA computed by
+                            :meth:`_add_ta` (defaults to not caching it)
+    '''
+    def __init__(self, cache=None, indicator_cache=None):
+        # the store's contents are read on first use (see _load_contents)
+        self._symbols = None
+        self._start_dates = {}
+        self._end_dates = {}
+        # the start dates of the partial (most recent bars only) frames cached
+        # under (symbol, 'tail') keys
+        self._tail_starts = {}
+        self._df_cache = cache if cache is not None else DataFrameCache(
+            max_entries=DF_CACHE_MAX_ENTRIES, max_bytes=DF_CACHE_MAX_BYTES)
+        self._indicator_cache = indicator_cache
+        # timeframe -> store of the bars resampled to it
+        self._timeframe_stores = {}
 
-    def __init__(self):
-        self._store_contents = self._get_store_contents()
-        for d in self._store_contents:
-            symbol = d['symbol']
+    def _load_contents(self):
+        if self._symbols is None:
+            self._symbols = []
+            for d in self._get_store_contents():
+                self._add_contents(d)
+            self._symbols.sort()
+
+    def _add_contents(self, d):
+        '''
+        :param d: dict with symbol, start and end keys (see :meth:`_get_contents`)
+        '''
+        self._load_contents()
+        symbol = d['symbol']
+        if symbol not in self._start_dates:
             self._symbols.append(symbol)
-            self._csv_files[symbol] = d['csv_path']
-            self._start_dates[symbol] = d['start']
-            self._end_dates[symbol] = d['end']
-        self._symbols.sort()
+        self._start_dates[symbol] = d['start']
+        self._end_dates[symbol] = d['end']
+
+    def _get_contents(self, symbol):
+        self._load_contents()
+        return {
+            'symbol': symbol,
+            'start': self._start_dates[symbol],
+            'end': self._end_dates[symbol],
+        }
 
     @property
     def symbols(self):
+        self._load_contents()
         return self._symbols
 
-    def get_df(self, symbol, start=None, end=None):
+    @property
+    def cache(self):
+        return self._df_cache
+
+    def invalidate(self, symbol):
+        '''
+        Drop symbol's bars from the cache, so the next read comes from disk.
+        '''
+        symbol = symbol.upper()
+        self._df_cache.invalidate(symbol)
+        self._df_cache.invalidate((symbol, 'tail'))
+        self._tail_starts.pop(symbol, None)
+
+    def get_df(self, symbol, start=None, end=None, columns=None, timeframe='D'):
+        '''
+        Only the bars from start onwards are read, for stores that can read
+        a range of dates, and those most recent bars are cached separately
+        from (and without reading) the full history.
+
+        :param symbol: string - the ticker
+        :param start: the earliest date (defaults to the first bar)
+        :param end: the latest date (defaults to the last bar)
+        :param columns: list of columns to load (defaults to all of them)
+        :param timeframe: 'D' for daily bars, 'W' for weekly or 'M' for monthly
+        :return: DataFrame
+        '''
         symbol = symbol.upper()
+        if timeframe != 'D':
+            return self._sync_timeframe(symbol, timeframe).get_df(symbol, start, end, columns)
 
-        def to_timestamp(dt, default):
-            if dt:
-                return pd.Timestamp(dt, tz=pytz.UTC)
-            return default
-        start = to_timestamp(start, 0)
-        end = to_timestamp(end, None)
+        start = _to_timestamp(start)
+        end = _to_timestamp(end)
 
         df = self._df_cache.get(symbol, None)
-        if df is None:
-            csv_path = self._csv_files[symbol]
-            df = pd.DataFrame.from_csv(csv_path).tz_localize(pytz.UTC)
-            self._df_cache[symbol] = df
+        if df is None and start is not None:
+            df = self._get_tail(symbol, start)
+            if df is None and end is None and not columns:
+                df = self._load_df(symbol, start=start)
+                self._df_cache.set((symbol, 'tail'), df)
+                self._tail_starts[symbol] = start
+            elif df is None:
+                return self._load_df(symbol, columns, start, end)[start:end]
+        elif df is None and columns:
+            # only decode the requested columns, and skip the cache so that
+            # a partial frame never masquerades as the full history
+            return self._load_df(symbol, columns, end=end)[:end]
+        elif df is None:
+            df = self._load_df(symbol)
+            self._df_cache.set(symbol, df)
+
+        if columns:
+            df = df[columns]
         return df[start:end]
 
+    def _get_tail(self, symbol, start):
+        '''
+        :return: the cached most recent bars for symbol, if they go back as
+                 far as start (or None)
+        '''
+        tail_start = self._tail_starts.get(symbol)
+        if tail_start is None or start < tail_start:
+            return None
+        return self._df_cache.get((symbol, 'tail'), None)
+
     def set_df(self, symbol, df):
         self._update_df(symbol, df)
 
     def _update_df(self, symbol, df):
         symbol = symbol.upper()
-        if symbol in self.symbols:
-            existing_df = self.get_df(symbol)
-            df = existing_df.append(df[existing_df.index[-1] + DateOffset(days=1):])
-            os.remove(self.get_csv_path(symbol))
-        df = self._add_ta(df)
-        csv_path = self._get_store_path(symbol, df.index[0], df.index[-1])
-        df.to_csv(csv_path)
-        self._set_csv_path(symbol, csv_path)
+        existing_df, state = self._get_existing(symbol)
+        update = self._prepare_update(symbol, existing_df, df, state)
+        if update is not None:
+            self._write_update(symbol, *update)
+
+    def _get_existing(self, symbol):
+        '''
+        :return: tuple of symbol's stored bars and TA state (or (None, None));
+                 when the TA can be extended from the state, only the last
+                 WINDOW_LOOKBACK (or so) bars are read
+        '''
+        if symbol not in self.symbols:
+            return None, None
+        state = self._get_ta_state(symbol)
+        end = self.get_end_date(symbol)
+        if state and state['end'] == end.value:
+            # twice as many calendar days as bars covers the weekends and
+            # holidays, for daily bars (anything shorter is read in full)
+            tail = self.get_df(symbol, start=end - DateOffset(days=2 * WINDOW_LOOKBACK))
+            if len(tail) >= WINDOW_LOOKBACK:
+                return tail, state
+        return self.get_df(symbol), state
+
+    def _can_extend_ta(self, existing_df, state):
+        '''
+        :return: whether or not state is for existing_df's last bar, so the
+                 TA for new bars can be computed from it (see :meth:`_extend_ta`)
+        '''
+        return existing_df is not None and bool(state) \
+            and state['end'] == existing_df.index[-1].value
+
+    def _prepare_update(self, symbol, existing_df, df, state):
+        '''
+        Compute the TA for df's bars after existing_df, without touching the
+        store (so it can run in another process).
+
+        :return: tuple of (the new history, its TA state, the number of
+                 existing bars in it which are already stored), or None if
+                 df has no new bars; when the TA was extended, the history
+                 only starts from existing_df's first bar
+        '''
+        num_existing = 0
+        if existing_df is not None:
+            new_df = df[existing_df.index[-1] + DateOffset(days=1):]
+            if new_df.empty:
+                return None
+            if self._can_extend_ta(existing_df, state):
+                # only compute the indicators for the new bars, and only write them
+                df, state = self._extend_ta(existing_df, new_df.copy(), state)
+                num_existing = len(existing_df)
+            else:
+                df, state = pd.concat([existing_df, new_df]), None
+        if state is None:
+            df = self._add_ta(df, symbol=symbol)
+            state = self._compute_ta_state(df)
+        return df, state, num_existing
+
+    def _write_update(self, symbol, df, state, num_existing):
+        '''
+        Write the result of :meth:`_prepare_update`.
+        '''
+        if num_existing:
+            self._append_df(symbol, df.iloc[num_existing:])
+        else:
+            self._store_df(symbol, df)
+        self._set_ta_state(symbol, state)
+        self._register(symbol, df, partial=bool(num_existing))
+        self._update_timeframes(symbol)
+
+    def _get_timeframe_store(self, timeframe, create=True):
+        '''
+        :param create: whether or not to create the store if it doesn't exist
+        :return: the store of bars resampled to timeframe (or None)
+        '''
+        if timeframe not in TIMEFRAMES or timeframe == 'D':
+            raise ValueError('unsupported timeframe: %r' % timeframe)
+        store = self._timeframe_stores.get(timeframe)
+        if store is None:
+            location = self._get_timeframe_location(timeframe)
+            if not create and not os.path.exists(location):
+                return None
+            # sharing this store's caches (and so their limits)
+            store = self._timeframe_stores[timeframe] = type(self)(
+                location, cache=self._df_cache.namespace(timeframe),
+                indicator_cache=self._indicator_cache)
+        return store
+
+    def _get_timeframe_location(self, timeframe):
+        '''
+        :return: the location (directory or path) of the store of bars
+                 resampled to timeframe
+        '''
+        raise NotImplementedError
+
+    def _sync_timeframe(self, symbol, timeframe):
+        '''
+        Bring symbol's bars for timeframe up to date with its daily bars.
+        Only the daily bars from the start of the latest stored (and possibly
+        partial) period onwards are aggregated again; the TA is recomputed
+        over the whole (short) resampled series.
+
+        :return: the store of bars resampled to timeframe
+        '''
+        store = self._get_timeframe_store(timeframe)
+        if symbol in store.symbols:
+            if store.get_end_date(symbol) >= self.get_end_date(symbol):
+                return store
+            existing_df = store.get_df(symbol)
+            start = period_start(existing_df.index[-1], timeframe)
+            new_df = resample_bars(self.get_df(symbol, start=start), timeframe)
+            existing_df = existing_df[existing_df.index < start]
+            df = pd.concat([existing_df.drop(columns=TA_COLUMNS, errors='ignore'), new_df])
+        else:
+            df = resample_bars(self.get_df(symbol), timeframe)
+        df = store._add_ta(df)
+        store._store_df(symbol, df)
+        store._set_ta_state(symbol, store._compute_ta_state(df))
+        store._register(symbol, df)
+        return store
+
+    def _update_timeframes(self, symbol):
+        # only the timeframes already read for symbol are kept up to date;
+        # the others are aggregated when they're first read
+        for timeframe in TIMEFRAMES:
+            if timeframe == 'D':
+                continue
+            store = self._get_timeframe_store(timeframe, create=False)
+            if store is not None and symbol in store.symbols:
+                self._sync_timeframe(symbol, timeframe)
+
+    def _register(self, symbol, df, cache=True, partial=False):
+        '''
+        :param partial: whether df only holds symbol's most recent bars (so
+                        it's neither its start date nor cached)
+        '''
+        self._load_contents()
+        if symbol not in self._symbols:
+            self._symbols.append(symbol)
+            self._symbols.sort()
+        if not partial:
+            self._set_start_date(symbol, df.index[0])
         self._set_end_date(symbol, df.index[-1])
-        self._df_cache[symbol] = df
+        self._df_cache.invalidate((symbol, 'tail'))
+        self._tail_starts.pop(symbol, None)
+        if cache and not partial:
+            self._df_cache.set(symbol, df)
+        else:
+            self._df_cache.invalidate(symbol)
 
-    def get_dfs(self, symbols=None, start=None, end=None):
+    def get_dfs(self, symbols=None, start=None, end=None, columns=None, timeframe='D'):
         symbols = symbols or self.symbols
         if not isinstance(symbols, list):
             symbols = [symbols]
         return dict(zip(
             [symbol.upper() for symbol in symbols],
-            [self.get_df(symbol, start, end) for symbol in symbols]
+            [self.get_df(symbol, start, end, columns, timeframe) for symbol in symbols]
         ))
 
-    def set_dfs(self, symbol_df_dict):
+    def set_dfs(self, symbol_df_dict, workers=None):
+        '''
+        :param symbol_df_dict: dict of symbol to DataFrame of new bars
+        :param workers: the number of processes to compute TA and write with
+                        (defaults to doing it all in this process)
+        '''
+        if workers and workers > 1:
+            for contents in map_shards(_set_dfs_shard, symbol_df_dict.items(),
+                                       workers, store=self):
+                for d in contents:
+                    self._add_contents(d)
+                    self.invalidate(d['symbol'])
+            self.symbols.sort()
+            # the workers updated the resampled bars too, so reopen their stores
+            self._timeframe_stores.clear()
+            return
+
         for symbol, df in symbol_df_dict.items():
             self.set_df(symbol, df)
 
-    def analyze(self, symbols=None, use_adjusted=True):
+    def analyze(self, symbols=None, use_adjusted=True, workers=None):
         '''
         :param symbols: list of symbols (defaults to all in the store)
         :param use_adjusted: whether or not to use adjusted prices
+        :param workers: the number of processes to shard the symbols across
+                        (defaults to doing it all in this process)
         :return: DataFrame
         '''
         def key(price_key):
             return 'Adj ' + price_key if use_adjusted else price_key
 
-        results = {}
-        for symbol, df in self.get_dfs(symbols).items():
-            today = df.iloc[-1]
-            yesterday = df.iloc[-2]
-            most_recent_year = df[df.index[-1] - DateOffset(years=1):]
-            year_low = most_recent_year[key('Low')][:-1].min()
-            year_high = most_recent_year[key('High')][:-1].max()
-            dollar_volume_desc = most_recent_year.dollar_volume.describe()
-
-            results[symbol] = {
-                # last-bar metrics
-                'previous_close': yesterday[key('Close')],
-                'close': today[key('Close')],
-                'percent_change': percent_change(yesterday[key('Close')], today[key('Close')]),
-                'dollar_volume': today.dollar_volume,
-                'percent_of_median_volume': (today.Volume * today[key('Close')]) / dollar_volume_desc['50%'],
-                'advancing': today[key('Close')] > yesterday[key('Close')],
-                'declining': today[key('Close')] < yesterday[key('Close')],
-                'new_low': today[key('Close')] < year_low,
-                'new_high': today[key('Close')] > year_high,
-                'percent_of_high': today[key('Close')] / year_high,
-                'near_sma100': within_percent_of_value(today[key('Close')], today['sma100'], 2),
-                'near_sma200': within_percent_of_value(today[key('Close')], today['sma200'], 2),
-                'crossed_sma100': crossed(today['sma100'], yesterday, today),
-                'crossed_sma200': crossed(today['sma200'], yesterday, today),
-                'crossed_5': crossed(5, yesterday, today),
-                'crossed_10': crossed(10, yesterday, today),
-                'crossed_50': crossed(50, yesterday, today),
-                'crossed_100': crossed(100, yesterday, today),
-
-                # stock "health" metrics
-                'year_high': year_high,
-                'year_low': year_low,
-                'min_volume': int(dollar_volume_desc['min']),
-                'dollar_volume_25th_percentile': int(dollar_volume_desc['25%']),
-                'dollar_volume_75th_percentile': int(dollar_volume_desc['75%']),
-                'atr': most_recent_year.atr.describe()['50%'],
-            }
-        # transpose the DataFrame so we have rows of symbols, and metrics as columns
-        return pd.DataFrame(results).T
+        symbols = symbols or self.symbols
+        if not isinstance(symbols, list):
+            symbols = [symbols]
+        if not symbols:
+            return pd.DataFrame()
+        if workers and workers > 1:
+            return pd.concat(map_shards(_analyze_shard, symbols, workers,
+                                        store=self, use_adjusted=use_adjusted))
+
+        # only the most recent year (plus the prior bar) is needed, so let
+        # stores that can do range reads skip everything before that
+        start = min(self.get_end_date(symbol) for symbol in symbols) \
+            - DateOffset(years=1, days=7)
+
+        dfs = self.get_dfs(symbols, start=start)
+
+        # stack each symbol's most recent year of bars into right-aligned
+        # (symbols x bars) arrays, so every metric is computed in one pass
+        year_ago = pd.DatetimeIndex([df.index[-1] for df in dfs.values()]) \
+            - DateOffset(years=1)
+        windows = [len(df) - df.index.searchsorted(dt)
+                   for df, dt in zip(dfs.values(), year_ago)]
+        width = max(windows)
+        fields = [key('Close'), key('High'), key('Low'), 'Volume', 'dollar_volume', 'atr',
+                  'sma100', 'sma200']
+        arrays = np.full((len(fields), len(dfs), width), np.nan)
+        previous_close = np.empty(len(dfs))
+        columns, indexer = None, None
+        for i, (df, window) in enumerate(zip(dfs.values(), windows)):
+            if columns is None or not df.columns.equals(columns):
+                columns, indexer = df.columns, df.columns.get_indexer(fields)
+            # one copy of just the tail rows is far cheaper than per-column access
+            tail = df.iloc[-max(window, 2):].to_numpy(dtype=np.float64)[:, indexer].T
+            arrays[:, i, width-window:] = tail[:, -window:]
+            previous_close[i] = tail[0, -2]
+
+        close, high, low, volume, dollar_volume, atr, sma100, sma200 = arrays
+        sma100, sma200 = sma100[:, -1], sma200[:, -1]
+        results = analyze_arrays(previous_close, close, high, low, volume,
+                                 dollar_volume, atr, sma100, sma200)
+        # rows of symbols, and metrics as columns
+        return pd.DataFrame(results, index=list(dfs.keys()))
+
+    def get_arrays(self, symbol, fields):
+        '''
+        :param symbol: string - the ticker
+        :param fields: list of columns
+        :return: dict of field name to numpy array
+        '''
+        df = self.get_df(symbol, columns=fields)
+        return dict((field, df[field].values) for field in fields)
 
     def get_start_date(self, symbol):
+        self._load_contents()
         return self._start_dates[symbol.upper()]
 
     def _set_start_date(self, symbol, start_date):
         self._start_dates[symbol] = start_date
 
     def get_end_date(self, symbol):
+        self._load_contents()
         return self._end_dates[symbol.upper()]
 
     def _set_end_date(self, symbol, end_date):
         self._end_dates[symbol] = end_date
 
-    def get_csv_path(self, symbol):
-        return self._csv_files[symbol]
+    def _get_store_contents(self):
+        '''
+        :return: list of dicts with symbol, start and end keys
+        '''
+        raise NotImplementedError
+
+    def _load_df(self, symbol, columns=None, start=None, end=None):
+        '''
+        Read symbol's bars (bypassing the cache). Stores which can read just a
+        range of dates only read from start to end; others may return more,
+        so callers slice the result.
+        '''
+        raise NotImplementedError
+
+    def _store_df(self, symbol, df):
+        '''
+        Write df as-is (no TA is computed), replacing any existing bars.
+        '''
+        raise NotImplementedError
+
+    def _append_df(self, symbol, new_df):
+        '''
+        Write new_df, the bars just appended to symbol's history. Stores which
+        can append in place override this; by default the whole history is
+        read back and rewritten.
+        '''
+        self._store_df(symbol, pd.concat([self._load_df(symbol), new_df]))
+
+    def _get_ta_state(self, symbol):
+        '''
+        :return: the state stored by :meth:`_set_ta_state` (or None)
+        '''
+        raise NotImplementedError
+
+    def _set_ta_state(self, symbol, state):
+        raise NotImplementedError
+
+    def _add_ta(self, df, use_adjusted=True, symbol=None):
+        def key(price_key):
+            return 'Adj ' + price_key if use_adjusted else price_key
+        arrays = [df[key('High')].values, df[key('Low')].values,
+                  df[key('Close')].values, df.Volume.values]
+        if self._indicator_cache is not None and symbol:
+            # cached per indicator and parameters, so each entry is shared
+            # with anything else computing the same indicator
+            inputs = dict(zip(['high', 'low', 'close'], arrays))
+            columns = [('dollar_volume', arrays[2] * arrays[3])]
+            for indicator_columns, name, input_names, params in INDICATORS:
+                result = self._indicator_cache.get(
+                    symbol, key(name), partial(compute_indicator, name), df.index,
+                    *[inputs[input_name] for input_name in input_names], **params)
+                if len(indicator_columns) == 1:
+                    result = (result,)
+                columns.extend(zip(indicator_columns, result))
+            columns = sorted(columns, key=lambda column: TA_COLUMNS.index(column[0]))
+        else:
+            columns = compute_ta(*arrays).items()
+        for column, values in columns:
+            df[column] = values
+        return df
+
+    def _compute_ta_state(self, df, use_adjusted=True):
+        def key(price_key):
+            return 'Adj ' + price_key if use_adjusted else price_key
+        state = compute_ta_state(df[key('High')].values, df[key('Low')].values,
+                                 df[key('Close')].values)
+        if state is not None:
+            state['end'] = df.index[-1].value
+        return state
+
+    def _extend_ta(self, existing_df, new_df, state, use_adjusted=True):
+        '''
+        Append new_df to existing_df, computing the TA for only the new bars.
+
+        :return: tuple of (DataFrame, new state)
+        '''
+        def key(price_key):
+            return 'Adj ' + price_key if use_adjusted else price_key
+        fields = [key('High'), key('Low'), key('Close'), 'Volume']
+        tail = pd.concat([existing_df[fields][-WINDOW_LOOKBACK:], new_df[fields]])
+        columns, state = extend_ta(*[tail[field].values for field in fields],
+                                   num_new=len(new_df), state=state)
+        for column, values in columns.items():
+            new_df[column] = values
+        state['end'] = new_df.index[-1].value
+        return pd.concat([existing_df, new_df]), state
+
+
+class FileStore(BaseStore):
+    '''
+    A store with one file per symbol. Subclasses implement the on-disk
+    format by overriding :meth:`_read_df` and :meth:`_write_df`.
+
+    The files are indexed by a :class:`Manifest` in the store directory, so
+    listing the store's contents never touches the files themselves. (A
+    directory of files without a manifest is indexed from their filenames
+    the first time it's opened.)
+    '''
+    extension = None
+    default_store_dir = None
+
+    # the number of appended segments a symbol can have before the next
+    # append compacts them (and its file) into a single new file
+    max_segments = 20
+
+    # the number of rows per chunk of each file (a row group or record batch,
+    # or the rows between offsets for CSVs); the first date of every chunk
+    # is recorded in the manifest, so range reads can skip to it
+    chunk_size = 256
+
+    def __init__(self, store_dir=None, cache=None, indicator_cache=None):
+        self._store_dir = store_dir or self.default_store_dir
+        if not os.path.exists(self._store_dir):
+            os.makedirs(self._store_dir)
+        self._paths = {}
+        self._segments = {}
+        self._manifest = Manifest(os.path.join(self._store_dir, Manifest.filename))
+        super(FileStore, self).__init__(cache, indicator_cache)
+
+    def _add_contents(self, d):
+        super(FileStore, self)._add_contents(d)
+        self._paths[d['symbol']] = d['path']
+        self._segments[d['symbol']] = d.get('segments', [])
+
+    def _get_contents(self, symbol):
+        d = super(FileStore, self)._get_contents(symbol)
+        d['path'] = self._paths[symbol]
+        d['segments'] = self._segments.get(symbol, [])
+        return d
+
+    @property
+    def store_dir(self):
+        return self._store_dir
+
+    @property
+    def manifest(self):
+        return self._manifest
+
+    def _get_timeframe_location(self, timeframe):
+        return os.path.join(self._store_dir, '.timeframes', timeframe)
+
+    def get_path(self, symbol):
+        self._load_contents()
+        return self._paths[symbol.upper()]
+
+    def _set_path(self, symbol, path):
+        self._paths[symbol] = path
+
+    def _load_df(self, symbol, columns=None, start=None, end=None):
+        symbol = symbol.upper()
+        path = self.get_path(symbol)
+        segments = self._segments.get(symbol, [])
+        if start is None and end is None:
+            dfs = [self._read_df(path, columns)]
+            dfs += [self._read_df(segment_path, columns) for segment_path, _, _ in segments]
+            return dfs[0] if len(dfs) == 1 else pd.concat(dfs)
+
+        dfs = []
+        # the file holds every bar before the first segment
+        if not segments or start is None or start < segments[0][1]:
+            dfs.append(self._read_df(path, columns, start, end,
+                                     offsets=self._manifest.get_offsets(symbol)))
+        for segment_path, segment_start, segment_end in segments:
+            if (start is None or segment_end >= start) and (end is None or segment_start <= end):
+                dfs.append(self._read_df(segment_path, columns))
+        if not dfs:
+            dfs.append(self._read_df(segments[-1][0], columns))
+        df = dfs[0] if len(dfs) == 1 else pd.concat(dfs)
+        return df[start:end]
 
-    def _set_csv_path(self, symbol, csv_path):
-        self._csv_files[symbol] = csv_path
+    def _store_df(self, symbol, df):
+        self._load_contents()
+        existing_paths = [self._paths.get(symbol)] + \
+            [segment_path for segment_path, _, _ in self._segments.get(symbol, [])]
+        path = self._get_store_path(symbol, df.index[0], df.index[-1])
+        # the old files are only removed once the manifest points at the new
+        # one, so a crash at any point leaves complete files in the manifest
+        offsets = self._write_df(df, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._manifest.set(symbol, path, df.index[0], df.index[-1],
+                           num_rows=len(df), checksum=checksum(path), offsets=offsets)
+        self._set_path(symbol, path)
+        self._segments[symbol] = []
+        for existing_path in existing_paths:
+            if existing_path and existing_path != path:
+                os.remove(existing_path)
+
+    def _append_df(self, symbol, new_df):
+        '''
+        Write just the new bars to a segment file alongside symbol's file (or
+        compact them all into a new file, once there are max_segments).
+        '''
+        self._load_contents()
+        segments = self._segments.get(symbol, [])
+        if symbol not in self._paths or len(segments) >= self.max_segments:
+            return super(FileStore, self)._append_df(symbol, new_df)
+
+        path = self._get_segment_path(symbol, new_df.index[0], new_df.index[-1])
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._write_df(new_df, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._manifest.append(symbol, path, new_df.index[0], new_df.index[-1],
+                              num_rows=len(new_df), checksum=checksum(path))
+        self._segments[symbol] = segments + [(path, new_df.index[0], new_df.index[-1])]
+
+    def compact(self, symbols=None):
+        '''
+        Rewrite each symbol's file and appended segments as a single file.
+
+        :param symbols: list of symbols (defaults to all in the store)
+        :return: list of the compacted symbols
+        '''
+        compacted = []
+        for symbol in [symbol.upper() for symbol in symbols or self.symbols]:
+            if self._segments.get(symbol):
+                self._store_df(symbol, self._load_df(symbol))
+                compacted.append(symbol)
+        return compacted
+
+    def verify(self, symbol):
+        '''
+        :return: whether or not symbol's file (and segments) match the
+                 checksums in the manifest (or None if none were recorded)
+        '''
+        entry = self._manifest.get(symbol.upper())
+        if entry is None or entry['checksum'] is None:
+            return None
+        return checksum(entry['path']) == entry['checksum'] and all(
+            checksum(segment['path']) == segment['checksum']
+            for segment in self._manifest.get_segments(symbol.upper()))
+
+    def _get_ta_state(self, symbol):
+        return self._manifest.get_ta_state(symbol)
+
+    def _set_ta_state(self, symbol, state):
+        self._manifest.set_ta_state(symbol, state)
+
+    def _read_df(self, path, columns=None, start=None, end=None, offsets=None):
+        '''
+        :param offsets: the offsets returned by :meth:`_write_df` when the
+                        file was written (if given, only the chunks holding
+                        bars from start to end need to be read)
+        '''
+        raise NotImplementedError
+
+    def _write_df(self, df, path):
+        '''
+        :return: list of [date in ns, position] pairs for the first row of
+                 each chunk of the file (or None)
+        '''
+        raise NotImplementedError
 
     def _get_store_contents(self):
-        csv_files = [os.path.join(ZIPLINE_CACHE_DIR, f)\
-                     for f in os.listdir(ZIPLINE_CACHE_DIR)\
-                     if f.endswith('.csv')]
-        return [self._decode_store_path(path) for path in csv_files]
+        entries = self._manifest.entries()
+        if self._manifest.created:
+            self._manifest.created = False
+            entries = self._index_files()
+        return entries
+
+    def _index_files(self):
+        '''
+        Add the files in the store directory, their appended segments (and
+        any TA state saved alongside them by older versions) to a new
+        manifest.
+        '''
+        paths = [os.path.join(self._store_dir, f)\
+                 for f in os.listdir(self._store_dir)\
+                 if f.endswith(self.extension)]
+        entries = [self._decode_store_path(path) for path in paths]
+        self._manifest.set_many(entries)
+        for d in entries:
+            self._index_segments(d)
+
+        ta_state_dir = os.path.join(self._store_dir, '.ta_state')
+        for d in entries:
+            path = os.path.join(ta_state_dir, d['symbol'].replace(os.path.sep, '--') + '.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._manifest.set_ta_state(d['symbol'], json.load(f))
+        return entries
 
-    def _decode_store_path(self, csv_path):
-        filename = os.path.basename(csv_path).replace('--', os.path.sep)
+    def _index_segments(self, d):
+        '''
+        Add the segments appended after the file in entry d to the manifest
+        (updating d to match), removing any left over from before the file
+        was last written (whose bars it already holds).
+        '''
+        segment_dir = os.path.dirname(self._get_segment_path(d['symbol'], '', ''))
+        if not os.path.isdir(segment_dir):
+            return
+        segments = []
+        for filename in os.listdir(segment_dir):
+            if filename.endswith(self.extension):
+                start, end = self._decode_dates(filename[:-len(self.extension)])
+                segments.append((_to_timestamp(start), _to_timestamp(end),
+                                 os.path.join(segment_dir, filename)))
+        d['segments'] = []
+        for start, end, path in sorted(segments):
+            if start <= _to_timestamp(d['end']):
+                os.remove(path)
+                continue
+            self._manifest.append(d['symbol'], path, start, end,
+                                  num_rows=len(self._read_df(path)), checksum=checksum(path))
+            d['segments'].append((path, start, end))
+            d['end'] = end
+
+    def _decode_store_path(self, path):
+        filename = os.path.basename(path).replace('--', os.path.sep)
         symbol = filename[:filename.find('-')]
+        start, end = self._decode_dates(filename[len(symbol)+1:].replace(self.extension, ''))
+        return {
+            'symbol': symbol,
+            'path': path,
+            'start': start,
+            'end': end,
+        }
 
-        dates = filename[len(symbol)+1:].replace('.csv', '')
-        start = dates[:len(dates)/2]
-        end = dates[len(dates)/2:]
+    def _decode_dates(self, dates):
+        '''
+        :param dates: the '<start>-<end>' part of a filename
+        :return: tuple of the start and end Timestamps
+        '''
+        start = dates[:len(dates)//2]
+        end = dates[len(dates)//2 + 1:]  # skip the separating dash
 
         def to_dt(dt_str):
             date, time = dt_str.split(' ')
             return pd.Timestamp(' '.join([date, time.replace('-', ':')]))
 
-        return {
-            'symbol': symbol,
-            'csv_path': csv_path,
-            'start': to_dt(start),
-            'end': to_dt(end),
-        }
+        return to_dt(start), to_dt(end)
+
+    def _get_segment_path(self, symbol, start, end):
+        return os.path.join(self._store_dir, '.segments', symbol.upper().replace(os.path.sep, '--'),
+                            ('%s-%s' % (start, end)).replace(':', '-') + self.extension)
 
     def _get_store_path(self, symbol, start, end):
         '''
         :param symbol: string - the ticker
         :param start: pd.Timestamp - the earliest date
         :param end: pd.Timestamp - the latest date
-        :return: string - path for the CSV
+        :return: string - path for the file
         '''
-        filename_format = '%(symbol)s-%(start)s-%(end)s.csv'
-        return os.path.join(ZIPLINE_CACHE_DIR, filename_format % {
+        filename_format = '%(symbol)s-%(start)s-%(end)s' + self.extension
+        return os.path.join(self._store_dir, filename_format % {
             'symbol': symbol.upper().replace(os.path.sep, '--'),
             'start': start,
             'end': end,
         }).replace(':', '-')
 
-    def _add_ta(self, df, use_adjusted=True):
-        def key(price_key):
-            return 'Adj ' + price_key if use_adjusted else price_key
-        df['dollar_volume'] = df[key('Close')] * df.Volume
-        df['atr'] = ta.NATR(df[key('High')].values, df[key('Low')].values, df[key('Close')].values)  # timeperiod 14
-        df['sma100'] = ta.SMA(df[key('Close')].values, timeperiod=100)
-        df['sma200'] = ta.SMA(df[key('Close')].values, timeperiod=200)
-        df['bbands_upper'], df['sma20'], df['bbands_lower'] = ta.BBANDS(df[key('Close')].values, timeperiod=20)
-        df['macd_lead'], df['macd_lag'], df['macd_divergence'] = ta.MACD(df[key('Close')].values)  # 12, 26, 9
-        df['rsi'] = ta.RSI(df[key('Close')].values)  # 14
-        df['stoch_lead'], df['stoch_lag'] = ta.STOCH(df[key('High')].values, df[key('Low')].values, df[key('Close')].values,
-                                                        fastk_period=14, slowk_period=1, slowd_period=3)
-        df['slope'] = ta.LINEARREG_SLOPE(df[key('Close')].values) * -1  # talib returns the inverse of what we want
-        return df
+
+def _chunk_offsets(index, chunk_size):
+    '''
+    :return: the offsets for a file written in chunks of chunk_size rows
+    '''
+    return [[int(index[i].value), i // chunk_size] for i in range(0, len(index), chunk_size)]
+
+
+def _locate(offsets, start=None, end=None):
+    '''
+    :return: tuple of the positions of the first chunk which could hold start
+             and of the first chunk after end (either None if unbounded)
+    '''
+    dates = [date for date, _ in offsets]
+    begin, stop = None, None
+    if start is not None:
+        i = bisect.bisect_right(dates, start.value) - 1
+        if i > 0:
+            begin = offsets[i][1]
+    if end is not None:
+        i = bisect.bisect_right(dates, end.value)
+        if i < len(offsets):
+            stop = offsets[i][1]
+    return begin, stop
+
+
+def _require_pyarrow(store_cls):
+    if pyarrow is None:
+        raise ImportError('%s requires pyarrow, which is not installed (pip install pyarrow)'
+                          % store_cls.__name__)
+
+
+def _to_timestamp(dt):
+    if dt is None:
+        return None
+    dt = pd.Timestamp(dt)
+    if dt.tz is None:
+        return dt.tz_localize(pytz.UTC)
+    return dt.tz_convert(pytz.UTC)
+
+
+def _to_utc(df):
+    if df.index.tz is None:
+        return df.tz_localize(pytz.UTC)
+    return df.tz_convert(pytz.UTC)
+
+
+class CSVStore(FileStore):
+    '''
+    Stores each symbol as a zipline-compatible CSV in ZIPLINE_CACHE_DIR.
+
+    New bars rewrite the whole file rather than being appended as segments,
+    so each CSV (and the dates in its filename) always holds the symbol's
+    full history. The manifest and the weekly and monthly stores (in
+    .timeframes) are kept alongside them; zipline ignores both.
+    '''
+    extension = '.csv'
+    default_store_dir = ZIPLINE_CACHE_DIR
+
+    # zipline only reads the main files
+    max_segments = 0
+
+    def _read_df(self, path, columns=None, start=None, end=None, offsets=None):
+        with open(path, 'rb') as f:
+            header = f.readline()
+            usecols = None
+            if columns:
+                index_col = header.decode('utf-8').split(',')[0].strip()
+                usecols = [index_col] + list(columns)
+            if offsets and (start is not None or end is not None):
+                # only read the lines between the offsets around start and end
+                begin, stop = _locate(offsets, start, end)
+                f.seek(begin or len(header))
+                data = f.read() if stop is None else f.read(stop - (begin or len(header)))
+                csv = BytesIO(header + data)
+            else:
+                f.seek(0)
+                csv = BytesIO(f.read())
+        return _to_utc(pd.read_csv(csv, index_col=0, parse_dates=True, usecols=usecols))
+
+    def _write_df(self, df, path):
+        data = df.to_csv().encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(data)
+        # the byte offset of every chunk_size'th row (row i starts after the
+        # i'th newline, counting the header's as the 0th)
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+        return [[int(df.index[i].value), int(newlines[i]) + 1]
+                for i in range(0, len(df), self.chunk_size)]
+
+    # backwards compatible aliases
+    get_csv_path = FileStore.get_path
+    _set_csv_path = FileStore._set_path
+
+
+class ParquetStore(FileStore):
+    '''
+    Stores each symbol as a Parquet file (requires pyarrow). Columns are
+    stored independently, so loading a subset of them is cheap.
+    '''
+    extension = '.parquet'
+    default_store_dir = os.path.join(STORE_DIR, 'parquet')
+
+    def __init__(self, store_dir=None, cache=None, indicator_cache=None):
+        _require_pyarrow(type(self))
+        super(ParquetStore, self).__init__(store_dir, cache, indicator_cache)
+
+    def _read_df(self, path, columns=None, start=None, end=None, offsets=None):
+        if offsets and (start is not None or end is not None):
+            begin, stop = _locate(offsets, start, end)
+            parquet_file = pyarrow.parquet.ParquetFile(path)
+            row_groups = range(begin or 0, parquet_file.num_row_groups if stop is None else stop)
+            table = parquet_file.read_row_groups(row_groups, columns=columns,
+                                                 use_pandas_metadata=True)
+            return _to_utc(table.to_pandas())
+        return _to_utc(pd.read_parquet(path, columns=columns))
+
+    def _write_df(self, df, path):
+        df.to_parquet(path, row_group_size=self.chunk_size)
+        return _chunk_offsets(df.index, self.chunk_size)
+
+
+class FeatherStore(FileStore):
+    '''
+    Stores each symbol as a Feather (Arrow IPC) file (requires pyarrow).
+    '''
+    extension = '.feather'
+    default_store_dir = os.path.join(STORE_DIR, 'feather')
+    _index_name = 'Date'
+
+    def __init__(self, store_dir=None, cache=None, indicator_cache=None):
+        _require_pyarrow(type(self))
+        super(FeatherStore, self).__init__(store_dir, cache, indicator_cache)
+
+    def _read_df(self, path, columns=None, start=None, end=None, offsets=None):
+        if columns:
+            columns = [self._index_name] + list(columns)
+        if offsets and (start is not None or end is not None):
+            # only read (and decompress) the record batches from start to end
+            begin, stop = _locate(offsets, start, end)
+            with pyarrow.memory_map(path) as source:
+                reader = pyarrow.ipc.open_file(source)
+                batches = [reader.get_batch(i) for i in range(
+                    begin or 0, reader.num_record_batches if stop is None else stop)]
+                table = pyarrow.Table.from_batches(batches, reader.schema)
+            if columns:
+                table = table.select(columns)
+            df = table.to_pandas()
+        else:
+            df = pd.read_feather(path, columns=columns)
+        return _to_utc(df.set_index(df.columns[0]))
+
+    def _write_df(self, df, path):
+        # feather can't store an index, so it gets stored as the first column
+        df.rename_axis(self._index_name).reset_index().to_feather(path, chunksize=self.chunk_size)
+        return _chunk_offsets(df.index, self.chunk_size)
+
+
+class PanelStore(BaseStore):
+    '''
+    Stores the bars for every symbol in a single SQLite table clustered on
+    (symbol, date), so reading any number of symbols over a date range is
+    one indexed range scan instead of one file open per symbol.
+    '''
+    default_path = os.path.join(STORE_DIR, 'panel.sqlite')
+
+    # the maximum number of symbols per IN (...) clause (SQLite's default
+    # SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds)
+    _query_batch_size = 500
+
+    def __init__(self, path=None, cache=None, indicator_cache=None):
+        self._path = path or self.default_path
+        if not os.path.exists(os.path.dirname(self._path)):
+            os.makedirs(os.path.dirname(self._path))
+        self._local = threading.local()
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS symbols (
+                symbol TEXT PRIMARY KEY,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                num_rows INTEGER NOT NULL,
+                ta_state TEXT
+            );
+            CREATE TABLE IF NOT EXISTS bars (
+                symbol TEXT NOT NULL,
+                date INTEGER NOT NULL,
+                PRIMARY KEY (symbol, date)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bars_date ON bars (date);
+        ''')
+        super(PanelStore, self).__init__(cache, indicator_cache)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def _conn(self):
+        # each thread (eg AsyncStore's readers and writer) has its own connection
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self):
+        # parallel writers (see set_dfs) wait on each other instead of failing
+        conn = sqlite3.connect(self._path, timeout=60)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def get_dfs(self, symbols=None, start=None, end=None, columns=None, timeframe='D'):
+        if timeframe != 'D':
+            return super(PanelStore, self).get_dfs(symbols, start, end, columns, timeframe)
+        symbols = symbols or self.symbols
+        if not isinstance(symbols, list):
+            symbols = [symbols]
+        symbols = [symbol.upper() for symbol in symbols]
+        start = _to_timestamp(start)
+        end = _to_timestamp(end)
+
+        results = {}
+        missing = []
+        for symbol in symbols:
+            df = self._df_cache.get(symbol, None)
+            if df is None:
+                missing.append(symbol)
+            else:
+                results[symbol] = (df[columns] if columns else df)[start:end]
+
+        # only whole histories get cached
+        cache = start is None and end is None and not columns
+        for symbol, df in self._query(missing, start, end, columns).items():
+            if cache:
+                self._df_cache.set(symbol, df)
+            results[symbol] = df
+        return dict((symbol, results[symbol]) for symbol in symbols)
+
+    def _get_timeframe_location(self, timeframe):
+        root, ext = os.path.splitext(self._path)
+        return '%s-%s%s' % (root, timeframe, ext)
+
+    def _get_store_contents(self):
+        return [{'symbol': symbol,
+                 'start': pd.Timestamp(start, tz=pytz.UTC),
+                 'end': pd.Timestamp(end, tz=pytz.UTC)}
+                for symbol, start, end in self._conn.execute(
+                    'SELECT symbol, start, end FROM symbols')]
+
+    def _load_df(self, symbol, columns=None, start=None, end=None):
+        return self._query([symbol], start, end, columns)[symbol]
+
+    def _store_df(self, symbol, df):
+        self._write_rows(symbol, df, replace=True)
+
+    def _append_df(self, symbol, new_df):
+        # just insert the new rows
+        self._write_rows(symbol, new_df)
+
+    def _write_rows(self, symbol, rows_df, replace=False):
+        '''
+        :param rows_df: the rows to insert
+        :param replace: whether or not to delete symbol's existing rows first
+                        (otherwise rows_df is appended to them)
+        '''
+        columns = list(rows_df.columns)
+        with self._conn:
+            # take the write lock up front, so concurrent writers can't race
+            # each other adding the same new columns
+            self._conn.execute('BEGIN IMMEDIATE')
+            existing = self._get_columns()
+            for column in columns:
+                if column not in existing:
+                    self._conn.execute('ALTER TABLE bars ADD COLUMN %s REAL' % _quote(column))
+            if replace:
+                self._conn.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
+            self._conn.executemany(
+                'INSERT INTO bars (symbol, date, %s) VALUES (?, ?, %s)' % (
+                    ', '.join(_quote(column) for column in columns),
+                    ', '.join('?' for _ in columns)),
+                zip([symbol] * len(rows_df), _to_nanoseconds(rows_df.index).tolist(),
+                    *[rows_df[column].astype(float).tolist() for column in columns]))
+            if replace:
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO symbols (symbol, start, end, num_rows)
+                    VALUES (?, ?, ?, ?)
+                ''', (symbol, int(rows_df.index[0].value), int(rows_df.index[-1].value),
+                      len(rows_df)))
+            else:
+                self._conn.execute('''
+                    UPDATE symbols SET end = ?, num_rows = num_rows + ? WHERE symbol = ?
+                ''', (int(rows_df.index[-1].value), len(rows_df), symbol))
+
+    def _get_ta_state(self, symbol):
+        row = self._conn.execute('SELECT ta_state FROM symbols WHERE symbol = ?',
+                                 (symbol.upper(),)).fetchone()
+        if row and row[0]:
+            return json.loads(row[0])
+        return None
+
+    def _set_ta_state(self, symbol, state):
+        with self._conn:
+            self._conn.execute('UPDATE symbols SET ta_state = ? WHERE symbol = ?',
+                               (json.dumps(state) if state else None, symbol.upper()))
+
+    def _get_columns(self):
+        return [row[1] for row in self._conn.execute('PRAGMA table_info(bars)')
+                if row[1] not in ('symbol', 'date')]
+
+    def _query(self, symbols, start=None, end=None, columns=None):
+        columns = columns or self._get_columns()
+        where, params = [], []
+        if start is not None:
+            where.append('date >= ?')
+            params.append(int(start.value))
+        if end is not None:
+            where.append('date <= ?')
+            params.append(int(end.value))
+
+        results = {}
+        for batch in chunk(symbols, self._query_batch_size):
+            sql = 'SELECT symbol, date, %s FROM bars WHERE %s ORDER BY symbol, date' % (
+                ', '.join(_quote(column) for column in columns),
+                ' AND '.join(['symbol IN (%s)' % ', '.join('?' for _ in batch)] + where))
+            df = pd.read_sql_query(sql, self._conn, params=list(batch) + params)
+            df[columns] = df[columns].astype(float)  # NaNs are stored as NULL
+            df['date'] = pd.to_datetime(df['date'], utc=True)
+            for symbol, symbol_df in df.groupby('symbol', sort=False):
+                results[symbol] = symbol_df.drop('symbol', axis=1)\
+                    .set_index('date').rename_axis('Date')
+        return results
+
+
+def _to_nanoseconds(index):
+    return index.tz_convert(None).values.astype('datetime64[ns]').astype('int64')
+
+
+def _quote(column):
+    return '"%s"' % column.replace('"', '""')
+
+
+def _analyze_shard(symbols, store, use_adjusted):
+    return store.analyze(symbols, use_adjusted)
+
+
+def _set_dfs_shard(items, store):
+    store.set_dfs(dict(items))
+    return [store._get_contents(symbol.upper()) for symbol, _ in items]
+
+
+STORES = {
+    'csv': CSVStore,
+    'parquet': ParquetStore,
+    'feather': FeatherStore,
+    'panel': PanelStore,
+}
+
+
+def migrate_store(src, dest, symbols=None):
+    '''
+    Copy the bars (including any already-computed TA columns) for symbols
+    from the src store into the dest store.
+
+    :param src: the store to read from
+    :param dest: the store to write to
+    :param symbols: list of symbols (defaults to all in the src store)
+    :return: list of migrated symbols
+    '''
+    symbols = [symbol.upper() for symbol in symbols or src.symbols]
+    for symbol in symbols:
+        # read straight from disk so the src cache doesn't grow with every symbol
+        df = src._load_df(symbol)
+        dest._store_df(symbol, df)
+        dest._set_ta_state(symbol, src._get_ta_state(symbol))
+        dest._register(symbol, df, cache=False)
+    return symbols
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Migrate bars between store formats')
+    parser.add_argument('--src', default='csv', choices=STORES.keys(), help='The format to migrate from')
+    parser.add_argument('--dest', default='parquet', choices=STORES.keys(), help='The format to migrate to')
+    parser.add_argument('symbols', metavar='SYMBOL', nargs='*', help='Symbols to migrate (defaults to all of them)')
+    args = parser.parse_args()
+
+    migrated = migrate_store(STORES[args.src](), STORES[args.dest](), args.symbols)
+    print('migrated %d symbols from %s to %s' % (len(migrated), args.src, args.dest))
@@ -0,0 +1,157 @@
+from datetime import time, timedelta
+
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    DateOffset,
+    GoodFriday,
+    Holiday,
+    MO,
+    USLaborDay,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+
+from pytradelib.utils import utcnow
+
+
+TIMEZONE = 'America/New_York'
+OPEN = time(9, 30)
+CLOSE = time(16)
+EARLY_CLOSE = time(13)
+
+# the range of dates the calendar covers
+START = pd.Timestamp('1962-01-01')
+END = pd.Timestamp('2099-12-31')
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    '''
+    The NYSE's regular holidays. (A holiday on a Saturday is not observed on
+    the Friday before it, except for Independence Day and Christmas.)
+    '''
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        Holiday('Martin Luther King Jr. Day', month=1, day=1, start_date='1998-01-01',
+                offset=DateOffset(weekday=MO(3))),
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01',
+                observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+# one-off closures (national days of mourning, weather, 9/11)
+SPECIAL_CLOSURES = pd.DatetimeIndex([
+    '1994-04-27',  # President Nixon's funeral
+    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14',  # 9/11
+    '2004-06-11',  # President Reagan's funeral
+    '2007-01-02',  # President Ford's funeral
+    '2012-10-29', '2012-10-30',  # Hurricane Sandy
+    '2018-12-05',  # President G.H.W. Bush's funeral
+    '2025-01-09',  # President Carter's funeral
+])
+
+_holidays = None
+
+
+def holidays(start=None, end=None):
+    '''
+    :return: DatetimeIndex of the (tz-naive) dates the exchange is closed on
+             a weekday, between start and end inclusive
+    '''
+    global _holidays
+    if _holidays is None:
+        _holidays = NYSEHolidayCalendar().holidays(START, END) \
+            .union(SPECIAL_CLOSURES)
+    return _holidays[_holidays.slice_indexer(_to_date(start), _to_date(end))]
+
+
+def sessions(start=None, end=None):
+    '''
+    :return: DatetimeIndex of the trading days between start and end
+             inclusive, as UTC midnights (like the stores' indexes)
+    '''
+    start, end = _to_date(start) or START, _to_date(end) or END
+    return pd.bdate_range(start, end, freq='C', holidays=holidays(), tz='UTC')
+
+
+def is_session(dt):
+    dt = _to_date(dt)
+    return dt.weekday() < 5 and dt not in holidays()
+
+
+def next_session(dt):
+    '''
+    :return: the first session after dt
+    '''
+    return sessions(_to_date(dt) + timedelta(days=1), _to_date(dt) + timedelta(days=14))[0]
+
+
+def previous_session(dt):
+    '''
+    :return: the last session before dt
+    '''
+    return sessions(_to_date(dt) - timedelta(days=14), _to_date(dt) - timedelta(days=1))[-1]
+
+
+def early_closes(start=None, end=None):
+    '''
+    :return: DatetimeIndex of the sessions closing at EARLY_CLOSE: the day
+             before Independence Day, the day after Thanksgiving and
+             Christmas Eve (when they fall on a session)
+    '''
+    start, end = _to_date(start) or START, _to_date(end) or END
+    candidates = []
+    for year in range(start.year, end.year + 1):
+        candidates.append(pd.Timestamp(year, 7, 3))
+        candidates.append(USThanksgivingDay.dates(pd.Timestamp(year, 1, 1),
+                                                  pd.Timestamp(year, 12, 31))[0] + timedelta(days=1))
+        candidates.append(pd.Timestamp(year, 12, 24))
+    candidates = pd.DatetimeIndex(candidates)
+    # the day before a holiday that is observed early (eg July 4th on a
+    # Saturday is observed on Friday July 3rd) isn't a session at all
+    candidates = candidates[(candidates >= start) & (candidates <= end)]
+    return pd.DatetimeIndex([dt for dt in candidates if is_session(dt)]).tz_localize('UTC')
+
+
+def close_time(session):
+    '''
+    :return: the UTC Timestamp of session's close
+    '''
+    session = _to_date(session)
+    close = EARLY_CLOSE if session.tz_localize('UTC') in early_closes(session, session) else CLOSE
+    return pd.Timestamp.combine(session.date(), close).tz_localize(TIMEZONE).tz_convert('UTC')
+
+
+def last_session(now=None):
+    '''
+    :return: the most recent session that has closed as of now (UTC midnight)
+    '''
+    now = pd.Timestamp(now or utcnow())
+    if now.tz is None:
+        now = now.tz_localize('UTC')
+    today = now.tz_convert(TIMEZONE).tz_localize(None).normalize()
+    if is_session(today) and now >= close_time(today):
+        return today.tz_localize('UTC')
+    return previous_session(today)
+
+
+def _to_date(dt):
+    '''
+    :return: dt as a tz-naive, midnight Timestamp (or None)
+    '''
+    if dt is None:
+        return None
+    dt = pd.Timestamp(dt)
+    if dt.tz is not None:
+        dt = dt.tz_localize(None)
+    return dt.normalize()
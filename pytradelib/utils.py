@@ -1,5 +1,13 @@
+import io
 from datetime import datetime, timezone
 
+from pytradelib.lazy import lazy_import
+
+# only the functions which parse bars need these, so they're imported on
+# first use (utils is imported by nearly everything)
+pd = lazy_import('pandas')
+pyarrow = lazy_import('pyarrow', submodules=['csv'], optional=True)
+
 
 def utcnow():
     return datetime.utcnow().replace(tzinfo=timezone.utc)
@@ -18,3 +26,55 @@ def percent_change(from_val, to_val):
 def within_percent_of_value(price, value, percent=1):
     diff = percent * 0.01 * 0.5 * value
     return (value - diff) < price < (value + diff)
+
+
+def _sanitize_dates(start, end):
+    '''
+    :return: tuple of (start, end) Timestamps, defaulting to 2010-01-01 and today
+    '''
+    start = pd.Timestamp(start or datetime(2010, 1, 1))
+    end = pd.Timestamp(end or datetime.today())
+    if start > end:
+        raise ValueError('start must be an earlier date than end')
+    return start, end
+
+
+# the types of the columns in the providers' daily bars CSVs, so the parsers
+# can skip inferring them (volumes are floats, as adjusted volumes are fractional)
+CSV_FLOAT_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Ex-Dividend', 'Split Ratio',
+                     'Adj. Open', 'Adj. High', 'Adj. Low', 'Adj. Close', 'Adj. Volume']
+
+
+def csv_to_df(csv):
+    '''
+    Parse a provider's CSV of daily bars (newest or oldest first) into a
+    DataFrame with an ascending, UTC 'Date' index, and the adjusted columns
+    named like 'Adj Close' (as opposed to Quandl's 'Adj. Close').
+
+    Raw response bytes are parsed directly (with pyarrow's multi-threaded
+    parser if it's installed), without decoding them to a str first.
+
+    :param csv: bytes or str
+    '''
+    if isinstance(csv, str):
+        csv = csv.encode('utf-8')
+    df = _read_csv_arrow(csv) if pyarrow is not None else _read_csv_c(csv)
+    df.index = pd.to_datetime(df.index, format='ISO8601', utc=True)
+    df.index.name = 'Date'
+    df.rename(columns=lambda column: column.replace('Adj. ', 'Adj '), inplace=True)
+    if not df.index.is_monotonic_increasing:
+        df = df.iloc[::-1] if df.index.is_monotonic_decreasing else df.sort_index()
+    return df
+
+
+def _read_csv_arrow(csv):
+    convert_options = pyarrow.csv.ConvertOptions(column_types=dict(
+        (column, pyarrow.float64()) for column in CSV_FLOAT_COLUMNS))
+    table = pyarrow.csv.read_csv(pyarrow.py_buffer(csv), convert_options=convert_options)
+    df = table.to_pandas()
+    return df.set_index(df.columns[0])
+
+
+def _read_csv_c(csv):
+    return pd.read_csv(io.BytesIO(csv), index_col=0, engine='c',
+                       dtype=dict((column, 'float64') for column in CSV_FLOAT_COLUMNS))
@@ -1,15 +1,19 @@
 
 
-from pytradelib.utils import batch
-from pytradelib.downloader import Downloader
+from pytradelib.utils import chunk
+from pytradelib.http_client import get_client
 
-from urllib import urlencode
+from urllib.parse import urlencode
 try:
     import simplejson as json
 except ImportError:
     import json
 
 
+# the number of symbols looked up per request
+BATCH_SIZE = 100
+
+
 def get_yql_url(yql):
     base_url = 'http://query.yahooapis.com/v1/public/yql?'
     url = base_url + urlencode({'q': yql,
@@ -55,15 +59,15 @@ def get_symbols_info(symbols, keys=None):
     yql = 'select %(keys)s from yahoo.finance.quotes where symbol in (%(symbols)s)'
 
     urls = []
-    for batched_symbols in batch(symbols, 100):
+    for batched_symbols in chunk(symbols, BATCH_SIZE):
         csv_symbols = ','.join(['"%s"' % s.upper() for s in batched_symbols])
         urls.append(get_yql_url(yql % {'keys': ','.join(keys),
                                        'symbols': csv_symbols}))
-    downloader = Downloader()
 
     results = []
-    for url, text in downloader.download(urls):
-        json_ = json.loads(text)
+    # quotes are always changing, so don't memoize them
+    for url, body in get_client().get_many(urls, memo=False):
+        json_ = json.loads(body.decode('utf-8'))
         for result in json_['query']['results']['quote']:
             results.append(_convert_result(result))
     return results
@@ -15,6 +15,9 @@ setup(
         'scipy',
         'ta-lib',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
     packages=find_packages(exclude=['docs', 'test']),
     include_package_data=True,
     zip_safe=False,
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytradelib.backtest import OPEN, STOP, TARGET, UNFILLED, backtest, summarize
+
+
+def make_bars(rows):
+    '''
+    :param rows: list of (open, high, low, close), one per session
+    '''
+    index = pd.bdate_range('2020-01-06', periods=len(rows), tz='UTC', name='Date')
+    return pd.DataFrame(rows, columns=['Open', 'High', 'Low', 'Close'], index=index)
+
+
+@pytest.fixture
+def bars():
+    return {
+        # fills at the limit, then reaches half way to the target and the target
+        'AAA': make_bars([(10.2, 10.5, 10.1, 10.3), (10.5, 10.6, 9.9, 10.2),
+                          (10.5, 11.2, 10.3, 11.0), (11.1, 12.5, 11.0, 12.2)]),
+        # a short that fills, then gaps up through its stop
+        'BBB': make_bars([(10.2, 10.5, 10.1, 10.3), (9.9, 10.1, 9.8, 10.0),
+                          (11.5, 11.8, 11.2, 11.6), (11.6, 11.7, 11.4, 11.5)]),
+        # never reaches the limit
+        'CCC': make_bars([(10.2, 10.5, 10.1, 10.3), (10.5, 10.6, 9.9, 10.2),
+                          (10.5, 11.2, 10.3, 11.0), (11.1, 12.5, 11.0, 12.2)]),
+    }
+
+
+def make_signals(bars, rows):
+    date = bars['AAA'].index[0]
+    return pd.DataFrame(rows, columns=['symbol', 'action', 'price', 'target_price', 'stop_price']) \
+        .assign(date=date)
+
+
+def test_backtest(bars):
+    signals = make_signals(bars, [('AAA', 'BUY', 10.0, 12.0, 9.0),
+                                  ('BBB', 'SELL', 10.0, 8.0, 11.0),
+                                  ('CCC', 'BUY', 5.0, 6.0, 4.5)])
+    trades = backtest(bars, signals, max_amount=5000, commission=10).set_index('symbol')
+
+    aaa = trades.loc['AAA']
+    assert aaa.exit_reason == TARGET
+    assert (aaa.quantity, aaa.entry_price, aaa.exit_price, aaa.scaled_out) == (400, 10.0, 12.0, 2)
+    assert aaa.entry_date == bars['AAA'].index[1]
+    assert aaa.bars_held == 3
+    # half $1 up and half $2 up, less the entry and two exit commissions
+    assert aaa.profit == pytest.approx(400 * 1.5 - 30)
+
+    bbb = trades.loc['BBB']
+    assert bbb.exit_reason == STOP
+    assert bbb.action == 'SELL'
+    # stopped out at the open it gapped up to, not the stop price
+    assert (bbb.entry_price, bbb.exit_price) == (10.0, 11.5)
+    assert bbb.profit == pytest.approx(400 * -1.5 - 20)
+    assert bbb.r_multiple == pytest.approx(bbb.profit / (400 * 1.0 + 20))
+
+    ccc = trades.loc['CCC']
+    assert ccc.exit_reason == UNFILLED
+    assert ccc.profit == 0
+    assert pd.isnull(ccc.entry_date)
+
+    summary = summarize(trades)
+    assert (summary.signals, summary.trades, summary.win_rate) == (3, 2, 0.5)
+    assert summary.total_profit == pytest.approx(570 - 620)
+
+
+def test_backtest_stop_first(bars):
+    # the last bar reaches both AAA's stop and its target
+    bars['AAA'].iloc[3] = (10.5, 12.5, 8.5, 10.0)
+    signals = make_signals(bars, [('AAA', 'BUY', 10.0, 12.0, 9.0)])
+    assert backtest(bars, signals).exit_reason[0] == STOP
+    assert backtest(bars, signals, stop_first=False).exit_reason[0] == TARGET
+
+
+def test_backtest_marks_open_trades(bars):
+    signals = make_signals(bars, [('AAA', 'BUY', 10.0, 20.0, 5.0)])
+    trade = backtest(bars, signals, max_amount=5000, commission=10).iloc[0]
+    assert trade.exit_reason == OPEN
+    assert trade.exit_price == 12.2
+    assert trade.profit == pytest.approx(400 * 2.2 - 10)
+    assert np.isnan(backtest(bars, signals, entry_bars=0).iloc[0].entry_price)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from pytradelib.cache import IndicatorCache, LRUCache
+
+
+def test_lru_cache_limits():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    # b was the least recently used
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.stats['evictions'] == 1
+
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set('a', 'x' * 6)
+    cache.set('b', 'x' * 6)
+    assert list(cache._entries) == ['b']
+    # what was just added is kept, even if it alone is over the limit
+    cache.set('c', 'x' * 20)
+    assert list(cache._entries) == ['c'] and cache.num_bytes == 20
+
+
+def test_indicator_cache(tmp_path):
+    calls = []
+
+    def double(values, factor=2):
+        calls.append(len(values))
+        return values * factor
+
+    dates = pd.date_range('2020-01-01', periods=5, tz='UTC')
+    values = np.arange(5.0)
+    cache = IndicatorCache(str(tmp_path))
+    np.testing.assert_array_equal(cache.get('aaa', 'double', double, dates, values), values * 2)
+    cache.get('AAA', 'double', double, dates, values)
+    assert calls == [5]
+    # other parameters are another entry
+    np.testing.assert_array_equal(cache.get('AAA', 'double', double, dates, values, factor=3),
+                                  values * 3)
+    assert calls == [5, 5]
+
+    # a new process reads it from disk
+    cache = IndicatorCache(str(tmp_path))
+    cache.get('AAA', 'double', double, dates, values)
+    assert calls == [5, 5]
+    assert cache.stats['disk_hits'] == 1
+
+    # new bars change the fingerprint
+    dates = pd.date_range('2020-01-01', periods=6, tz='UTC')
+    np.testing.assert_array_equal(cache.get('AAA', 'double', double, dates, np.arange(6.0)),
+                                  np.arange(6.0) * 2)
+    assert calls == [5, 5, 6]
+
+
+def test_indicator_cache_is_bounded_by_default():
+    cache = IndicatorCache()
+    assert cache._memory.max_bytes is not None
+
+
+def test_cache_namespaces_share_limits():
+    cache = LRUCache(max_entries=2)
+    weekly = cache.namespace('W')
+    cache.set('AAA', 'daily')
+    weekly.set('AAA', 'weekly')
+    assert (cache.get('AAA'), weekly.get('AAA')) == ('daily', 'weekly')
+    weekly.set('BBB', 'weekly')
+    assert 'AAA' not in cache and 'BBB' in weekly
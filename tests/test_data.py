@@ -0,0 +1,50 @@
+import pandas as pd
+
+from pytradelib.data import _is_active, plan_updates
+
+
+class FakeStore(object):
+    def __init__(self, end_dates):
+        self._end_dates = end_dates
+
+    @property
+    def symbols(self):
+        return list(self._end_dates)
+
+    def get_end_date(self, symbol):
+        return self._end_dates[symbol]
+
+
+def utc(date):
+    return pd.Timestamp(date, tz='UTC')
+
+
+def test_plan_updates():
+    store = FakeStore({
+        'AAA': utc('2024-07-03'),
+        'BBB': utc('2024-07-03'),
+        'CCC': utc('2024-07-08'),
+        'DDD': utc('2024-07-01'),
+    })
+    end = utc('2024-07-08')
+    # AAA and BBB are only missing the sessions after Independence Day, and
+    # CCC is already current
+    assert plan_updates(store, end) == [
+        (utc('2024-07-02'), end, ['DDD']),
+        (utc('2024-07-05'), end, ['AAA', 'BBB']),
+    ]
+
+
+def test_plan_updates_current():
+    store = FakeStore({'AAA': utc('2024-07-05')})
+    # the weekend after the last session has no sessions to fetch
+    assert plan_updates(store, utc('2024-07-05')) == []
+    assert plan_updates(FakeStore({}), utc('2024-07-05')) == []
+
+
+def test_is_active():
+    since = utc('2024-07-03')
+    assert _is_active({'last_trade_date': '7/5/2024'}, since)
+    assert _is_active({'last_trade_date': '7/3/2024'}, since)
+    assert not _is_active({'last_trade_date': '7/2/2024'}, since)
+    assert not _is_active({'last_trade_date': None}, since)
@@ -0,0 +1,71 @@
+import time
+import asyncio
+
+import pytest
+
+web = pytest.importorskip('aiohttp.web')
+
+from pytradelib.downloader import RateLimiter, bulk_download
+
+
+async def serve(handler, test):
+    app = web.Application()
+    app.router.add_get('/{name}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        port = runner.addresses[0][1]
+        return await test('http://127.0.0.1:%d/' % port)
+    finally:
+        await runner.cleanup()
+
+
+def test_retries_transient_errors():
+    requests = []
+
+    async def handler(request):
+        name = request.match_info['name']
+        requests.append(name)
+        if name == 'flaky' and requests.count(name) < 3:
+            return web.Response(status=503)
+        if name == 'missing':
+            return web.Response(status=404)
+        return web.Response(text=name)
+
+    async def test(base):
+        return await bulk_download([base + 'flaky', base + 'missing', base + 'ok'],
+                                   retries=3, backoff=0)
+
+    (_, flaky), (_, missing), (_, ok) = asyncio.run(serve(handler, test))
+    assert (flaky, ok) == ('flaky', 'ok')
+    assert missing.status == 404
+    assert requests.count('flaky') == 3
+    # a 404 isn't worth retrying
+    assert requests.count('missing') == 1
+
+
+def test_gives_up_after_retries():
+    async def handler(request):
+        return web.Response(status=503)
+
+    async def test(base):
+        return await bulk_download(base + 'down', retries=2, backoff=0)
+
+    [(_, error)] = asyncio.run(serve(handler, test))
+    assert error.status == 503
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(50, burst=1)
+
+    async def acquire(n):
+        for _ in range(n):
+            await limiter.acquire()
+
+    started = time.monotonic()
+    asyncio.run(acquire(6))
+    # the first is free, then one every 20ms (and the quota carries across loops)
+    asyncio.run(acquire(5))
+    assert time.monotonic() - started >= 10 * 0.02 * 0.9
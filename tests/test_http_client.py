@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip('requests')
+
+from pytradelib.http_client import HTTPClient
+
+
+class FakeResponse(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    client = HTTPClient(str(tmp_path), memo_ttl=60)
+    client.requests = []
+
+    def get(url, headers=None, timeout=None):
+        client.requests.append(url)
+        return FakeResponse(b'%d' % len(client.requests))
+    monkeypatch.setattr(client._session, 'get', get)
+    return client
+
+
+def test_memo_expires(client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('pytradelib.http_client.time.monotonic', lambda: now[0])
+    assert client.get('http://example.com/codes') == b'1'
+    now[0] += 59
+    assert client.get('http://example.com/codes') == b'1'
+    now[0] += 1
+    assert client.get('http://example.com/codes') == b'2'
+    assert client.get('http://example.com/codes', memo=False) == b'3'
+    client.clear()
+    assert client.get('http://example.com/codes') == b'4'
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('talib')
+
+from pytradelib.indicators import COLUMNS, compute_ta, compute_ta_state, extend_ta
+from pytradelib.store import CSVStore
+
+
+# extending the recursive indicators bar by bar accumulates rounding
+# differences from talib's vectorized loops, so compare with a tolerance
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def make_bars(num_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2010-01-04', periods=num_bars, tz='UTC', name='Date')
+    close = np.abs(50 + np.cumsum(rng.normal(0, 1, num_bars))) + 5
+    open_ = close + rng.normal(0, 0.5, num_bars)
+    high = np.maximum(open_, close) + rng.random(num_bars)
+    low = np.minimum(open_, close) - rng.random(num_bars)
+    volume = rng.integers(100000, 1000000, num_bars).astype(np.float64)
+    df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low,
+                       'Close': close, 'Volume': volume}, index=index)
+    for column in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        df['Adj ' + column] = df[column]
+    return df
+
+
+def extend(df, num_existing, num_new, state):
+    # extend_ta takes the trailing bars, ending with the new ones
+    end = num_existing + num_new
+    return extend_ta(df.High.values[:end], df.Low.values[:end], df.Close.values[:end],
+                     df.Volume.values[:end], num_new, state)
+
+
+def assert_matches_full(columns, df, start, end):
+    expected = compute_ta(df.High.values[:end], df.Low.values[:end],
+                          df.Close.values[:end], df.Volume.values[:end])
+    for column in COLUMNS:
+        np.testing.assert_allclose(columns[column], expected[column][start:end],
+                                   rtol=RTOL, atol=ATOL, err_msg=column)
+
+
+def initial_state(df, num_bars):
+    return compute_ta_state(df.High.values[:num_bars], df.Low.values[:num_bars],
+                            df.Close.values[:num_bars])
+
+
+def test_extend_ta_many_bars():
+    df = make_bars(600)
+    columns, state = extend(df, 400, 200, initial_state(df, 400))
+    assert_matches_full(columns, df, 400, 600)
+    assert state == pytest.approx(initial_state(df, 600), rel=RTOL)
+
+
+def test_extend_ta_bar_by_bar():
+    df = make_bars(400, seed=1)
+    state = initial_state(df, 250)
+    for num_existing in range(250, 400):
+        columns, state = extend(df, num_existing, 1, state)
+        assert_matches_full(columns, df, num_existing, num_existing + 1)
+    assert state == pytest.approx(initial_state(df, 400), rel=RTOL)
+
+
+def test_extend_ta_from_short_history():
+    # fewer bars than the windowed indicators' lookback
+    df = make_bars(120, seed=2)
+    columns, _ = extend(df, 40, 80, initial_state(df, 40))
+    assert_matches_full(columns, df, 40, 120)
+
+
+def test_store_extends_ta_across_reopens(tmp_path, monkeypatch):
+    extended = []
+    extend_ta = CSVStore._extend_ta
+
+    def _extend_ta(self, existing_df, new_df, state, use_adjusted=True):
+        extended.append(len(new_df))
+        return extend_ta(self, existing_df, new_df, state, use_adjusted)
+    monkeypatch.setattr(CSVStore, '_extend_ta', _extend_ta)
+
+    df = make_bars(500, seed=3)
+    CSVStore(str(tmp_path)).set_df('TEST', df[:300])
+    for end in [350, 351, 352, 420, 500]:
+        # a fresh store has to pick the TA state up from its manifest
+        store = CSVStore(str(tmp_path))
+        assert store._get_ta_state('TEST')['end'] == store.get_end_date('TEST').value
+        store.set_df('TEST', df[:end])
+    assert extended == [50, 1, 1, 68, 80]
+
+    stored = CSVStore(str(tmp_path)).get_df('TEST')
+    assert len(stored) == 500
+    expected = compute_ta(df['Adj High'].values, df['Adj Low'].values,
+                          df['Adj Close'].values, df.Volume.values)
+    for column in COLUMNS:
+        np.testing.assert_allclose(stored[column].values[300:], expected[column][300:],
+                                   rtol=RTOL, atol=ATOL, err_msg=column)
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('talib')
+
+from pytradelib.memmap import MemmapStore
+from pytradelib.store import CSVStore
+
+
+def make_bars(num_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2010-01-04', periods=num_bars, tz='UTC', name='Date')
+    close = np.abs(50 + np.cumsum(rng.normal(0, 1, num_bars))) + 5
+    df = pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                       'Volume': rng.integers(100000, 1000000, num_bars).astype(np.float64)},
+                      index=index)
+    for column in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        df['Adj ' + column] = df[column]
+    return df
+
+
+def test_rebuilding_swaps_generations(tmp_path):
+    source = CSVStore(str(tmp_path / 'csv'))
+    source.set_df('AAA', make_bars(100))
+    store_dir = str(tmp_path / 'memmap')
+
+    first = MemmapStore.build(source, store_dir=store_dir)
+    np.testing.assert_allclose(first.get_arrays('AAA', ['Close'])['Close'],
+                               source.get_df('AAA').Close.values)
+
+    source.set_df('BBB', make_bars(50, seed=1))
+    second = MemmapStore.build(source, store_dir=store_dir)
+    MemmapStore.build(source, store_dir=store_dir)
+    # readers of the previous generation keep working, older ones are removed
+    assert sorted(os.listdir(store_dir)) == ['gen-2', 'gen-3', 'index.json']
+    assert second.symbols == ['AAA', 'BBB']
+    assert second.get_end_date('BBB') == source.get_end_date('BBB')
+    assert MemmapStore(store_dir).symbols == ['AAA', 'BBB']
+
+
+def test_empty_store(tmp_path):
+    store = MemmapStore(str(tmp_path / 'missing'))
+    assert store.symbols == []
+    store = MemmapStore.build(CSVStore(str(tmp_path / 'csv')), store_dir=str(tmp_path / 'memmap'))
+    assert store.symbols == [] and store.fields
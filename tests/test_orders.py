@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytradelib.orders import (
+    BUY,
+    SELL,
+    Bracket,
+    Order,
+    OrderBook,
+    _DERIVED,
+    calculate_quantity,
+    entries_from_screen,
+    plan_orders,
+)
+
+
+class FakeStore(object):
+    '''
+    Returns the same last bars for every symbol, with atr as a percentage
+    of the close (like the stored NATR).
+    '''
+    def __init__(self, bars):
+        self._bars = bars
+
+    def get_df(self, symbol, columns=None):
+        close, atr = self._bars[symbol]
+        df = pd.DataFrame({'Close': [close * 0.9, close], 'atr': [atr, atr]})
+        return df[columns] if columns else df
+
+
+@pytest.mark.parametrize('action, sign', [(BUY, 1), (SELL, -1)])
+def test_entries_from_screen_uses_dollar_atr(action, sign):
+    store = FakeStore({'AAA': (10.0, 3.0), 'BBB': (200.0, 1.5)})
+    screen = pd.DataFrame(index=['AAA', 'BBB'])
+    entries = entries_from_screen(screen, store, action, stop_atr=1.0, target_atr=3.0)
+
+    # 3% of $10 is 30 cents, and 1.5% of $200 is $3
+    dollar_atr = np.array([0.3, 3.0])
+    np.testing.assert_allclose(entries['price'], [10.0, 200.0])
+    np.testing.assert_allclose(sign * (entries['price'] - entries['stop_price']), dollar_atr)
+    np.testing.assert_allclose(sign * (entries['target_price'] - entries['price']), 3 * dollar_atr)
+    assert list(entries['action']) == [action, action]
+
+
+def test_calculate_quantity():
+    # 95% of $5000 buys 475 shares at $10, so 4 lots of 100
+    assert calculate_quantity(10.0, 5000) == 400
+    # not even one lot of 100 (or 10) at $1000
+    assert calculate_quantity(1000.0, 5000) == 4
+    np.testing.assert_array_equal(calculate_quantity(np.array([10.0, 1000.0]), 5000), [400, 4])
+
+
+def test_plan_orders():
+    entries = pd.DataFrame({
+        'ticker': ['aaa', 'bbb', 'ccc', 'ddd'],
+        'action': ['buy', 'SELL', 'BUY', 'BUY'],
+        'price': [10.0, 50.0, 20.0, 10.0],
+        # aaa's target and stop are the wrong way around, which is accepted
+        'target_price': [9.0, 40.0, 19.0, 15.0],
+        'stop_price': [12.0, 55.0, 18.0, 9.0],
+    })
+    orders = plan_orders(entries, max_amount=5000, commission=10)
+
+    # ccc's target is below its price, so it's last with an error
+    assert list(orders.symbol) == ['DDD', 'BBB', 'AAA', 'CCC']
+    assert orders.error[:3].isnull().all()
+    assert orders.error.iloc[3] == 'target must be past the price'
+    aaa = orders.set_index('symbol').loc['AAA']
+    assert (aaa.target_price, aaa.stop_price) == (12.0, 9.0)
+    assert aaa.quantity == 400
+    # half of 400 shares $1 up and half $2 up, less three commissions,
+    # against $1 on 400 shares and two commissions
+    assert aaa.total_profit == 570
+    assert aaa.risk == 420
+    assert list(orders.risk_reward[:3]) == sorted(orders.risk_reward[:3], reverse=True)
+
+
+def test_order_book_matches_brackets():
+    brackets = [
+        Bracket(Order(BUY, 'AAA', 400, 10.0), target_price=12.0, stop_price=9.0),
+        Bracket(Order(SELL, 'BBB', 90, 50.0, stop_price=50.5), target_price=40.0, stop_price=55.0),
+    ]
+    book = OrderBook.from_brackets(brackets)
+    assert len(book) == 2
+    for name in _DERIVED:
+        np.testing.assert_allclose(getattr(book, name), [getattr(b, name) for b in brackets],
+                                   err_msg=name)
+    assert book[0].entry == brackets[0].entry
+    assert book[1].entry.stop_price == 50.5
+    np.testing.assert_array_equal(book.to_frame().entry_stop.isnull(), [True, False])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('talib')
+
+from pytradelib.metrics import calc_all_metrics
+from pytradelib.screener import DEFAULT_STEPS, Filter, Metric, Screener, min_bars, min_close
+
+
+class FakeStore(object):
+    def __init__(self, dfs):
+        self._dfs = dfs
+
+    @property
+    def symbols(self):
+        return sorted(self._dfs)
+
+    def get_df(self, symbol):
+        return self._dfs[symbol]
+
+    def get_dfs(self, symbols):
+        return dict((symbol, self._dfs[symbol]) for symbol in symbols)
+
+
+def make_bars(num_bars, seed):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end='2020-01-03', periods=num_bars, tz='UTC', name='Date')
+    close = np.abs(20 + np.cumsum(rng.normal(0, 1, num_bars))) + 1
+    return pd.DataFrame({'Open': close + rng.normal(0, 0.5, num_bars), 'Close': close,
+                         'Volume': rng.integers(1000, 100000, num_bars).astype(np.float64)},
+                        index=index)
+
+
+@pytest.fixture
+def store():
+    # histories of different lengths, so the stacked arrays are padded
+    return FakeStore(dict(('S%02d' % i, make_bars(150 + 37 * i, i)) for i in range(20)))
+
+
+def per_symbol(steps):
+    # the same steps, without their array forms
+    return [Metric(step.names if len(step.names) > 1 else step.names[0], step.func, step.dtype)
+            if isinstance(step, Metric) else Filter(step.name, step.predicate)
+            for step in steps]
+
+
+def test_matches_calc_all_metrics(store):
+    expected = calc_all_metrics(store)
+    for block_size in [3, 256]:
+        results = Screener(store, block_size=block_size).run()
+        pd.testing.assert_frame_equal(results, expected[results.columns], check_names=False)
+
+
+def test_filters(store):
+    steps = [min_bars(400), min_close(15)] + DEFAULT_STEPS
+    results = Screener(store, steps, block_size=4).run()
+    expected = Screener(store, per_symbol(steps), block_size=4).run()
+    pd.testing.assert_frame_equal(results, expected)
+    assert 0 < len(results) < 20
+    for symbol in results.index:
+        df = store.get_df(symbol)
+        assert len(df) >= 400 and df.Close.iloc[-1] >= 15
@@ -0,0 +1,169 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('talib')
+pytest.importorskip('pyarrow')
+
+from pytradelib.manifest import Manifest
+from pytradelib import store as store_module
+from pytradelib.store import CSVStore, FeatherStore, PanelStore, ParquetStore
+
+
+def make_bars(num_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2010-01-04', periods=num_bars, tz='UTC', name='Date')
+    close = np.abs(50 + np.cumsum(rng.normal(0, 1, num_bars))) + 5
+    open_ = close + rng.normal(0, 0.5, num_bars)
+    df = pd.DataFrame({'Open': open_, 'High': np.maximum(open_, close) + rng.random(num_bars),
+                       'Low': np.minimum(open_, close) - rng.random(num_bars), 'Close': close,
+                       'Volume': rng.integers(100000, 1000000, num_bars).astype(np.float64)},
+                      index=index)
+    for column in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        df['Adj ' + column] = df[column]
+    return df
+
+
+def remove_manifest(store_dir):
+    for filename in os.listdir(store_dir):
+        if filename.startswith(Manifest.filename):
+            os.remove(os.path.join(store_dir, filename))
+
+
+def test_rebuilt_manifest_keeps_appended_segments(tmp_path):
+    df = make_bars(280)
+    store = ParquetStore(str(tmp_path))
+    store.set_df('TEST', df[:250])
+    store.set_df('TEST', df[:265])
+    store.set_df('TEST', df)
+    assert len(store.manifest.get_segments('TEST')) == 2
+
+    remove_manifest(str(tmp_path))
+    reopened = ParquetStore(str(tmp_path))
+    assert reopened.get_end_date('TEST') == df.index[-1]
+    assert len(reopened.manifest.get_segments('TEST')) == 2
+    stored = reopened.get_df('TEST')
+    assert len(stored) == 280
+    np.testing.assert_allclose(stored.Close.values, df.Close.values)
+
+    # and it can carry on appending to them
+    more = make_bars(290)
+    more.iloc[:280] = df
+    reopened.set_df('TEST', more)
+    assert len(ParquetStore(str(tmp_path)).get_df('TEST')) == 290
+
+
+def test_rebuilt_manifest_drops_compacted_segments(tmp_path):
+    df = make_bars(270, seed=1)
+    store = ParquetStore(str(tmp_path))
+    store.set_df('TEST', df[:250])
+    store.set_df('TEST', df)
+    segment_path = store.manifest.get_segments('TEST')[0]['path']
+    # as if compacting crashed after writing the new file but before
+    # removing the segment
+    with open(segment_path, 'rb') as f:
+        segment = f.read()
+    store.compact()
+    with open(segment_path, 'wb') as f:
+        f.write(segment)
+
+    remove_manifest(str(tmp_path))
+    reopened = ParquetStore(str(tmp_path))
+    assert len(reopened.get_df('TEST')) == 270
+    assert reopened.manifest.get_segments('TEST') == []
+    assert not os.path.exists(segment_path)
+
+
+def test_csv_store_rewrites_instead_of_appending(tmp_path):
+    df = make_bars(260, seed=2)
+    store = CSVStore(str(tmp_path))
+    store.set_df('TEST', df[:250])
+    store.set_df('TEST', df)
+    assert store.manifest.get_segments('TEST') == []
+    assert not os.path.exists(os.path.join(str(tmp_path), '.segments'))
+    # one CSV, named for (and holding) the whole history
+    csvs = [f for f in os.listdir(str(tmp_path)) if f.endswith('.csv')]
+    assert csvs == [os.path.basename(store._get_store_path('TEST', df.index[0], df.index[-1]))]
+    assert len(pd.read_csv(os.path.join(str(tmp_path), csvs[0]))) == 260
+
+
+def test_analyze_empty_store(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    assert store.analyze().empty
+    assert store.analyze(workers=2).empty
+
+
+def test_appended_segments_survive_reopening(tmp_path):
+    df = make_bars(300, seed=3)
+    store = ParquetStore(str(tmp_path))
+    store.set_df('TEST', df[:250])
+    for end in [260, 270, 300]:
+        store.set_df('TEST', df[:end])
+    assert len(store.manifest.get_segments('TEST')) == 3
+
+    reopened = ParquetStore(str(tmp_path))
+    assert reopened.verify('TEST')
+    assert reopened.get_end_date('TEST') == df.index[-1]
+    stored = reopened.get_df('TEST')
+    assert stored.index.equals(df.index)
+    np.testing.assert_allclose(stored.Close.values, df.Close.values)
+    # a range read spanning the file and the segments
+    stored = reopened.get_df('TEST', start=df.index[245], end=df.index[265])
+    assert stored.index.equals(df.index[245:266])
+
+
+def test_segments_compact_at_max_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(ParquetStore, 'max_segments', 2)
+    df = make_bars(280, seed=4)
+    store = ParquetStore(str(tmp_path))
+    store.set_df('TEST', df[:250])
+    store.set_df('TEST', df[:260])
+    store.set_df('TEST', df[:270])
+    segment_paths = [d['path'] for d in store.manifest.get_segments('TEST')]
+    assert len(segment_paths) == 2
+    # the third append rewrites everything as one file instead
+    store.set_df('TEST', df)
+    assert store.manifest.get_segments('TEST') == []
+    assert not any(os.path.exists(path) for path in segment_paths)
+    assert len(ParquetStore(str(tmp_path)).get_df('TEST')) == 280
+
+
+@pytest.mark.parametrize('store_cls', [ParquetStore, FeatherStore])
+def test_arrow_stores_require_pyarrow(tmp_path, monkeypatch, store_cls):
+    monkeypatch.setattr(store_module, 'pyarrow', None)
+    with pytest.raises(ImportError, match='pyarrow'):
+        store_cls(str(tmp_path))
+
+
+@pytest.mark.parametrize('store_cls, location', [(ParquetStore, 'parquet'), (CSVStore, 'csv'),
+                                                  (PanelStore, 'panel.sqlite')])
+def test_updates_only_read_the_latest_bars(tmp_path, store_cls, location):
+    df = make_bars(1000, seed=5)
+    location = str(tmp_path / location)
+    store_cls(location).set_df('TEST', df[:900])
+
+    store = store_cls(location)
+    existing_df, state = store._get_existing('TEST')
+    assert 200 <= len(existing_df) < 300
+    assert existing_df.index[-1] == df.index[899]
+    store.set_df('TEST', df)
+
+    reopened = store_cls(location)
+    assert reopened.get_start_date('TEST') == df.index[0]
+    stored = reopened.get_df('TEST')
+    assert stored.index.equals(df.index)
+    np.testing.assert_allclose(stored.Close.values, df.Close.values)
+
+
+def test_timeframe_stores_share_the_caches(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    store.set_df('TEST', make_bars(300, seed=6))
+    weekly = store.get_df('TEST', timeframe='W')
+    daily = store.get_df('TEST')
+    assert len(weekly) < len(daily)
+    timeframe_store = store._get_timeframe_store('W')
+    assert timeframe_store._indicator_cache is store._indicator_cache
+    assert timeframe_store.cache._cache is store.cache
+    assert len(store.cache) == 2
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from pytradelib.trading_calendar import (
+    close_time,
+    is_session,
+    last_session,
+    next_session,
+    previous_session,
+    sessions,
+)
+
+
+def utc(date):
+    return pd.Timestamp(date, tz='UTC')
+
+
+def test_holidays_and_closures():
+    assert is_session('2024-07-03')
+    assert not is_session('2024-07-04')  # Independence Day
+    assert not is_session('2024-03-29')  # Good Friday
+    assert not is_session('2012-10-29')  # Hurricane Sandy
+    assert not is_session('2024-07-06')  # a Saturday
+    # Independence Day on a Saturday is observed on the Friday
+    assert not is_session('2020-07-03')
+
+
+def test_sessions():
+    assert list(sessions('2024-07-01', '2024-07-08')) == [
+        utc('2024-07-01'), utc('2024-07-02'), utc('2024-07-03'), utc('2024-07-05'), utc('2024-07-08')]
+    assert next_session('2024-07-03') == utc('2024-07-05')
+    assert previous_session(utc('2024-07-08')) == utc('2024-07-05')
+
+
+def test_close_time():
+    assert close_time('2024-07-05') == pd.Timestamp('2024-07-05 20:00', tz='UTC')
+    # the day after Thanksgiving closes early (and it's not daylight saving)
+    assert close_time('2024-11-29') == pd.Timestamp('2024-11-29 18:00', tz='UTC')
+
+
+def test_last_session():
+    # the day after a holiday, before and after the close
+    assert last_session(pd.Timestamp('2024-07-05 15:00', tz='America/New_York')) == utc('2024-07-03')
+    assert last_session(pd.Timestamp('2024-07-05 16:00', tz='America/New_York')) == utc('2024-07-05')
+    # a tz-naive now is taken to be UTC, and weekends go back to the Friday
+    assert last_session(pd.Timestamp('2024-07-07 12:00')) == utc('2024-07-05')
@@ -1,10 +1,11 @@
+import os
 import re
 import sys
 
-from colorclass import Color
-from terminaltables import AsciiTable
-
-from pytradelib.hash import Hash
+# (colorclass and terminaltables are imported where the tables are printed,
+# so handing an order to a running daemon doesn't wait on them)
+from pytradelib import daemon, orders
+from pytradelib.orders import BUY, SELL, Bracket, Order, calculate_quantity
 from pytradelib.settings import COMMISSION, MAX_AMOUNT
 
 
@@ -12,9 +13,6 @@ def error():
     print('Command should be in the format of:\n <buy|sell> [quantity] <ticker> at <price>, <sell|buy> at <target_price> or <stop_price>')
     sys.exit(1)
 
-BUY = 'BUY'
-SELL = 'SELL'
-
 REGEXES = {
     'limit': re.compile('''
     ^ # action [quantity] ticker at price
@@ -57,100 +55,83 @@ def parse_args(args):
     if not entry_match or not exit_match:
         error()
 
-    entry = Hash(**entry_match.groupdict())
-    entry.action = entry.action.upper()
-    entry.ticker = entry.ticker.upper()
-    if 'price' in entry:
-        entry.price = float(entry.price)
+    entry = entry_match.groupdict()
+    action = entry['action'].upper()
+    if entry.get('price'):
+        price, entry_stop = float(entry['price']), None
     else:
-        entry.stop_price = float(entry.stop_price)
-        entry.price = float(entry.limit_price)
-    entry.quantity = int(entry.quantity) if entry.quantity\
-        else calculate_quantity(entry.price, args.max)
+        price, entry_stop = float(entry['limit_price']), float(entry['stop_price'])
+    quantity = int(entry['quantity']) if entry['quantity']\
+        else calculate_quantity(price, args.max)
+    entry = Order(action, entry['ticker'].upper(), quantity, price, entry_stop)
 
-    exit = Hash(**exit_match.groupdict())
-    exit.action = exit.action.upper()
-    exit.target_price = float(exit.target_price)
-    exit.stop_price = float(exit.stop_price)
+    exit = exit_match.groupdict()
+    exit_action = exit['action'].upper()
+    target_price = float(exit['target_price'])
+    stop_price = float(exit['stop_price'])
 
     # validate inputs
     if entry.action == BUY:
-        assert exit.action == SELL, 'exit action must be sell for buy orders'
-        if not exit.target_price > exit.stop_price:
-            target = exit.stop_price
-            exit.stop_price = exit.target_price
-            exit.target_price = target
-        assert exit.target_price > entry.price, 'Target price must be greater than %s (%s given)' % (
-            pf(entry.price), pf(exit.target_price)
+        assert exit_action == SELL, 'exit action must be sell for buy orders'
+        if not target_price > stop_price:
+            target_price, stop_price = stop_price, target_price
+        assert target_price > entry.price, 'Target price must be greater than %s (%s given)' % (
+            pf(entry.price), pf(target_price)
         )
-        assert exit.stop_price < entry.price, 'Stop price must be less than %s (%s given)' % (
-            pf(entry.price), pf(exit.stop_price)
+        assert stop_price < entry.price, 'Stop price must be less than %s (%s given)' % (
+            pf(entry.price), pf(stop_price)
         )
-        if 'stop_price' in entry:
+        if entry.stop_price is not None:
             assert entry.stop_price < entry.price, 'Entry stop price must be less than %s (%s given)' % (
                 pf(entry.price), pf(entry.stop_price)
             )
     else:  # entry.action == SELL
-        assert exit.action == BUY, 'exit action must be buy for sell orders'
-        if not exit.target_price < exit.stop_price:
-            target = exit.stop_price
-            exit.stop_price = exit.target_price
-            exit.target_price = target
-        assert exit.target_price < entry.price, 'Target price must be less than %s (%s given)' % (
-            pf(entry.price), pf(exit.target_price)
+        assert exit_action == BUY, 'exit action must be buy for sell orders'
+        if not target_price < stop_price:
+            target_price, stop_price = stop_price, target_price
+        assert target_price < entry.price, 'Target price must be less than %s (%s given)' % (
+            pf(entry.price), pf(target_price)
         )
-        assert exit.stop_price > entry.price, 'Stop price must be greater than %s (%s given)' % (
-            pf(entry.price), pf(exit.stop_price)
+        assert stop_price > entry.price, 'Stop price must be greater than %s (%s given)' % (
+            pf(entry.price), pf(stop_price)
         )
-        if 'stop_price' in entry:
-            assert entry.stop_price < entry.price, 'Entry stop price must be greater than %s (%s given)' % (
+        if entry.stop_price is not None:
+            assert entry.stop_price > entry.price, 'Entry stop price must be greater than %s (%s given)' % (
                 pf(entry.price), pf(entry.stop_price)
             )
-    return entry, exit
-
-
-def calculate_quantity(entry_price, max_amount, lot_size=100):
-    def _calculate_quantity(lot_size):
-        # use 95% of max_amount to account for commission/slippage
-        quantity = (0.95 * max_amount) / entry_price
-        return quantity - (quantity % lot_size)
-    quantity = _calculate_quantity(lot_size)
-    while not quantity:
-        lot_size /= 10
-        quantity = _calculate_quantity(lot_size)
-    return int(quantity)
+    return Bracket(entry, target_price, stop_price, args.commission)
 
 
 def pf(price):
     return '$%.2f' % price
 
 
-def risk_reward(entry, exit, commission):
-    return total_profit(entry, exit, commission) / risk(entry, exit, commission)
-
+def order_summary(bracket):
+    from colorclass import Color
+    from terminaltables import AsciiTable
 
-def order_summary(entry, exit, commission):
+    entry = bracket.entry
     data = []
-    if 'stop_price' in entry:
+    if entry.stop_price is not None:
         data.append(
-            ['%(action)s %(quantity)s %(ticker)s STOP $%(stop_price).2f LIMIT' % entry.as_dict(),
+            ['%(action)s %(quantity)s %(symbol)s STOP $%(stop_price).2f LIMIT' % entry._asdict(),
              pf(entry.price),
-             Color('{cyan}%s{/cyan}' % pf(cost(entry, exit, commission)))]
+             Color('{cyan}%s{/cyan}' % pf(bracket.cost))]
         )
     else:
         data.append(
-            ['%(action)s %(quantity)s %(ticker)s LIMIT' % entry.as_dict(),
+            ['%(action)s %(quantity)s %(symbol)s LIMIT' % entry._asdict(),
              pf(entry.price),
-             Color('{cyan}%s{/cyan}' % pf(cost(entry, exit, commission)))]
+             Color('{cyan}%s{/cyan}' % pf(bracket.cost))]
         )
     data.extend([
-        ['50% Target', pf(half_target_price(entry, exit)), '+%s' % pf(half_target_profit(entry, exit, commission))],
-        ['Target', pf(exit.target_price), '+%s' % pf(target_profit(entry, exit, commission))],
-        ['Profit', '', Color('{green}+%s{/green}' % pf(total_profit(entry, exit, commission)))],
-        ['Stop loss', pf(exit.stop_price), Color('{hired}-%s{/red}' % pf(risk(entry, exit, commission)))],
+        ['50% Target', pf(bracket.half_target_price), '+%s' % pf(bracket.half_target_profit)],
+        ['Target', pf(bracket.target_price), '+%s' % pf(bracket.target_profit)],
+        ['Profit', '', Color('{green}+%s{/green}' % pf(bracket.total_profit))],
+        ['Stop loss', pf(bracket.stop_price), Color('{hired}-%s{/red}' % pf(bracket.risk))],
         ['Risk/Reward', '', Color('{%(color)s}%(risk_reward).1f to 1{/%(color)s}' % {
-            'risk_reward': risk_reward(entry, exit, commission),
-            'color': 'green' if risk_reward(entry, exit, commission) >= 3 else 'hired'
+            'risk_reward': bracket.risk_reward,
+            'color': 'green' if bracket.risk_reward >= 3 else 'hired'
         })],
     ])
 
@@ -159,41 +140,44 @@ def order_summary(entry, exit, commission):
     print(table.table)
 
 
-def cost(entry, exit, commission):
-    return (entry.price * entry.quantity) + commission
-
-
-def risk(entry, exit, commission):
-    risk = entry.quantity * (entry.price - exit.stop_price)
-    if risk < 0:
-        risk *= -1
-    return risk + (2 * commission)
-
-
-def half_target_price(entry, exit):
-    if entry.action == BUY:
-        return entry.price + ((exit.target_price - entry.price) / 2)
-    elif entry.action == SELL:
-        return entry.price - ((entry.price - exit.target_price) / 2)
-    raise Exception('Unrecognized action: %s' % entry.action)
-
+def _is_set(value):
+    # missing values are None in JSON records and NaN in DataFrames
+    return value is not None and value == value
+
+
+def batch_summary(plan, limit=None):
+    '''
+    :param plan: list of the planned orders as dicts (see pytradelib.orders.plan_orders)
+    '''
+    from colorclass import Color
+    from terminaltables import AsciiTable
+
+    data = [['Symbol', 'Order', 'Cost', '50% Target', 'Target', 'Stop loss', 'Profit', 'Risk', 'R/R']]
+    for row in plan[:limit]:
+        if isinstance(row['error'], str):
+            data.append([row['symbol'], Color('{hired}%s{/red}' % row['error'])] + [''] * 7)
+            continue
+        order = '%s %d %s' % (row['action'], row['quantity'], pf(row['price']))
+        if _is_set(row['entry_stop']):
+            order += ' (stop %s)' % pf(row['entry_stop'])
+        data.append([
+            row['symbol'],
+            order,
+            pf(row['cost']),
+            pf(row['half_target_price']),
+            pf(row['target_price']),
+            pf(row['stop_price']),
+            Color('{green}+%s{/green}' % pf(row['total_profit'])),
+            Color('{hired}-%s{/red}' % pf(row['risk'])),
+            Color('{%(color)s}%(risk_reward).1f{/%(color)s}' % {
+                'risk_reward': row['risk_reward'],
+                'color': 'green' if row['risk_reward'] >= 3 else 'hired',
+            }),
+        ])
 
-def half_target_profit(entry, exit, commission):
-    profit = (entry.quantity / 2) * (half_target_price(entry, exit) - entry.price)
-    if profit < 0:
-        profit *= -1
-    return profit - commission
-
-
-def target_profit(entry, exit, commission):
-    profit = (entry.quantity / 2) * (exit.target_price - entry.price)
-    if profit < 0:
-        profit *= -1
-    return profit - commission
-
-
-def total_profit(entry, exit, commission):
-    return half_target_profit(entry, exit, commission) + target_profit(entry, exit, commission) - commission
+    table = AsciiTable(data)
+    table.inner_column_border = False
+    print(table.table)
 
 
 if __name__ == '__main__':
@@ -205,12 +189,33 @@ if __name__ == '__main__':
             return int(max.lower().replace('k', '')) * 1000
         return int(max)
 
-    parser.add_argument('command', metavar='COMMAND', nargs='+', help='The buy and sell command')
+    parser.add_argument('command', metavar='COMMAND', nargs='*', help='The buy and sell command')
+    parser.add_argument('--batch', metavar='FILE', help='Plan an order for every entry in a CSV or JSONL file (see pytradelib.orders.plan_orders)')
+    parser.add_argument('--output', metavar='FILE', help='Where to write the batch plan (CSV, or JSON lines for .jsonl)')
+    parser.add_argument('--limit', default=None, type=int, help='The number of batch orders to print', required=False)
     parser.add_argument('--max', default=MAX_AMOUNT, help='The maximum dollar amount to invest', type=max_type, required=False)
     parser.add_argument('--commission', default=COMMISSION, help='Commission charged per trade', type=float, required=False)
+    parser.add_argument('--no-daemon', action='store_true', help="Plan batches here, even if a daemon is running (see pytradelib.daemon)")
     args = parser.parse_args()
-    args.command = ' '.join(args.command).lower().split(', ')
 
-    entry, exit = parse_args(args)
+    if args.batch:
+        if not args.no_daemon and daemon.is_running():
+            # the daemon has pandas loaded already
+            output = args.output and os.path.abspath(args.output)
+            plan = daemon.call('plan_orders', {'path': os.path.abspath(args.batch), 'output': output,
+                                               'max_amount': args.max, 'commission': args.commission})
+        else:
+            plan = orders.plan_orders(orders.read_entries(args.batch), args.max, args.commission)
+            if args.output and args.output.endswith('.jsonl'):
+                plan.to_json(args.output, orient='records', lines=True)
+            elif args.output:
+                plan.to_csv(args.output, index=False)
+            plan = plan.to_dict('records')
+        batch_summary(plan, args.limit)
+        sys.exit(0)
+
+    if not args.command:
+        error()
+    args.command = ' '.join(args.command).lower().split(', ')
 
-    order_summary(entry, exit, args.commission)
+    order_summary(parse_args(args))